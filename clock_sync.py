@@ -0,0 +1,185 @@
+import asyncio
+import collections
+import random
+import threading
+import time
+
+import util
+from config import API_CLOCK_ROUTE
+
+DEFAULT_INTERVAL = 5  # seconds between clock samples of an instance service
+DEFAULT_WINDOW = 8  # number of recent samples the outliers are detected among
+DEFAULT_SMOOTHING = 0.25  # weight of a new sample in the smoothed estimates
+DEFAULT_OUTLIER_FACTOR = 2  # samples which round-trip time is this many times above the window's minimum are outliers
+DEFAULT_TIMEOUT = 1  # seconds
+OUTLIER_MIN_RTT = 0.002  # seconds, round-trip times below the window's minimum plus this are never outliers
+BURST_SIZE = 4  # samples taken in a row when an instance service has no estimate yet
+BURST_INTERVAL = 0.05  # seconds
+
+
+class ClockEstimate:
+    """
+    Smoothed round-trip time and clock offset of a service, updated with NTP-style samples (see `ClockSync`)
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW, smoothing=DEFAULT_SMOOTHING, outlier_factor=DEFAULT_OUTLIER_FACTOR):
+        self.smoothing = smoothing
+        self.outlier_factor = outlier_factor
+
+        self.samples = collections.deque(maxlen=window)  # (rtt, offset) of the recent samples
+        self.rtt = None  # seconds
+        self.offset = None  # seconds, the service's clock minus the local one
+        self.jitter = 0.0  # seconds, smoothed deviation of the samples' offsets from the estimate
+        self.count = 0
+        self.outliers = 0
+        self.failures = 0
+        self.updated_at = None  # unix timestamp of the last accepted sample
+
+    def add(self, rtt, offset):
+        """
+        :return: False if the sample has been rejected as an outlier
+        """
+        self.samples.append((rtt, offset))
+        self.count += 1
+        self.rtt = rtt if self.rtt is None else self.rtt + self.smoothing * (rtt - self.rtt)
+
+        # a sample delayed on the way (queuing, retransmissions) is asymmetric, its offset may be off by up to rtt / 2
+        min_rtt = min(rtt_ for rtt_, _ in self.samples)
+        if self.offset is not None and rtt > min_rtt * self.outlier_factor + OUTLIER_MIN_RTT:
+            self.outliers += 1
+            return False
+
+        if self.offset is None:
+            self.offset = offset
+        else:
+            self.jitter += self.smoothing * (abs(offset - self.offset) - self.jitter)
+            self.offset += self.smoothing * (offset - self.offset)
+        self.updated_at = time.time()
+        return True
+
+    def stats(self):
+        def ms(seconds):
+            return round(seconds * 1000, 3) if seconds is not None else None
+
+        return {
+            "rtt_ms": ms(self.rtt),
+            "min_rtt_ms": ms(min((rtt for rtt, _ in self.samples), default=None)),
+            "offset_ms": ms(self.offset),
+            "jitter_ms": ms(self.jitter),
+            "samples": self.count,
+            "outliers": self.outliers,
+            "failures": self.failures,
+            "updated_at": self.updated_at,
+        }
+
+
+class ClockSync:
+    """
+    Continuously estimates round-trip times to the instance services and offsets of their clocks
+    by NTP-style exchanges with `API_CLOCK_ROUTE` of the instance service (see `util.sample_clock()`).
+    Every instance service is sampled every `interval` seconds in background, see `ClockEstimate`
+    """
+
+    def __init__(
+        self,
+        interval=DEFAULT_INTERVAL,
+        window=DEFAULT_WINDOW,
+        smoothing=DEFAULT_SMOOTHING,
+        outlier_factor=DEFAULT_OUTLIER_FACTOR,
+        timeout=DEFAULT_TIMEOUT,
+    ):
+        """
+        :param interval: seconds between the samples of an instance service (jittered)
+        :param timeout: seconds to wait for a sample
+        """
+        self.interval = interval
+        self.window = window
+        self.smoothing = smoothing
+        self.outlier_factor = outlier_factor
+        self.timeout = timeout
+
+        self.lock = threading.Lock()
+        self.estimates = {}  # {"lang": ClockEstimate(), ...}
+        self.followers = {}  # {"lang": ("instance service address", concurrent.futures.Future), ...}
+
+    def follow(self, addrs):
+        """
+        Samples the instance services in background. Languages which are not in `addrs` any more are removed,
+        languages which address hasn't changed keep their estimates
+        :param addrs: {"lang": "instance service address", ...}
+        """
+        with self.lock:
+            for lang in list(self.followers):
+                if addrs.get(lang) != self.followers[lang][0]:
+                    self.followers.pop(lang)[1].cancel()
+                    self.estimates.pop(lang)
+            for lang, addr in addrs.items():
+                if lang not in self.followers:
+                    self.estimates[lang] = ClockEstimate(self.window, self.smoothing, self.outlier_factor)
+                    future = util.get_event_loop_thread().submit(self._follow(lang, addr, self.estimates[lang]))
+                    self.followers[lang] = (addr, future)
+
+    def get(self, langs):
+        """
+        Languages which haven't been estimated yet (e.g. have just been followed) are sampled right away
+        :return: {"lang": (rtt, offset), ...}, in seconds, for the estimated langs
+        """
+        with self.lock:
+            missing = [
+                (self.followers[lang][0], self.estimates[lang])
+                for lang in langs
+                if lang in self.followers and self.estimates[lang].offset is None
+            ]
+        if missing:
+            util.get_event_loop_thread().run_sync(self._sample_all(missing))
+
+        with self.lock:
+            return {
+                lang: (self.estimates[lang].rtt, self.estimates[lang].offset)
+                for lang in langs
+                if lang in self.estimates and self.estimates[lang].offset is not None
+            }
+
+    def stats(self):
+        """
+        :return: {"lang": {"rtt_ms": ..., "min_rtt_ms": ..., "offset_ms": ..., "jitter_ms": ...,
+                           "samples": n, "outliers": n, "failures": n, "updated_at": ...}, ...}
+        """
+        with self.lock:
+            return {lang: estimate.stats() for lang, estimate in self.estimates.items()}
+
+    async def _follow(self, lang, addr, estimate):
+        samples = BURST_SIZE
+        while True:
+            try:
+                await self._sample(addr, estimate, samples)
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:
+                print(f"E PYSERVER::ClockSync::_follow(): couldn't sample the clock of {lang}. Details: {ex}")
+            samples = 1 if estimate.offset is not None else BURST_SIZE
+            # jittered, so the instance services aren't sampled in lockstep
+            await asyncio.sleep(random.uniform(self.interval * 0.75, self.interval * 1.25))
+
+    async def _sample_all(self, targets):
+        await asyncio.gather(*[self._sample(addr, estimate, BURST_SIZE) for addr, estimate in targets])
+
+    async def _sample(self, addr, estimate, n):
+        """
+        Takes up to `n` samples in a row, stops at the first failure (the service is likely down)
+        """
+        samples = []
+        for i in range(n):
+            if i:
+                await asyncio.sleep(BURST_INTERVAL)
+            sample = await util.sample_clock(f"{addr}{API_CLOCK_ROUTE}", timeout=self.timeout)
+            if sample is None:
+                break
+            samples.append(sample)
+
+        with self.lock:
+            if len(samples) < n:
+                estimate.failures += 1
+            # the fastest sample of a burst goes first, so the estimate isn't seeded with e.g. a connection setup delay
+            for rtt, offset in sorted(samples):
+                estimate.add(rtt, offset)
@@ -1,28 +1,65 @@
+import functools
 import json
+import math
 import os
+import time
 from urllib.parse import urlencode
 
 from dotenv import load_dotenv
 from flask import Flask
+from flask import Response
 from flask import request
+from werkzeug.exceptions import BadRequest
 
+import obs
 import server
 import util
+from config import API_BATCH_ROUTE
 from config import API_CLEANUP_ROUTE
+from config import API_CLOCK_ROUTE
+from config import API_EVENTS_ROUTE
+from config import API_HEALTHCHECK_ROUTE
 from config import API_INIT_ROUTE
+from config import API_MEDIA_LIST_ROUTE
 from config import API_MEDIA_PLAY_ROUTE
+from config import API_MEDIA_PRELOAD_ROUTE
+from config import API_MEDIA_QUEUE_ROUTE
 from config import API_SET_STREAM_SETTINGS_ROUTE
 from config import API_SIDECHAIN_ROUTE
 from config import API_SOURCE_VOLUME_ROUTE
+from config import API_STATE_ROUTE
+from config import API_STATS_ROUTE
 from config import API_STREAM_START_ROUTE
 from config import API_STREAM_STOP_ROUTE
 from config import API_TRANSITION_ROUTE
 from config import API_TS_OFFSET_ROUTE
 from config import API_TS_VOLUME_ROUTE
+from clock_sync import ClockSync
+from live_view import LiveView
+from response_cache import ResponseCache
+from util import UPDATED_AT_KEY
 from util import ExecutionStatus, MultilangParams
 
 load_dotenv()
 MEDIA_DIR = os.getenv("MEDIA_DIR")
+BROADCAST_TIMEOUT = float(os.getenv("BROADCAST_TIMEOUT", 15))  # seconds
+BROADCAST_INIT_TIMEOUT = float(os.getenv("BROADCAST_INIT_TIMEOUT", 60))  # seconds
+# encoding of the bodies of the requests to instance services and their responses: "json" or "msgpack"
+BROADCAST_ENCODING = os.getenv("BROADCAST_ENCODING", "json")
+BROADCAST_CONTENT_TYPE = util.MSGPACK_CONTENT_TYPE if BROADCAST_ENCODING == "msgpack" else util.JSON_CONTENT_TYPE
+BROADCAST_HEADERS = {"Content-Type": BROADCAST_CONTENT_TYPE, "Accept": BROADCAST_CONTENT_TYPE}
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", 1))  # seconds
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", util.DEFAULT_HTTP_POOL_LIMIT))
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", util.DEFAULT_HTTP_POOL_LIMIT_PER_HOST))
+# GET requests are idempotent, so slow ones are hedged and failed ones are retried
+BROADCAST_GET_ATTEMPTS = int(os.getenv("BROADCAST_GET_ATTEMPTS", 3))
+BROADCAST_HEDGE_DELAY = float(os.getenv("BROADCAST_HEDGE_DELAY", util.DEFAULT_HEDGE_DELAY))  # seconds
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", util.DEFAULT_FAILURE_THRESHOLD))
+BREAKER_PROBE_INTERVAL = float(os.getenv("BREAKER_PROBE_INTERVAL", util.DEFAULT_PROBE_INTERVAL))  # seconds
+# seconds the instance services get to prepare a synchronized media start, in addition to the round-trip time
+MEDIA_SYNC_MARGIN = float(os.getenv("MEDIA_SYNC_MARGIN", 0.3))
+CLOCK_SYNC_INTERVAL = float(os.getenv("CLOCK_SYNC_INTERVAL", 5))  # seconds
+util.init_http_client(limit=HTTP_POOL_LIMIT, limit_per_host=HTTP_POOL_LIMIT_PER_HOST)
 
 # Setup Sentry
 # ------------
@@ -39,39 +76,128 @@ if SENTRY_DSN:
     )
 
 app = Flask(__name__)
-instance_service_addrs = util.ServiceAddrStorage()  # dict of `"lang": {"addr": "address"}
+instance_service_addrs = util.ServiceAddrStorage(
+    probe_route=API_HEALTHCHECK_ROUTE,
+    failure_threshold=BREAKER_FAILURE_THRESHOLD,
+    probe_interval=BREAKER_PROBE_INTERVAL,
+)  # dict of `"lang": {"addr": "address"}
 langs = []
-
-
-def broadcast(
-    api_route,
-    http_method,
-    params: util.MultilangParams = None,
-    param_name="params",
-    return_status=False,
-    method_name="broadcast",
-):
+response_cache = ResponseCache(ttl=RESPONSE_CACHE_TTL)
+live_view = LiveView()  # pushed by the instance services
+clock_sync = ClockSync(interval=CLOCK_SYNC_INTERVAL)  # round-trip times and clock offsets of the instance services
+# paths of the values of the cached routes in the live view, see `LiveView.get_values()`
+LIVE_VALUE_PATHS = {
+    API_TS_OFFSET_ROUTE: ["sources", obs.TS_INPUT_NAME, "sync_offset"],
+    API_TS_VOLUME_ROUTE: ["sources", obs.TS_INPUT_NAME, "volume_db"],
+    API_SOURCE_VOLUME_ROUTE: ["sources", obs.ORIGINAL_STREAM_SOURCE_NAME, "volume_db"],
+}
+# by-lang values which are cached, by the `/batch` operations which change them
+CACHED_ROUTES_BY_OPERATION = {
+    "set_ts_sync_offset": API_TS_OFFSET_ROUTE,
+    "set_ts_volume_db": API_TS_VOLUME_ROUTE,
+    "set_source_volume_db": API_SOURCE_VOLUME_ROUTE,
+}
+
+
+def build_requests(api_route, http_method, params: util.MultilangParams = None, param_name="params", target_langs=None):
+    """
+    Parameters of POST requests are sent in the body (encoded with `BROADCAST_ENCODING`),
+    of GET requests - in the query string
+    :param target_langs: langs to send the requests to, by default - the langs of `params` (all langs if None)
+    :return: {"lang": ("url of the instance service request", body or None), ...}
+    """
     requests_ = {}  # lang: request
-    responses_ = {}  # lang: response
 
-    langs_ = params.list_langs() if params is not None else langs
+    if target_langs is not None:
+        langs_ = target_langs
+    else:
+        langs_ = params.list_langs() if params is not None else langs
     # create requests for all langs
     for lang in langs_:
         addr = instance_service_addrs.addr(lang)  # get server address
         request_ = f"{addr}{api_route}"  # create requests
-        if params is not None:  # add query params if needed
+        body = None
+        if params is not None and http_method == "POST":
+            body = util.encode_body({param_name: {lang: params[lang]}}, BROADCAST_CONTENT_TYPE)
+        elif params is not None:  # add query params if needed
             params_json = json.dumps({lang: params[lang]})
             query_params = urlencode({param_name: params_json})
             request_ = request_ + "?" + query_params
-        requests_[lang] = request_  # dump request
+        requests_[lang] = (request_, body)  # dump request
+
+    return requests_
 
-    # initialize grequests
-    urls = list(requests_.values())
+
+def get_timeout(default):
+    """
+    :return: seconds to wait for instance services: `timeout` query parameter if specified, otherwise `default`.
+    Fires BadRequest (400) if the parameter isn't a positive number
+    """
+    timeout = request.args.get("timeout", None)
+    if timeout is None:
+        return default
+    try:
+        value = float(timeout)
+    except ValueError:
+        value = None
+    if value is None or not math.isfinite(value) or value <= 0:
+        raise BadRequest(f"`timeout` must be a positive number of seconds, got {timeout!r}")
+    return value
+
+
+def stream_requested():
+    """
+    :return: True if the results should be streamed as they arrive (`stream` query parameter), see `broadcast_stream()`
+    """
+    return request.args.get("stream", "0").lower() in ("1", "true")
+
+
+def send_requests(http_method, requests_, timeout):
+    """
+    Sends the requests concurrently. The langs which circuit is open (see `util.ServiceAddrStorage`) fail fast
+    with 503 and no request, GET requests are hedged and retried (see `util.HTTPClient.fetch()`)
+    :param requests_: {"lang": ("url", body), ...}, see `build_requests()`
+    :return: generator of (lang, `util.Response`), in the order the responses arrive
+    """
+    available = []
+    for lang in requests_:
+        if instance_service_addrs.is_available(lang):
+            available.append(lang)
+        else:
+            yield lang, instance_service_addrs.unavailable_response(lang)
+
+    kwargs = {"timeout": timeout, "headers": BROADCAST_HEADERS}
     if http_method == "GET":
-        responses_ = util.async_aiohttp_get_all(urls=urls)
-    elif http_method == "POST":
-        responses_ = util.async_aiohttp_post_all(urls=urls)
-    responses_ = {lang: responses_[i] for i, lang in enumerate(requests_.keys())}
+        kwargs.update(attempts=BROADCAST_GET_ATTEMPTS, hedge_delay=BROADCAST_HEDGE_DELAY)
+    urls = [requests_[lang][0] for lang in available]
+    bodies = [requests_[lang][1] for lang in available]
+    for i, response_ in util.get_http_client().iter_all(http_method, urls, bodies=bodies, **kwargs):
+        instance_service_addrs.record_response(available[i], response_)
+        yield available[i], response_
+
+
+def broadcast(
+    api_route,
+    http_method,
+    params: util.MultilangParams = None,
+    param_name="params",
+    return_status=False,
+    method_name="broadcast",
+    target_langs=None,
+    on_response=None,
+    timeout=None,
+):
+    """
+    :param on_response: on_response(lang, response), called for every instance service response
+    :param timeout: seconds to wait for the instance services, see `get_timeout()` by default
+    """
+    requests_ = build_requests(api_route, http_method, params, param_name=param_name, target_langs=target_langs)
+    timeout = timeout if timeout is not None else get_timeout(BROADCAST_TIMEOUT)
+    responses_ = dict(send_requests(http_method, requests_, timeout))
+    responses_ = {lang: responses_[lang] for lang in requests_}  # lang: response
+    if on_response is not None:
+        for lang, response_ in responses_.items():
+            on_response(lang, response_)
 
     # decide wether to return status of response
     if return_status:
@@ -86,6 +212,107 @@ def broadcast(
         return responses_
 
 
+def broadcast_stream(
+    api_route,
+    http_method,
+    params: util.MultilangParams = None,
+    param_name="params",
+    method_name="broadcast",
+    on_response=None,
+):
+    """
+    The same as `broadcast()`, but returns a streaming response with an NDJSON line
+    per instance service as soon as it replies, e.g.:
+    {"lang": "eng", "status": true, "data": ...}
+    where `data` is the lang's value returned by the instance service ("Ok" or error details for operations)
+    """
+    requests_ = build_requests(api_route, http_method, params, param_name=param_name)
+    # the requests are sent once the response starts, out of the request context
+    responses_ = send_requests(http_method, requests_, get_timeout(BROADCAST_TIMEOUT))
+
+    def generate():
+        for lang, response_ in responses_:
+            if on_response is not None:
+                on_response(lang, response_)
+            if response_.status_code != 200:
+                print(f"E PYSERVER::{method_name}(): {lang}, details: {response_.text}")
+            line = {"lang": lang, "status": response_.status_code == 200, "data": get_lang_data(lang, response_)}
+            yield json.dumps(line) + "\n"
+
+    return Response(generate(), mimetype="application/x-ndjson")
+
+
+def get_cached_lang_data(api_route):
+    """
+    Retrieves by-lang values of all the instances. The values are taken from the live view (pushed by the instance
+    services), or from the cache if the lang's event stream is disconnected: the values fetched
+    less than `RESPONSE_CACHE_TTL` seconds ago (or just set with a POST request) are not fetched again
+    :return: {"lang": value, ..., "__updated_at__": {"lang": timestamp, ...}}
+    """
+
+    def fetch(langs_):
+        return merge_lang_data(broadcast(api_route, "GET", params=None, return_status=False, target_langs=langs_))
+
+    data = live_view.get_values(LIVE_VALUE_PATHS[api_route], langs)
+    missing = [lang for lang in langs if lang not in data]
+    if not missing:
+        return data
+    return merge_lang_data_dicts([data, response_cache.get(api_route, missing, fetch)])
+
+
+def write_through(api_route, params: util.MultilangParams, lang, response):
+    """
+    Caches the value just set for the lang (to be returned by GET `api_route`), if the instance service has set it
+    """
+    if response.status_code == 200:
+        response_cache.put(api_route, {lang: params[lang], UPDATED_AT_KEY: {lang: time.time()}})
+        live_view.set_value(lang, LIVE_VALUE_PATHS[api_route], params[lang])
+    else:
+        response_cache.invalidate(api_route, langs=[lang])
+
+
+def get_lang_data(lang, response):
+    """
+    :return: the lang's value of json response of an instance service, or the response text if it's not json
+    """
+    try:
+        data_ = response.data()
+    except ValueError:
+        return response.text
+    return data_.get(lang) if isinstance(data_, dict) else data_
+
+
+def merge_lang_data(responses):
+    """
+    Merges by-lang json responses of instance services into a single dictionary.
+    Nested by-lang dictionaries (like "__updated_at__") are merged as well.
+    :param responses: {"lang": Response, ...}
+    :return: {"lang": value, ..., "__updated_at__": {"lang": timestamp, ...}}
+    """
+    data = []
+    for lang, response in responses.items():
+        try:
+            data.append(response.data())
+        except ValueError:
+            data.append({lang: "#"})
+    return merge_lang_data_dicts(data)
+
+
+def merge_lang_data_dicts(data):
+    """
+    :param data: list of {"lang": value, ..., "__updated_at__": {"lang": timestamp, ...}}
+    :return: {"lang": value, ..., "__updated_at__": {"lang": timestamp, ...}}
+    """
+    merged = {}
+    for data_ in data:
+        for lang_, value in data_.items():
+            if lang_ == UPDATED_AT_KEY:
+                merged.setdefault(UPDATED_AT_KEY, {}).update(value)
+            else:
+                merged[lang_] = value
+    return merged
+
+
 @app.route(API_INIT_ROUTE, methods=["POST"])
 def init():
     """
@@ -108,8 +335,7 @@ def init():
     }
     :return:
     """
-    server_langs = request.args.get("server_langs", "")
-    server_langs = json.loads(server_langs)
+    server_langs = util.get_request_param(request, "server_langs")
 
     # validate input parameters before broadcasting them to servers
     status: ExecutionStatus = util.validate_init_params(server_langs)
@@ -123,7 +349,8 @@ def init():
     global instance_service_addrs  # dict of `"lang": {"addr": "address", "init": True/False}
     global langs
     langs = list(server_langs.keys())
-    requests_ = []
+    init_params = {}  # lang: server_langs of the lang's instance service
+    response_cache.invalidate()
 
     for lang in langs:
         lang_info = server_langs[lang]
@@ -135,24 +362,23 @@ def init():
         # initialization for every instance service
         # for now every obs instance should be started locally with the instance service
         lang_info["obs_host"] = "localhost"
-        lang_info = {lang: lang_info}
-
-        query_params = urlencode({"server_langs": json.dumps(lang_info)})
-
-        addr = instance_service_addrs.addr(lang)
-        request_ = f"{addr}{API_INIT_ROUTE}?{query_params}"
+        init_params[lang] = lang_info
 
-        requests_.append(request_)
+    requests_ = build_requests(API_INIT_ROUTE, "POST", MultilangParams(init_params), param_name="server_langs")
 
-    # initialize grequests
-    responses_ = util.async_aiohttp_post_all(urls=requests_)
+    responses_ = dict(send_requests("POST", requests_, get_timeout(BROADCAST_INIT_TIMEOUT)))
 
-    for lang, response in zip(langs, responses_):
+    for lang in langs:
+        response = responses_[lang]
         if response.status_code != 200:
             msg_ = f"E PYSERVER::init(): couldn't initialize server for {lang}, details: {response.text}"
             print(msg_)
             status.append_error(msg_)
 
+    # the instance services which failed to initialize are followed as well, they may be initialized later
+    live_view.follow({lang: instance_service_addrs.addr(lang) for lang in langs})
+    clock_sync.follow({lang: instance_service_addrs.addr(lang) for lang in langs})
+
     return status.to_http_status()
 
 
@@ -162,7 +388,10 @@ def cleanup():
     :return:
     """
     status = ExecutionStatus(status=True)
+    response_cache.invalidate()
 
+    if stream_requested():
+        return broadcast_stream(API_CLEANUP_ROUTE, "POST")
     responses = broadcast(API_CLEANUP_ROUTE, "POST")
     for lang, response in responses.items():
         if response.status_code != 200:
@@ -179,12 +408,20 @@ def media_play():
     Query parameters:
     params: json dictionary,
     e.g. {"lang": {"name": "...", "search_by_num": "0/1"}, ...}
+    start_at: unix timestamp (optional), start the media simultaneously in all the languages, see `media_play_at()`
     :return:
     """
-    params = request.args.get("params", None)
-    params = json.loads(params)
+    params = util.get_request_param(request, "params")
+    start_at = util.get_request_param(request, "start_at")
 
     params = MultilangParams(params, langs=langs)
+    if start_at is not None:
+        data, code = media_play_at(params, float(start_at))
+        return util.make_data_response(request, data, status_code=code)
+    if stream_requested():
+        return broadcast_stream(
+            API_MEDIA_PLAY_ROUTE, "POST", params=params, param_name="params", method_name="media_play"
+        )
     status = broadcast(
         API_MEDIA_PLAY_ROUTE, "POST", params=params, param_name="params", return_status=True, method_name="media_play"
     )
@@ -192,6 +429,131 @@ def media_play():
     return status.to_http_status()
 
 
+def media_play_at(params: MultilangParams, start_at):
+    """
+    Starts the media simultaneously in all the languages: at `start_at` (unix timestamp), or as soon as
+    every instance service can make it (in twice the longest round-trip time plus `MEDIA_SYNC_MARGIN` seconds).
+    The start time is converted to the clock of every instance service, see `ClockSync`
+    :return: ({"start_at": unix_timestamp, "skew_ms": ..., "langs": {"lang": {"started_at": unix_timestamp,
+               "late_ms": ..., "rtt_ms": ..., "offset_ms": ...}, ...}}, http code),
+    the values of the failed languages are error details
+    """
+    langs_ = params.list_langs()
+    clocks = clock_sync.get([lang for lang in langs_ if instance_service_addrs.is_available(lang)])
+    start_at = max(start_at, time.time() + 2 * max((rtt for rtt, _ in clocks.values()), default=0) + MEDIA_SYNC_MARGIN)
+
+    params_at = {lang: dict(params[lang], start_at=start_at + clocks.get(lang, (None, 0.0))[1]) for lang in langs_}
+    responses = broadcast(
+        API_MEDIA_PLAY_ROUTE,
+        "POST",
+        params=MultilangParams(params_at, langs=langs),
+        method_name="media_play",
+        timeout=start_at - time.time() + get_timeout(BROADCAST_TIMEOUT),
+    )
+
+    data = {}
+    for lang, response in responses.items():
+        lang_data = get_lang_data(lang, response)
+        if response.status_code != 200 or not isinstance(lang_data, dict):
+            print(f"E PYSERVER::media_play(): {lang}, details: {lang_data}")
+            data[lang] = lang_data
+            continue
+        rtt, offset = clocks.get(lang, (None, 0.0))
+        started_at = lang_data["started_at"] - offset  # converted to the clock of the common service
+        data[lang] = {
+            "started_at": started_at,
+            "late_ms": round((started_at - start_at) * 1000, 3),
+            "rtt_ms": round(rtt * 1000, 3) if rtt is not None else None,
+            "offset_ms": round(offset * 1000, 3),
+        }
+
+    started = [lang_data["started_at"] for lang_data in data.values() if isinstance(lang_data, dict)]
+    skew_ms = round((max(started) - min(started)) * 1000, 3) if started else None
+    code = 200 if len(started) == len(data) else 500
+    return {"start_at": start_at, "skew_ms": skew_ms, "langs": data}, code
+
+
+@app.route(API_MEDIA_LIST_ROUTE, methods=["GET"])
+def media_list():
+    """
+    Query parameters:
+    params: json dictionary (optional),
+    e.g. {"lang": {"offset": 0, "limit": 100}, ...}
+    :return: {"lang": {"total": n, "offset": 0, "limit": 100, "items": [{"name": "...", "size": n}, ...]}, ...}
+    """
+    params = util.get_request_param(request, "params", default={"__all__": {}})
+
+    params = MultilangParams(params, langs=langs)
+    if stream_requested():
+        return broadcast_stream(API_MEDIA_LIST_ROUTE, "GET", params=params, param_name="params")
+    responses = broadcast(API_MEDIA_LIST_ROUTE, "GET", params=params, param_name="params", return_status=False)
+    data = merge_lang_data(responses)
+
+    return util.make_data_response(request, data)
+
+
+@app.route(API_MEDIA_PRELOAD_ROUTE, methods=["POST"])
+def media_preload():
+    """
+    Query parameters:
+    params: json dictionary,
+    e.g. {"lang": [{"name": "...", "search_by_num": "0/1"}, ...], ...}
+    :return:
+    """
+    params = util.get_request_param(request, "params")
+
+    params = MultilangParams(params, langs=langs)
+    if stream_requested():
+        return broadcast_stream(
+            API_MEDIA_PRELOAD_ROUTE,
+            "POST",
+            params=params,
+            param_name="params",
+            method_name="media_preload",
+        )
+    status = broadcast(
+        API_MEDIA_PRELOAD_ROUTE,
+        "POST",
+        params=params,
+        param_name="params",
+        return_status=True,
+        method_name="media_preload",
+    )
+
+    return status.to_http_status()
+
+
+@app.route(API_MEDIA_QUEUE_ROUTE, methods=["POST"])
+def media_queue():
+    """
+    Query parameters:
+    params: json dictionary,
+    e.g. {"lang": [{"name": "...", "search_by_num": "0/1"}, ...], ...}
+    :return:
+    """
+    params = util.get_request_param(request, "params")
+
+    params = MultilangParams(params, langs=langs)
+    if stream_requested():
+        return broadcast_stream(
+            API_MEDIA_QUEUE_ROUTE,
+            "POST",
+            params=params,
+            param_name="params",
+            method_name="media_queue",
+        )
+    status = broadcast(
+        API_MEDIA_QUEUE_ROUTE,
+        "POST",
+        params=params,
+        param_name="params",
+        return_status=True,
+        method_name="media_queue",
+    )
+
+    return status.to_http_status()
+
+
 @app.route(API_SET_STREAM_SETTINGS_ROUTE, methods=["POST"])
 def set_stream_settings():
     """
@@ -200,10 +562,17 @@ def set_stream_settings():
     e.g. {"lang": {"server": "rtmp://...", "key": "..."}, ...}
     :return:
     """
-    stream_settings = request.args.get("stream_settings", None)
-    stream_settings = json.loads(stream_settings)
+    stream_settings = util.get_request_param(request, "stream_settings")
 
     params = MultilangParams(stream_settings, langs=langs)
+    if stream_requested():
+        return broadcast_stream(
+            API_SET_STREAM_SETTINGS_ROUTE,
+            "POST",
+            params=params,
+            param_name="stream_settings",
+            method_name="set_stream_settings",
+        )
     status = broadcast(
         API_SET_STREAM_SETTINGS_ROUTE,
         "POST",
@@ -222,6 +591,8 @@ def stream_start():
     Starts streaming on all machines
     :return:
     """
+    if stream_requested():
+        return broadcast_stream(API_STREAM_START_ROUTE, "POST", params=None, method_name="stream_start")
     status = broadcast(API_STREAM_START_ROUTE, "POST", params=None, return_status=True, method_name="stream_start")
 
     return status.to_http_status()
@@ -233,6 +604,8 @@ def stream_stop():
     Stops streaming on all machines
     :return:
     """
+    if stream_requested():
+        return broadcast_stream(API_STREAM_STOP_ROUTE, "POST", params=None, method_name="stream_stop")
     status = broadcast(API_STREAM_STOP_ROUTE, "POST", params=None, return_status=True, method_name="stream_stop")
 
     return status.to_http_status()
@@ -246,10 +619,18 @@ def set_ts_offset():
     e.g. {"lang": 4000, ...} (note, offset in milliseconds)
     :return:
     """
-    offset_settings = request.args.get("offset_settings", None)
-    offset_settings = json.loads(offset_settings)
+    offset_settings = util.get_request_param(request, "offset_settings")
 
     params = MultilangParams(offset_settings, langs=langs)
+    if stream_requested():
+        return broadcast_stream(
+            API_TS_OFFSET_ROUTE,
+            "POST",
+            params=params,
+            param_name="offset_settings",
+            method_name="set_ts_offset",
+            on_response=functools.partial(write_through, API_TS_OFFSET_ROUTE, params),
+        )
     status = broadcast(
         API_TS_OFFSET_ROUTE,
         "POST",
@@ -257,6 +638,7 @@ def set_ts_offset():
         param_name="offset_settings",
         return_status=True,
         method_name="set_ts_offset",
+        on_response=functools.partial(write_through, API_TS_OFFSET_ROUTE, params),
     )
 
     return status.to_http_status()
@@ -268,17 +650,11 @@ def get_ts_offset():
     Retrieves information about teamspeak sound offset
     :return: {"lang": offset, ...} (note, offset in milliseconds)
     """
-    responses = broadcast(API_TS_OFFSET_ROUTE, "GET", params=None, return_status=False)
-    data = {}
-    for lang, response in responses.items():
-        try:
-            data_ = json.loads(response.text)
-        except json.JSONDecodeError:
-            data_ = {lang: "#"}
-        for lang_, value in data_.items():
-            data[lang_] = value
+    if stream_requested():
+        return broadcast_stream(API_TS_OFFSET_ROUTE, "GET", params=None)
+    data = get_cached_lang_data(API_TS_OFFSET_ROUTE)
 
-    return json.dumps(data), 200
+    return util.make_data_response(request, data)
 
 
 @app.route(API_TS_VOLUME_ROUTE, methods=["POST"])
@@ -289,10 +665,18 @@ def set_ts_volume():
     e.g. {"lang": 0.0, ...}
     :return:
     """
-    volume_settings = request.args.get("volume_settings", None)
-    volume_settings = json.loads(volume_settings)
+    volume_settings = util.get_request_param(request, "volume_settings")
 
     params = MultilangParams(volume_settings, langs=langs)
+    if stream_requested():
+        return broadcast_stream(
+            API_TS_VOLUME_ROUTE,
+            "POST",
+            params=params,
+            param_name="volume_settings",
+            method_name="set_ts_volume",
+            on_response=functools.partial(write_through, API_TS_VOLUME_ROUTE, params),
+        )
     status = broadcast(
         API_TS_VOLUME_ROUTE,
         "POST",
@@ -300,6 +684,7 @@ def set_ts_volume():
         param_name="volume_settings",
         return_status=True,
         method_name="set_ts_volume",
+        on_response=functools.partial(write_through, API_TS_VOLUME_ROUTE, params),
     )
 
     return status.to_http_status()
@@ -311,17 +696,11 @@ def get_ts_volume():
     Retrieves information about teamspeak sound volume
     :return: {"lang": offset, ...} (note, volume in decibels)
     """
-    responses = broadcast(API_TS_VOLUME_ROUTE, "GET", params=None, return_status=False)
-    data = {}
-    for lang, response in responses.items():
-        try:
-            data_ = json.loads(response.text)
-        except json.JSONDecodeError:
-            data_ = {lang: "#"}
-        for lang_, value in data_.items():
-            data[lang_] = value
+    if stream_requested():
+        return broadcast_stream(API_TS_VOLUME_ROUTE, "GET", params=None)
+    data = get_cached_lang_data(API_TS_VOLUME_ROUTE)
 
-    return json.dumps(data), 200
+    return util.make_data_response(request, data)
 
 
 @app.route(API_SOURCE_VOLUME_ROUTE, methods=["POST"])
@@ -332,17 +711,26 @@ def set_source_volume():
     e.g. {"lang": 0.0, ...}
     :return:
     """
-    volume_settings = request.args.get("volume_settings", None)
-    volume_settings = json.loads(volume_settings)
+    volume_settings = util.get_request_param(request, "volume_settings")
 
     params = MultilangParams(volume_settings, langs=langs)
+    if stream_requested():
+        return broadcast_stream(
+            API_SOURCE_VOLUME_ROUTE,
+            "POST",
+            params=params,
+            param_name="volume_settings",
+            method_name="set_source_volume",
+            on_response=functools.partial(write_through, API_SOURCE_VOLUME_ROUTE, params),
+        )
     status = broadcast(
-        API_TS_VOLUME_ROUTE,
+        API_SOURCE_VOLUME_ROUTE,
         "POST",
         params=params,
         param_name="volume_settings",
         return_status=True,
         method_name="set_source_volume",
+        on_response=functools.partial(write_through, API_SOURCE_VOLUME_ROUTE, params),
     )
 
     return status.to_http_status()
@@ -354,17 +742,11 @@ def get_source_volume():
     Retrieves information about original source volume
     :return: {"lang": volume, ...} (note, volume in decibels)
     """
-    responses = broadcast(API_SOURCE_VOLUME_ROUTE, "GET", params=None, return_status=False)
-    data = {}
-    for lang, response in responses.items():
-        try:
-            data_ = json.loads(response.text)
-        except json.JSONDecodeError:
-            data_ = {lang: "#"}
-        for lang_, value in data_.items():
-            data[lang_] = value
+    if stream_requested():
+        return broadcast_stream(API_SOURCE_VOLUME_ROUTE, "GET", params=None)
+    data = get_cached_lang_data(API_SOURCE_VOLUME_ROUTE)
 
-    return json.dumps(data), 200
+    return util.make_data_response(request, data)
 
 
 @app.route(API_SIDECHAIN_ROUTE, methods=["POST"])
@@ -375,10 +757,17 @@ def setup_sidechain():
     e.g. {"lang": {'ratio': ..., 'release_time': ..., 'threshold': ...}, ...}
     :return:
     """
-    sidechain_settings = request.args.get("sidechain_settings", None)
-    sidechain_settings = json.loads(sidechain_settings)
+    sidechain_settings = util.get_request_param(request, "sidechain_settings")
 
     params = MultilangParams(sidechain_settings, langs=langs)
+    if stream_requested():
+        return broadcast_stream(
+            API_SIDECHAIN_ROUTE,
+            "POST",
+            params=params,
+            param_name="sidechain_settings",
+            method_name="setup_sidechain",
+        )
     status = broadcast(
         API_SIDECHAIN_ROUTE,
         "POST",
@@ -399,10 +788,17 @@ def setup_transition():
     e.g. {"lang": {'transition_name': ..., 'audio_fade_style': ..., 'path': ..., ...}, ...}
     :return:
     """
-    transition_settings = request.args.get("transition_settings", None)
-    transition_settings = json.loads(transition_settings)
+    transition_settings = util.get_request_param(request, "transition_settings")
 
     params = MultilangParams(transition_settings, langs=langs)
+    if stream_requested():
+        return broadcast_stream(
+            API_TRANSITION_ROUTE,
+            "POST",
+            params=params,
+            param_name="transition_settings",
+            method_name="setup_transition",
+        )
     status = broadcast(
         API_TRANSITION_ROUTE,
         "POST",
@@ -415,7 +811,108 @@ def setup_transition():
     return status.to_http_status()
 
 
-@app.route('/healthcheck', methods=['GET'])
+@app.route(API_STATS_ROUTE, methods=["GET"])
+def get_stats():
+    """
+    Retrieves obs controller statistics of all the instances, and the health of the instance services
+    :return: {"lang": {"scene_cache": {...}, ..., "instance_service": {"state": "open"/"closed", ...}}, ...}
+    """
+    if stream_requested():
+        return broadcast_stream(API_STATS_ROUTE, "GET", params=None)
+    responses = broadcast(API_STATS_ROUTE, "GET", params=None, return_status=False)
+    data = merge_lang_data(responses)
+    for lang, health in instance_service_addrs.stats().items():
+        if lang in data:
+            if not isinstance(data[lang], dict):
+                data[lang] = {}  # the instance service hasn't replied
+            data[lang]["instance_service"] = health
+
+    return util.make_data_response(request, data)
+
+
+@app.route(API_STATE_ROUTE, methods=["GET"])
+def get_state():
+    """
+    Retrieves the live state of all the instances, pushed by the instance services (no requests are sent)
+    :return: {"lang": {"sources": {...}, "media": {...}, "streaming": {...}, "connection": {...},
+                       "channel": {...}}, ...}
+    """
+    return util.make_data_response(request, live_view.snapshot())
+
+
+@app.route(API_EVENTS_ROUTE, methods=["GET"])
+def events():
+    """
+    Server-sent events stream of the live state of all the instances: a `snapshot` event (see `get_state()`),
+    then a `patch` event per change, e.g. {"lang": "eng", "path": ["sources", "ts_input", "volume_db"], "value": {...}}
+    """
+    return Response(util.sse_stream(live_view.events, live_view.snapshot), mimetype="text/event-stream")
+
+
+@app.route(API_CLOCK_ROUTE, methods=["GET"])
+def get_clock():
+    """
+    Retrieves the estimated round-trip times to the instance services and the offsets of their clocks
+    (estimated continuously in background, no requests are sent, see `ClockSync`)
+    :return: {"lang": {"rtt_ms": ..., "min_rtt_ms": ..., "offset_ms": ..., "jitter_ms": ...,
+                       "samples": n, "outliers": n, "failures": n, "updated_at": ...}, ...}
+    """
+    return util.make_data_response(request, clock_sync.stats())
+
+
+@app.route(API_BATCH_ROUTE, methods=["POST"])
+def batch():
+    """
+    Query parameters:
+    operations: json list, applied in order,
+    e.g. [{"op": "set_ts_volume_db", "params": {"lang": 0.0, ...}}, {"op": "start_streaming"}, ...]
+    :return: {"lang": [{"op": "...", "status": true/false, "message": "..."}, ...], ...},
+    400 if an operation is malformed or unknown
+    """
+    operations = util.get_request_param(request, "operations")
+    status = util.validate_batch_operations(operations, server.OPERATIONS)
+    if not status:
+        return status.message, 400
+
+    # split the operations by instance, so every instance gets all its operations in one request
+    operations_by_lang = {}
+    for operation in operations:
+        params = operation.get("params")
+        params = MultilangParams(params if params is not None else {"__all__": None}, langs=langs)
+        for lang in params.list_langs():
+            operations_by_lang.setdefault(lang, []).append({"op": operation["op"], "params": params[lang]})
+
+    # the cached values changed by the operations are fetched again by the next request
+    cached_routes = {
+        CACHED_ROUTES_BY_OPERATION[op["op"]] for op in operations if op["op"] in CACHED_ROUTES_BY_OPERATION
+    }
+
+    def invalidate(lang, response):
+        for route in cached_routes:
+            response_cache.invalidate(route, langs=[lang])
+
+    if stream_requested():
+        return broadcast_stream(
+            API_BATCH_ROUTE,
+            "POST",
+            params=MultilangParams(operations_by_lang, langs=langs),
+            param_name="operations",
+            on_response=invalidate,
+        )
+    responses = broadcast(
+        API_BATCH_ROUTE,
+        "POST",
+        params=MultilangParams(operations_by_lang, langs=langs),
+        param_name="operations",
+        return_status=False,
+        on_response=invalidate,
+    )
+    data = merge_lang_data(responses)
+
+    return util.make_data_response(request, data)
+
+
+@app.route(API_HEALTHCHECK_ROUTE, methods=['GET'])
 def healthcheck():
     return '', 200
 
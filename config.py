@@ -1,5 +1,8 @@
 API_INIT_ROUTE = "/init"
 API_MEDIA_PLAY_ROUTE = "/media/play"
+API_MEDIA_PRELOAD_ROUTE = "/media/preload"
+API_MEDIA_QUEUE_ROUTE = "/media/queue"
+API_MEDIA_LIST_ROUTE = "/media"
 API_SET_STREAM_SETTINGS_ROUTE = "/stream/settings"
 API_STREAM_START_ROUTE = "/stream/start"
 API_STREAM_STOP_ROUTE = "/stream/stop"
@@ -9,3 +12,9 @@ API_TS_VOLUME_ROUTE = "/ts/volume"
 API_SOURCE_VOLUME_ROUTE = "/source/volume"
 API_SIDECHAIN_ROUTE = "/filters/sidechain"
 API_TRANSITION_ROUTE = "/transition"
+API_STATS_ROUTE = "/stats"
+API_BATCH_ROUTE = "/batch"
+API_STATE_ROUTE = "/state"
+API_EVENTS_ROUTE = "/events"
+API_HEALTHCHECK_ROUTE = "/healthcheck"
+API_CLOCK_ROUTE = "/clock"
@@ -1,24 +1,36 @@
-import json
 import os
 import time
 
 from dotenv import load_dotenv
 from flask import Flask
+from flask import Response
 from flask import request
 
 import server
+from config import API_BATCH_ROUTE
 from config import API_CLEANUP_ROUTE
+from config import API_CLOCK_ROUTE
+from config import API_EVENTS_ROUTE
+from config import API_HEALTHCHECK_ROUTE
 from config import API_INIT_ROUTE
+from config import API_MEDIA_LIST_ROUTE
 from config import API_MEDIA_PLAY_ROUTE
+from config import API_MEDIA_PRELOAD_ROUTE
+from config import API_MEDIA_QUEUE_ROUTE
 from config import API_SET_STREAM_SETTINGS_ROUTE
 from config import API_SIDECHAIN_ROUTE
 from config import API_SOURCE_VOLUME_ROUTE
+from config import API_STATE_ROUTE
+from config import API_STATS_ROUTE
 from config import API_STREAM_START_ROUTE
 from config import API_STREAM_STOP_ROUTE
 from config import API_TRANSITION_ROUTE
 from config import API_TS_OFFSET_ROUTE
 from config import API_TS_VOLUME_ROUTE
 from util import ExecutionStatus
+from util import get_request_param
+from util import make_data_response
+from util import sse_stream
 
 load_dotenv()
 # MEDIA_DIR = os.getenv('MEDIA_DIR')
@@ -54,8 +66,7 @@ def init():
     }
     :return:
     """
-    server_langs = request.args.get("server_langs", "")
-    server_langs = json.loads(server_langs)
+    server_langs = get_request_param(request, "server_langs")
 
     # status: ExecutionStatus = util.validate_init_params(server_langs)
     # if not status:
@@ -63,10 +74,14 @@ def init():
 
     global obs_server
 
+    # warm re-init: only the languages which have changed are touched, the others keep streaming
+    if obs_server is not None and obs_server.is_initialized:
+        status: ExecutionStatus = obs_server.reinitialize(server_langs=server_langs)
+        return status.to_http_status()
+
     if obs_server is not None:
         try:
             obs_server.cleanup()
-            time.sleep(1)  # wait for cleanup
         except Exception:  # FIXME
             pass
         del obs_server
@@ -102,19 +117,81 @@ def media_play():
     Query parameters:
     params: json dictionary,
     e.g. {"lang": {"name": "...", "search_by_num": "0/1"}, ...}
-    :return:
+    or {"lang": {"name": "...", "search_by_num": "0/1", "start_at": unix_timestamp}, ...} to start the languages
+    simultaneously (see `Server.run_media_at()`), the response is sent once all of them have shown the media
+    :return: {"lang": {"started_at": unix_timestamp}, ...} if `start_at` is set
     """
     if obs_server is None:
         return ExecutionStatus(status=False, message="The server was not initialized yet").to_http_status()
 
-    params = request.args.get("params", None)
-    params = json.loads(params)
+    params = get_request_param(request, "params")
+
+    if any("start_at" in params_ for params_ in params.values()):
+        data = obs_server.run_media_at(params=params)
+        if isinstance(data, ExecutionStatus):
+            return data.to_http_status()
+        return make_data_response(request, data)
 
     status: ExecutionStatus = obs_server.run_media(params=params)
 
     return status.to_http_status()
 
 
+@app.route(API_MEDIA_LIST_ROUTE, methods=["GET"])
+def media_list():
+    """
+    Query parameters:
+    params: json dictionary (optional),
+    e.g. {"lang": {"offset": 0, "limit": 100}, ...}
+    :return: {"lang": {"total": n, "offset": 0, "limit": 100, "items": [{"name": "...", "size": n}, ...]}, ...}
+    """
+    if obs_server is None:
+        return ExecutionStatus(status=False, message="The server was not initialized yet").to_http_status()
+
+    params = get_request_param(request, "params")
+
+    data = obs_server.list_media(params=params)
+    if isinstance(data, ExecutionStatus):
+        return data.to_http_status()
+    return make_data_response(request, data)
+
+
+@app.route(API_MEDIA_PRELOAD_ROUTE, methods=["POST"])
+def media_preload():
+    """
+    Query parameters:
+    params: json dictionary,
+    e.g. {"lang": [{"name": "...", "search_by_num": "0/1"}, ...], ...}
+    :return:
+    """
+    if obs_server is None:
+        return ExecutionStatus(status=False, message="The server was not initialized yet").to_http_status()
+
+    params = get_request_param(request, "params")
+
+    status: ExecutionStatus = obs_server.preload_media(params=params)
+
+    return status.to_http_status()
+
+
+@app.route(API_MEDIA_QUEUE_ROUTE, methods=["POST"])
+def media_queue():
+    """
+    Query parameters:
+    params: json dictionary,
+    e.g. {"lang": [{"name": "...", "search_by_num": "0/1"}, ...], ...}
+    :return:
+    """
+    if obs_server is None:
+        return ExecutionStatus(status=False, message="The server was not initialized yet").to_http_status()
+
+    params = get_request_param(request, "params")
+
+    status: ExecutionStatus = obs_server.enqueue_media(params=params)
+
+    return status.to_http_status()
+
+
 @app.route(API_SET_STREAM_SETTINGS_ROUTE, methods=["POST"])
 def set_stream_settings():
     """
@@ -126,8 +203,7 @@ def set_stream_settings():
     if obs_server is None:
         return ExecutionStatus(status=False, message="The server was not initialized yet").to_http_status()
 
-    stream_settings = request.args.get("stream_settings", None)
-    stream_settings = json.loads(stream_settings)
+    stream_settings = get_request_param(request, "stream_settings")
 
     status: ExecutionStatus = obs_server.set_stream_settings(stream_settings=stream_settings)
 
@@ -173,8 +249,7 @@ def set_ts_offset():
     if obs_server is None:
         return ExecutionStatus(status=False, message="The server was not initialized yet").to_http_status()
 
-    offset_settings = request.args.get("offset_settings", None)
-    offset_settings = json.loads(offset_settings)
+    offset_settings = get_request_param(request, "offset_settings")
 
     status: ExecutionStatus = obs_server.set_ts_sync_offset(offset_settings=offset_settings)
 
@@ -191,9 +266,7 @@ def get_ts_offset():
         return ExecutionStatus(status=False, message="The server was not initialized yet").to_http_status()
 
     data = obs_server.get_ts_sync_offset()
-    data = json.dumps(data)
-
-    return data, 200
+    return make_data_response(request, data)
 
 
 @app.route(API_TS_VOLUME_ROUTE, methods=["POST"])
@@ -207,8 +280,7 @@ def set_ts_volume():
     if obs_server is None:
         return ExecutionStatus(status=False, message="The server was not initialized yet").to_http_status()
 
-    volume_settings = request.args.get("volume_settings", None)
-    volume_settings = json.loads(volume_settings)
+    volume_settings = get_request_param(request, "volume_settings")
     # TODO: validate `volume_settings`
 
     status: ExecutionStatus = obs_server.set_ts_volume_db(volume_settings=volume_settings)
@@ -226,9 +298,7 @@ def get_ts_volume():
         return ExecutionStatus(status=False, message="The server was not initialized yet").to_http_status()
 
     data = obs_server.get_ts_volume_db()
-    data = json.dumps(data)
-
-    return data, 200
+    return make_data_response(request, data)
 
 
 @app.route(API_SOURCE_VOLUME_ROUTE, methods=["POST"])
@@ -242,8 +312,7 @@ def set_source_volume():
     if obs_server is None:
         return ExecutionStatus(status=False, message="The server was not initialized yet").to_http_status()
 
-    volume_settings = request.args.get("volume_settings", None)
-    volume_settings = json.loads(volume_settings)
+    volume_settings = get_request_param(request, "volume_settings")
     # TODO: validate `volume_settings`
 
     status: ExecutionStatus = obs_server.set_source_volume_db(volume_settings=volume_settings)
@@ -261,9 +330,7 @@ def get_source_volume():
         return ExecutionStatus(status=False, message="The server was not initialized yet").to_http_status()
 
     data = obs_server.get_source_volume_db()
-    data = json.dumps(data)
-
-    return data, 200
+    return make_data_response(request, data)
 
 
 @app.route(API_SIDECHAIN_ROUTE, methods=["POST"])
@@ -277,8 +344,7 @@ def setup_sidechain():
     if obs_server is None:
         return ExecutionStatus(status=False, message="The server was not initialized yet").to_http_status()
 
-    sidechain_settings = request.args.get("sidechain_settings", None)
-    sidechain_settings = json.loads(sidechain_settings)
+    sidechain_settings = get_request_param(request, "sidechain_settings")
     # TODO: validate `sidechain_settings`
 
     status: ExecutionStatus = obs_server.setup_sidechain(sidechain_settings=sidechain_settings)
@@ -297,8 +363,7 @@ def setup_transition():
     if obs_server is None:
         return ExecutionStatus(status=False, message="The server was not initialized yet").to_http_status()
 
-    transition_settings = request.args.get("transition_settings", None)
-    transition_settings = json.loads(transition_settings)
+    transition_settings = get_request_param(request, "transition_settings")
     # TODO: validate `transition_settings`
 
     status: ExecutionStatus = obs_server.setup_transition(transition_settings=transition_settings)
@@ -306,7 +371,75 @@ def setup_transition():
     return status.to_http_status()
 
 
-@app.route('/healthcheck', methods=['GET'])
+@app.route(API_STATS_ROUTE, methods=["GET"])
+def get_stats():
+    """
+    Retrieves obs controller statistics (e.g. scene cache hit/miss counters)
+    :return: {"lang": {"scene_cache": {...}}, ...}
+    """
+    if obs_server is None:
+        return ExecutionStatus(status=False, message="The server was not initialized yet").to_http_status()
+
+    data = obs_server.get_stats()
+    return make_data_response(request, data)
+
+
+@app.route(API_STATE_ROUTE, methods=["GET"])
+def get_state():
+    """
+    Retrieves the live state of the obs instances (volumes, offsets, mute states, media, streaming, connection)
+    :return: {"lang": {"sources": {...}, "media": {...}, "streaming": {...}, "connection": {...}}, ...}
+    """
+    if obs_server is None:
+        return ExecutionStatus(status=False, message="The server was not initialized yet").to_http_status()
+
+    data = obs_server.get_state()
+    return make_data_response(request, data)
+
+
+@app.route(API_EVENTS_ROUTE, methods=["GET"])
+def events():
+    """
+    Server-sent events stream of the live state: a `snapshot` event with the state (see `get_state()`),
+    then a `patch` event per change, e.g. {"lang": "eng", "path": ["sources", "ts_input", "volume_db"], "value": {...}}
+    """
+    if obs_server is None:
+        return ExecutionStatus(status=False, message="The server was not initialized yet").to_http_status()
+
+    return Response(sse_stream(obs_server.events, obs_server.get_state), mimetype="text/event-stream")
+
+
+@app.route(API_BATCH_ROUTE, methods=["POST"])
+def batch():
+    """
+    Query parameters:
+    operations: json dictionary,
+    e.g. {"lang": [{"op": "set_ts_volume_db", "params": 0.0}, {"op": "setup_sidechain", "params": {...}}, ...], ...}
+    :return: {"lang": [{"op": "...", "status": true/false, "message": "..."}, ...], ...}
+    """
+    if obs_server is None:
+        return ExecutionStatus(status=False, message="The server was not initialized yet").to_http_status()
+
+    operations = get_request_param(request, "operations")
+
+    data = obs_server.run_batch(operations=operations)
+    if isinstance(data, ExecutionStatus):
+        return data.to_http_status()
+    return make_data_response(request, data)
+
+
+@app.route(API_CLOCK_ROUTE, methods=["GET"])
+def clock():
+    """
+    Timestamps of an NTP-style exchange, used to estimate the round-trip time to this service
+    and the offset of its clock (see `util.sample_clock()`)
+    :return: {"received_at": unix_timestamp, "sent_at": unix_timestamp}
+    """
+    received_at = time.time()
+    return make_data_response(request, {"received_at": received_at, "sent_at": time.time()})
+
+
+@app.route(API_HEALTHCHECK_ROUTE, methods=['GET'])
 def healthcheck():
     return '', 200
 
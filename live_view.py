@@ -0,0 +1,160 @@
+import asyncio
+import copy
+import json
+import random
+import threading
+import time
+
+import util
+from config import API_EVENTS_ROUTE
+from util import UPDATED_AT_KEY
+
+DEFAULT_RECONNECT_MIN_DELAY = 0.5  # seconds
+DEFAULT_RECONNECT_MAX_DELAY = 10  # seconds
+
+
+class LiveView:
+    """
+    Merged live state of all the instance services, kept current by following their event streams
+    (`API_EVENTS_ROUTE` of the instance service) instead of polling them.
+    Every change is re-published to `events` as a patch (see `util.apply_patch()`).
+    Every lang has a "channel" entry: {"connected": True/False, "updated_at": ..., "last_error": ...},
+    the values of a lang are not updated (may be stale) while its channel is disconnected.
+    """
+
+    def __init__(
+        self,
+        keepalive=util.DEFAULT_SSE_KEEPALIVE,
+        min_delay=DEFAULT_RECONNECT_MIN_DELAY,
+        max_delay=DEFAULT_RECONNECT_MAX_DELAY,
+    ):
+        """
+        :param keepalive: keepalive interval of the event streams, a stream is considered dead
+        after 3 intervals without data
+        :param min_delay: seconds to wait before the first reconnection attempt
+        :param max_delay: max seconds to wait between reconnection attempts
+        """
+        self.keepalive = keepalive
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+
+        self.lock = threading.Lock()
+        self.state = {}  # {"lang": {"sources": {...}, ..., "channel": {...}}, ...}
+        self.events = util.EventHub()
+        self.followers = {}  # {"lang": ("instance service address", concurrent.futures.Future), ...}
+        self.generations = {}  # {"lang": n, ...}, incremented when the lang's follower is replaced
+
+    def follow(self, addrs):
+        """
+        Follows the event streams of the instance services. Languages which are not in `addrs` any more
+        are removed, languages which address hasn't changed keep their streams
+        :param addrs: {"lang": "instance service address", ...}
+        """
+        with self.lock:
+            for lang in list(self.followers):
+                if addrs.get(lang) != self.followers[lang][0]:
+                    self.followers.pop(lang)[1].cancel()
+                    self.generations[lang] = self.generations.get(lang, 0) + 1
+                    self._apply({"lang": lang, "path": [], "value": None})
+            for lang, addr in addrs.items():
+                if lang not in self.followers:
+                    generation = self.generations.setdefault(lang, 0)
+                    future = util.get_event_loop_thread().submit(self._follow(lang, addr, generation))
+                    self.followers[lang] = (addr, future)
+
+    def snapshot(self):
+        """
+        :return: {"lang": {"sources": {...}, "media": {...}, "streaming": {...}, "connection": {...},
+                           "channel": {...}}, ...}
+        """
+        with self.lock:
+            return copy.deepcopy(self.state)
+
+    def get_values(self, path, langs):
+        """
+        :param path: path of a value in the lang's state, e.g. ["sources", "ts_input", "volume_db"]
+        :return: {"lang": value, ..., "__updated_at__": {"lang": timestamp, ...}}
+        for the langs which channels are connected and the value is known
+        """
+        data = {}
+        with self.lock:
+            for lang in langs:
+                node = self.state.get(lang, {})
+                if not node.get("channel", {}).get("connected"):
+                    continue
+                for key in path:
+                    node = node.get(key) if isinstance(node, dict) else None
+                if not isinstance(node, dict) or node.get("value") is None:
+                    continue
+                data[lang] = node["value"]
+                data.setdefault(UPDATED_AT_KEY, {})[lang] = node["updated_at"]
+        return data
+
+    def set_value(self, lang, path, value):
+        """
+        Sets a value the lang's instance service has just confirmed (e.g. in a response),
+        so it's visible before the change arrives with the event stream
+        """
+        with self.lock:
+            if lang in self.state:
+                self._apply({"lang": lang, "path": path, "value": {"value": value, "updated_at": time.time()}})
+
+    async def _follow(self, lang, addr, generation):
+        attempt = 0
+        while True:
+            try:
+                async for event, data in self._read_events(f"{addr}{API_EVENTS_ROUTE}"):
+                    if event == "snapshot":
+                        attempt = 0
+                        self._on_event(generation, {"lang": lang, "path": [], "value": data.get(lang) or {}})
+                        self._set_channel(generation, lang, connected=True)
+                    elif event == "patch" and data["lang"] == lang:
+                        self._on_event(generation, data)
+                error = "the event stream has ended"
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:
+                error = f"{type(ex).__name__}: {ex}"
+            self._set_channel(generation, lang, connected=False, error=error)
+
+            # exponential backoff with jitter, so the restarted instance services are not flooded
+            delay = min(self.max_delay, self.min_delay * 2**attempt)
+            await asyncio.sleep(random.uniform(delay / 2, delay))
+            attempt += 1
+
+    async def _read_events(self, url):
+        """
+        :return: async generator of (event name, json data) of the server-sent events stream
+        """
+        event, data = "message", []
+        async for line in util.get_http_client().iter_lines(url, read_timeout=self.keepalive * 3):
+            if not line:
+                if data:
+                    yield event, json.loads("\n".join(data))
+                event, data = "message", []
+            elif not line.startswith(":"):  # lines starting with ":" are comments (e.g. keepalive)
+                field, _, value = line.partition(":")
+                value = value[1:] if value.startswith(" ") else value
+                if field == "event":
+                    event = value
+                elif field == "data":
+                    data.append(value)
+
+    def _on_event(self, generation, patch):
+        with self.lock:
+            if self.generations.get(patch["lang"]) == generation:
+                self._apply(patch)
+
+    def _set_channel(self, generation, lang, connected, error=None):
+        channel = {"connected": connected, "updated_at": time.time(), "last_error": error}
+        self._on_event(generation, {"lang": lang, "path": ["channel"], "value": channel})
+
+    def _apply(self, patch):
+        # must be called with the lock held, so the patches are published in the order they are applied
+        if not patch["path"] and patch["value"] is not None:
+            # a new state of the whole lang, the channel state is kept
+            channel = self.state.get(patch["lang"], {}).get("channel")
+            if channel is not None:
+                patch = dict(patch, value=dict(patch["value"], channel=channel))
+        util.apply_patch(self.state, patch)
+        self.events.publish(patch)
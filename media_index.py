@@ -0,0 +1,135 @@
+import os
+import re
+import threading
+import time
+
+DEFAULT_POLL_INTERVAL = 2  # seconds
+DEFAULT_PAGE_SIZE = 100
+
+
+class MediaIndex:
+    """
+    In-memory index of the media files of a directory, so lookups don't touch the filesystem.
+    Kept current by polling the directory mtime (a single stat per poll) from a background thread,
+    the directory is rescanned only when it has changed. Lookups are deterministic:
+    if several files match, the first one in sorted order is returned.
+    """
+
+    def __init__(self, media_dir, poll_interval=DEFAULT_POLL_INTERVAL):
+        self.media_dir = media_dir
+        self.poll_interval = poll_interval
+
+        self.lock = threading.Lock()
+        self.mtime_ns = None  # mtime of the directory when it was scanned, None if not scanned yet
+        self.forced_at = None  # time.monotonic() of the last rescan forced by a lookup miss
+        self.names = []  # sorted file names
+        self.sizes = {}  # {"name": size_in_bytes, ...}
+        self.by_num = {}  # {"number": "name", ...}, e.g. {"001": "001_a.mp4", "0012": "0012.mp4"}
+        self.by_num_prefix = {}  # {"prefix_of_number": "name", ...}, e.g. {"0": "0012.mp4", "00": ..., "001": ...}
+
+        self.thread = None
+        self.stopped = threading.Event()
+
+    def start(self):
+        """
+        Scans the directory and starts polling it, does nothing if already started
+        """
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self._run, name="MediaIndex", daemon=True)
+        try:
+            self.refresh()
+        except BaseException as ex:
+            print(f"E PYSERVER::MediaIndex::start(): couldn't scan {self.media_dir}. Details: {ex}")
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def refresh(self, force=False):
+        """
+        Rescans the directory if it has changed since the last scan (or `force` is set)
+        :return: True if the directory was rescanned
+        """
+        try:
+            mtime_ns = os.stat(self.media_dir).st_mtime_ns
+        except OSError:
+            mtime_ns = -1  # no such directory (yet)
+        if not force and mtime_ns == self.mtime_ns:
+            return False
+
+        sizes = {}
+        if mtime_ns != -1:
+            with os.scandir(self.media_dir) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        sizes[entry.name] = entry.stat().st_size
+        names = sorted(sizes)
+
+        by_num, by_num_prefix = {}, {}
+        for name in names:
+            file_num = re.match(r"^\d+", name)
+            if file_num is None:
+                continue
+            file_num = file_num.group()
+            by_num.setdefault(file_num, name)
+            for i in range(1, len(file_num)):
+                by_num_prefix.setdefault(file_num[:i], name)
+
+        with self.lock:
+            self.mtime_ns, self.names, self.sizes = mtime_ns, names, sizes
+            self.by_num, self.by_num_prefix = by_num, by_num_prefix
+        return True
+
+    def find(self, name):
+        """
+        :return: path of the file named `name`, or None
+        """
+        if name not in self.sizes:
+            self._refresh_on_miss()
+        path = os.path.join(self.media_dir, name)
+        if name in self.sizes:
+            return path
+        # files in subdirectories (e.g. "sub/x.mp4") aren't indexed, they are looked up on the filesystem
+        return path if os.path.isfile(path) else None
+
+    def find_by_num(self, file_num):
+        """
+        :param file_num: numeric prefix, e.g. "001"
+        :return: path of the first file which name starts with `file_num`, or None.
+        Files numbered exactly `file_num` (e.g. "001_a.mp4") take precedence over longer numbers ("0012.mp4")
+        """
+        name = self.by_num.get(file_num) or self.by_num_prefix.get(file_num)
+        if name is None:
+            self._refresh_on_miss()
+            name = self.by_num.get(file_num) or self.by_num_prefix.get(file_num)
+        return os.path.join(self.media_dir, name) if name is not None else None
+
+    def list(self, offset=0, limit=DEFAULT_PAGE_SIZE):
+        """
+        :return: {"total": n, "offset": offset, "limit": limit, "items": [... {"name": "...", "size": n}, ...]}
+        """
+        with self.lock:
+            names, sizes = self.names, self.sizes
+        end = offset + limit
+        items = [{"name": name, "size": sizes[name]} for name in names[offset:end]]
+        return {"total": len(names), "offset": offset, "limit": limit, "items": items}
+
+    def _refresh_on_miss(self):
+        # a file may have just been copied and the poller hasn't seen it yet,
+        # mtime granularity of network storage may hide the change, so the directory is rescanned anyway,
+        # but at most once per poll interval, so lookups of missing files don't rescan it every time
+        now = time.monotonic()
+        with self.lock:
+            force = self.forced_at is None or now - self.forced_at >= self.poll_interval
+            if force:
+                self.forced_at = now
+        return self.refresh(force=force)
+
+    def _run(self):
+        while not self.stopped.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except BaseException as ex:
+                print(f"E PYSERVER::MediaIndex::_run(): couldn't scan {self.media_dir}. Details: {ex}")
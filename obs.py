@@ -1,6 +1,13 @@
+import bisect
+import heapq
+import itertools
+import math
 import os
 import threading
 import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
 
 import obswebsocket as obs
 import obswebsocket.requests
@@ -9,11 +16,45 @@ ORIGINAL_STREAM_SOURCE_NAME = "original_stream"
 TS_INPUT_NAME = "ts_input"
 MEDIA_INPUT_NAME = "media"
 TRANSITION_INPUT_NAME = "transition"
+PRELOAD_INPUT_PREFIX = "preload_"
 
 MAIN_SCENE_NAME = "main"
 MEDIA_SCENE_NAME = "media"
 COMPRESSOR_FILTER_NAME = "sidechain"
 
+DEFAULT_MEDIA_POOL_SIZE = 8
+MEDIA_DURATION_POLL_INTERVAL = 0.1  # seconds, a just created media source is polled until its duration is known
+MEDIA_DURATION_POLL_TIMEOUT = 5  # seconds, after that the media is polled less often until it has ended
+MEDIA_STATE_POLL_INTERVAL = 1  # seconds
+MEDIA_ENDED_STATES = ("ended", "stopped", "error")
+
+# upper bounds of the latency histogram buckets, in milliseconds: 0.1 ms .. ~105 s, x2 per 2 buckets
+LATENCY_BUCKETS_MS = tuple(round(0.1 * 2 ** (i / 2), 3) for i in range(41))
+LATENCY_PERCENTILES = (50, 95, 99)
+
+STATE_SOURCES = (ORIGINAL_STREAM_SOURCE_NAME, TS_INPUT_NAME)  # sources which state is published (see `OBS.get_state()`)
+
+# request types in the order of their dependencies: a `RequestBatch` is sent as one pipelined stage per group,
+# e.g. a source is removed before a source of the same name is created, and created before it's set up and played.
+# Other request types (queries) are sent with the setup requests
+BATCH_STAGES = (
+    ("DeleteSceneItem", "RemoveFilterFromSource"),
+    ("CreateScene",),
+    ("CreateSource",),
+    (
+        "SetCurrentScene",
+        "SetSourceSettings",
+        "SetAudioMonitorType",
+        "AddFilterToSource",
+        "SetSourceFilterSettings",
+        "SetSceneItemRender",
+        "SetMediaTime",
+        "SetMute",
+    ),
+    ("SetSourceFilterVisibility", "PlayPauseMedia"),
+)
+DEFAULT_BATCH_STAGE = 3
+
 
 def create_event_handler(obs_instance):
     def foo(message):
@@ -26,66 +67,736 @@ def obs_fire(type, cls, cls_foo, comment, datain, dataout):
     raise Exception(f"{type} PYSERVER::{cls}::{cls_foo}(): {comment} " f"datain: {datain}, dataout: {dataout}")
 
 
-class CallbackThread(threading.Thread):
-    def __init__(self, obs_):
-        self.obs_ = obs_
-        self.lock = threading.Lock()
-        self.callbacks = []  # list of {"foo": foo, "delay": delay}, note: delay in seconds
+def mul_to_db(volume):
+    """
+    Converts volume multiplier to decibels (obs treats everything below -100 dB as silence)
+    """
+    if volume <= 0:
+        return -100.0
+    return max(20 * math.log10(volume), -100.0)
+
+
+def build_scene_spec(original_media_source, sidechain_settings=None):
+    """
+    Builds the declarative description of the scenes every obs instance has (see `OBS.reconcile_scenes()`)
+    :param original_media_source: url like 'protocol://address[:port][/path][...]', may be rtmp, srt
+    :param sidechain_settings: settings of the sidechain compressor of the original media source
+    (see `OBS.setup_sidechain()`), None - the filters of the sources are not managed
+    """
+    original_stream = {
+        "kind": "ffmpeg_source",
+        "settings": {"input": original_media_source, "is_local_file": False},
+        "monitor_type": "none",
+    }
+    if sidechain_settings is not None:
+        original_stream["filters"] = {
+            COMPRESSOR_FILTER_NAME: {"type": "compressor_filter", "settings": sidechain_settings},
+        }
+    return {
+        "current_scene": MAIN_SCENE_NAME,
+        "scenes": {
+            MAIN_SCENE_NAME: {
+                ORIGINAL_STREAM_SOURCE_NAME: original_stream,
+                TS_INPUT_NAME: {
+                    "kind": "pulse_output_capture",
+                    "settings": {},
+                },
+            },
+        },
+    }
+
+
+class RequestBatch:
+    """
+    Collects a sequence of obs requests and sends them in pipelined stages
+    (all the requests of a stage are written before waiting for any response, see `AsyncOBSClient.call_many()`).
+    obs-websocket 4.x may process the requests of a stage in any order, so only independent requests share a stage
+    (see `BATCH_STAGES`), and the whole sequence costs one round trip per stage.
+    Every request is checked separately and reported via `obs_fire`, with its own comment.
+    """
+
+    def __init__(self, client, cls="OBS", cls_foo="batch", lang=None):
+        self.client = client
+        self.lang = lang  # used in error messages
+        self.cls = cls
+        self.cls_foo = cls_foo
+        self.entries = []  # [... {"request": ..., "comment": ..., "on_success": ..., "on_failure": ...}, ...]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, request, comment=None, on_success=None, on_failure=None):
+        """
+        :param request: obswebsocket request
+        :param comment: comment used in the error message, defaults to the request name
+        :param on_success: foo(request), called if the request succeeded
+        :param on_failure: foo(request), called instead of `obs_fire` if the request failed,
+        may raise an exception itself
+        :return: request (populated with response data once the batch is sent)
+        """
+        self.entries.append(
+            {
+                "request": request,
+                "comment": comment or request.name,
+                "on_success": on_success,
+                "on_failure": on_failure,
+            }
+        )
+        return request
+
+    def stages(self):
+        """
+        :return: list of the lists of requests sent together, in the order they are sent (empty stages are left out)
+        """
+        stages = [[] for _ in BATCH_STAGES]
+        for entry in self.entries:
+            request = entry["request"]
+            stages[_BATCH_STAGE_INDEX.get(request.name, DEFAULT_BATCH_STAGE)].append(request)
+        return [stage for stage in stages if stage]
+
+    def send(self):
+        """
+        Sends the batch and checks every response. All the handlers are called
+        even if some requests failed, then the first error (if any) is raised.
+        """
+        for stage in self.stages():
+            self.client.call_many(stage)
+
+        error = None
+        for entry in self.entries:
+            request = entry["request"]
+            try:
+                if request.status:
+                    if entry["on_success"] is not None:
+                        entry["on_success"](request)
+                elif entry["on_failure"] is not None:
+                    entry["on_failure"](request)
+                else:
+                    obs_fire("E", self.cls, self.cls_foo, entry["comment"], request.datain, request.dataout)
+            except Exception as ex:
+                if error is None:
+                    error = ex
+                else:
+                    # only the first error is raised, the others are logged
+                    print(
+                        f"E PYSERVER::RequestBatch::send(): lang: {self.lang}, request: {request.name}, "
+                        f"details: {ex}"
+                    )
+        if error is not None:
+            raise error
+
+
+_BATCH_STAGE_INDEX = {request_type: i for i, stage in enumerate(BATCH_STAGES) for request_type in stage}
+
+
+class TimerHandle:
+    """
+    A handle of a callback scheduled with `TimerScheduler`, may be used to cancel the callback
+    """
+
+    def __init__(self, scheduler, deadline, foo):
+        self.scheduler = scheduler
+        self.deadline = deadline  # time.monotonic() based, in seconds
+        self.foo = foo
+        self.cancelled = False
+        self.done = False
+
+    def cancel(self):
+        self.scheduler.cancel(self)
+
+    def __lt__(self, other):
+        return self.deadline < other.deadline
+
+
+class TimerScheduler(threading.Thread):
+    """
+    Process-wide timer shared by all the `OBS` instances.
+    Keeps callbacks in a min-heap ordered by deadline and sleeps on a condition variable
+    exactly until the nearest deadline (or until an earlier callback is scheduled).
+    Callbacks are invoked in a worker pool, so a slow callback doesn't delay the others.
+    """
+
+    def __init__(self, max_workers=8):
+        self.condition = threading.Condition()
+        self.heap = []  # [... (deadline, seq, handle), ...]
+        self.seq = itertools.count()  # tie-breaker for equal deadlines
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="TimerScheduler")
         self.running = True
-        threading.Thread.__init__(self)
+        threading.Thread.__init__(self, name="TimerScheduler", daemon=True)
 
-    def append_callback(self, foo, delay):
+    def call_later(self, delay, foo):
         """
-        :param foo:
         :param delay: delay in seconds
-        :return:
+        :return: TimerHandle
         """
-        with self.lock:
-            self.callbacks.append({"foo": foo, "delay": delay, "__time__": time.time(), "__done__": False})
-
-    def clean_callbacks(self):
-        with self.lock:
-            self.callbacks = []
+        return self.call_at(time.monotonic() + max(delay, 0), foo)
 
-    def run(self):
-        while self.running:
-            self._check_callbacks()
-            time.sleep(0.01)
+    def call_at(self, deadline, foo):
+        """
+        :param deadline: `time.monotonic()` based deadline, in seconds
+        :return: TimerHandle
+        """
+        handle = TimerHandle(self, deadline, foo)
+        with self.condition:
+            heapq.heappush(self.heap, (deadline, next(self.seq), handle))
+            # wake up the thread only if the new callback is the nearest one
+            if self.heap[0][2] is handle:
+                self.condition.notify()
+        return handle
+
+    def cancel(self, handle):
+        """
+        Cancels a callback. Cancelled callbacks are dropped lazily when their deadline comes.
+        :return: True if the callback was cancelled before being invoked
+        """
+        with self.condition:
+            if handle.done:
+                return False
+            handle.cancelled = True
+            return True
 
-    def _check_callbacks(self):
-        for cb in self.callbacks.copy():
-            self._check_callback(cb)
-        with self.lock:
-            self.callbacks = [cb for cb in self.callbacks if not cb["__done__"]]
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
 
-    def _check_callback(self, cb):
-        if cb["__done__"]:
-            return
-        if (time.time() - cb["__time__"]) >= cb["delay"]:
-            self._invoke(cb["foo"])
-            cb["__done__"] = True
+    def run(self):
+        with self.condition:
+            while self.running:
+                now = time.monotonic()
+                while self.heap and self.heap[0][0] <= now:
+                    _, _, handle = heapq.heappop(self.heap)
+                    if handle.cancelled:
+                        continue
+                    handle.done = True
+                    self.executor.submit(self._invoke, handle.foo)
+                timeout = self.heap[0][0] - now if self.heap else None
+                self.condition.wait(timeout)
 
     def _invoke(self, foo):
         try:
             foo()
         except BaseException as ex:
-            print(f"E PYSERVER::CallbackThread::_invoke(): {ex}")
+            print(f"E PYSERVER::TimerScheduler::_invoke(): {ex}")
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """
+    Returns the process-wide `TimerScheduler`, starts it on the first call
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = TimerScheduler()
+            _scheduler.start()
+        return _scheduler
+
+
+class LatencyStats:
+    """
+    Fixed-bucket latency histograms (and error counters) per request type
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.lock = threading.Lock()
+        self.buckets = buckets
+        self.requests = {}  # {"request_type": {"counts": [...], "count": n, "errors": n, "sum_ms": ..., "max_ms": ...}}
+
+    def record(self, request_type, latency_ms, error=False):
+        i = bisect.bisect_left(self.buckets, latency_ms)
+        with self.lock:
+            stats = self.requests.get(request_type)
+            if stats is None:
+                stats = {"counts": [0] * (len(self.buckets) + 1), "count": 0, "errors": 0, "sum_ms": 0.0, "max_ms": 0.0}
+                self.requests[request_type] = stats
+            stats["counts"][i] += 1
+            stats["count"] += 1
+            stats["sum_ms"] += latency_ms
+            stats["max_ms"] = max(stats["max_ms"], latency_ms)
+            if error:
+                stats["errors"] += 1
+
+    def summary(self):
+        """
+        :return: {"request_type": {"count": n, "errors": n, "mean_ms": ..., "max_ms": ..., "p50_ms": ...,
+        "p95_ms": ..., "p99_ms": ...}, ...}, percentiles are upper bounds of the histogram buckets
+        """
+        with self.lock:
+            requests = {name: dict(stats, counts=list(stats["counts"])) for name, stats in self.requests.items()}
+
+        data = {}
+        for name, stats in requests.items():
+            data_ = {
+                "count": stats["count"],
+                "errors": stats["errors"],
+                "mean_ms": round(stats["sum_ms"] / stats["count"], 3),
+                "max_ms": round(stats["max_ms"], 3),
+            }
+            for percentile in LATENCY_PERCENTILES:
+                data_[f"p{percentile}_ms"] = self._percentile(stats, percentile)
+            data[name] = data_
+        return data
+
+    def _percentile(self, stats, percentile):
+        max_ms = round(stats["max_ms"], 3)
+        threshold = stats["count"] * percentile / 100
+        cumulative = 0
+        for i, count in enumerate(stats["counts"][: len(self.buckets)]):
+            cumulative += count
+            if cumulative >= threshold:
+                return min(self.buckets[i], max_ms)
+        return max_ms  # the overflow bucket has no upper bound
+
+
+class InstrumentedClient:
+    """
+    Wraps an obs client and records the latency of every call into `LatencyStats`.
+    Batches (`call_many`) are recorded as "Batch". Everything else is passed to the wrapped client.
+    """
+
+    def __init__(self, client, latency_stats):
+        self.client = client
+        self.latency_stats = latency_stats
+
+    def __getattr__(self, item):
+        return getattr(self.client, item)
+
+    def call(self, request):
+        start = time.perf_counter()
+        try:
+            response = self.client.call(request)
+        except BaseException:
+            self._record(request.name, start, error=True)
+            raise
+        self._record(request.name, start, error=not response.status)
+        return response
+
+    async def call_async(self, request):
+        start = time.perf_counter()
+        try:
+            response = await self.client.call_async(request)
+        except BaseException:
+            self._record(request.name, start, error=True)
+            raise
+        self._record(request.name, start, error=not response.status)
+        return response
+
+    def call_many(self, requests):
+        start = time.perf_counter()
+        try:
+            responses = self.client.call_many(requests)
+        except BaseException:
+            self._record("Batch", start, error=True)
+            raise
+        self._record("Batch", start, error=not all(response.status for response in responses))
+        return responses
+
+    async def call_many_async(self, requests):
+        start = time.perf_counter()
+        try:
+            responses = await self.client.call_many_async(requests)
+        except BaseException:
+            self._record("Batch", start, error=True)
+            raise
+        self._record("Batch", start, error=not all(response.status for response in responses))
+        return responses
+
+    def _record(self, request_type, start, error):
+        self.latency_stats.record(request_type, (time.perf_counter() - start) * 1000, error=error)
+
+
+class SceneCache:
+    """
+    In-memory mirror of obs scenes and their scene items.
+    Seeded once with a single GetSceneList call and kept up to date from obs events,
+    so lookups don't have to go over the wire.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.scenes = None  # {"scene_name": {item_id: "source_name", ...}, ...}, None if not seeded yet
+        self.current_scene = None  # None if unknown
+        self.current_scene_hits = 0
+        self.current_scene_misses = 0
+
+    def is_seeded(self):
+        with self.lock:
+            return self.scenes is not None
+
+    def seed(self, scenes, current_scene=None):
+        """
+        :param scenes: list of [... {'name': '...', 'sources': [{..., 'id': n, ..., 'name': '...', ...}, ...]}, ...]
+        (the structure returned by GetSceneList)
+        :param current_scene: name of the current scene, if known
+        """
+        with self.lock:
+            self.scenes = {
+                scene_info["name"]: {item["id"]: item["name"] for item in scene_info.get("sources") or []}
+                for scene_info in scenes
+            }
+            if current_scene is not None:
+                self.current_scene = current_scene
+
+    def invalidate(self):
+        with self.lock:
+            self.scenes = None
+            self.current_scene = None
+
+    def get_current_scene(self):
+        """
+        Returns the cached current scene name, or None (a miss) if it is unknown
+        or refers to a scene which is known to be gone
+        """
+        with self.lock:
+            if self.current_scene is not None and (self.scenes is None or self.current_scene in self.scenes):
+                self.current_scene_hits += 1
+                return self.current_scene
+            self.current_scene_misses += 1
+            return None
+
+    def set_current_scene(self, scene_name):
+        with self.lock:
+            self.current_scene = scene_name
+
+    def stats(self):
+        with self.lock:
+            return {
+                "seeded": self.scenes is not None,
+                "current_scene": self.current_scene,
+                "current_scene_hits": self.current_scene_hits,
+                "current_scene_misses": self.current_scene_misses,
+            }
+
+    def scene_names(self):
+        with self.lock:
+            return list(self.scenes or {})
+
+    def has_scene(self, scene_name):
+        with self.lock:
+            return scene_name in (self.scenes or {})
+
+    def has_item(self, scene_name, item_id):
+        with self.lock:
+            return item_id in (self.scenes or {}).get(scene_name, {})
+
+    def scene_items(self, scene_name):
+        """
+        :return: list of [... {'itemId': n, 'sourceName': '...'}, ...]
+        """
+        with self.lock:
+            items = (self.scenes or {}).get(scene_name, {})
+            return [{"itemId": item_id, "sourceName": source_name} for item_id, source_name in items.items()]
+
+    def find_source(self, source_name, scene_name=None):
+        """
+        :return: list of [... (scene_name, item_id), ...] of the items named `source_name`
+        """
+        with self.lock:
+            scenes = self.scenes or {}
+            scene_names = [scene_name] if scene_name is not None else list(scenes)
+            return [
+                (scene_name_, item_id)
+                for scene_name_ in scene_names
+                for item_id, source_name_ in scenes.get(scene_name_, {}).items()
+                if source_name_ == source_name
+            ]
+
+    def add_scene(self, scene_name):
+        with self.lock:
+            if self.scenes is not None:
+                self.scenes.setdefault(scene_name, {})
+
+    def remove_scene(self, scene_name):
+        with self.lock:
+            if self.scenes is not None:
+                self.scenes.pop(scene_name, None)
+            if self.current_scene == scene_name:
+                self.current_scene = None
+
+    def add_item(self, scene_name, item_id, source_name):
+        with self.lock:
+            if self.scenes is not None and item_id is not None:
+                self.scenes.setdefault(scene_name, {})[item_id] = source_name
+
+    def remove_item(self, scene_name, item_id):
+        with self.lock:
+            if self.scenes is not None:
+                self.scenes.get(scene_name, {}).pop(item_id, None)
+
+    def remove_source(self, source_name):
+        """
+        Removes all the items referring to `source_name` (fired when a source is destroyed)
+        """
+        with self.lock:
+            for items in (self.scenes or {}).values():
+                for item_id in [id_ for id_, name_ in items.items() if name_ == source_name]:
+                    items.pop(item_id)
+
+    def rename_source(self, previous_name, new_name):
+        with self.lock:
+            if self.current_scene == previous_name:
+                self.current_scene = new_name
+            if self.scenes is None:
+                return
+            if previous_name in self.scenes:
+                self.scenes[new_name] = self.scenes.pop(previous_name)
+            for items in self.scenes.values():
+                for item_id, name_ in items.items():
+                    if name_ == previous_name:
+                        items[item_id] = new_name
+
+    def on_event(self, message):
+        """
+        Applies an obs event to the mirror
+        """
+        name = message.name
+        if name == "SwitchScenes":
+            self.set_current_scene(message.getSceneName())
+        elif name == "SceneItemAdded":
+            self.add_item(message.getSceneName(), message.getItemId(), message.getItemName())
+        elif name == "SceneItemRemoved":
+            self.remove_item(message.getSceneName(), message.getItemId())
+        elif name == "SourceCreated" and message.getSourceType() == "scene":
+            self.add_scene(message.getSourceName())
+        elif name == "SourceDestroyed":
+            self._on_source_destroyed(message)
+        elif name == "SourceRenamed":
+            self.rename_source(message.getPreviousName(), message.getNewName())
+        elif name == "ScenesChanged":
+            self._on_scenes_changed(message)
+        elif name == "SceneCollectionChanged":
+            self.invalidate()
+
+    def _on_source_destroyed(self, message):
+        if message.getSourceType() == "scene":
+            self.remove_scene(message.getSourceName())
+        else:
+            self.remove_source(message.getSourceName())
+
+    def _on_scenes_changed(self, message):
+        if message.datain.get("scenes") is not None:  # obs-websocket >= 4.9 sends the whole list
+            self.seed(message.datain["scenes"])
+        else:
+            self.invalidate()
+
+
+class SourceState:
+    """
+    Local record of the sources' volume (in decibels), sync offset (in milliseconds) and mute state.
+    Kept authoritative from SourceVolumeChanged, SourceAudioSyncOffsetChanged and SourceMuteStateChanged events,
+    so getters don't have to go over the wire.
+    Every value has a timestamp (`time.time()`) of when it was last confirmed by obs.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sources = {}  # {"source_name": {"field": {"value": ..., "updated_at": ...}, ...}, ...}
+        self.hits = 0
+        self.misses = 0
+        self.on_change = None  # on_change(source_name, field, {"value": ..., "updated_at": ...}), called on `set()`
+
+    def get(self, source_name, field):
+        """
+        :param field: "volume_db", "sync_offset" or "muted"
+        :return: {"value": ..., "updated_at": ...} or None if unknown
+        """
+        with self.lock:
+            state = self.sources.get(source_name, {}).get(field)
+            if state is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return dict(state)
+
+    def updated_at(self, source_name, field):
+        with self.lock:
+            return self.sources.get(source_name, {}).get(field, {}).get("updated_at")
+
+    def set(self, source_name, field, value):
+        state = {"value": value, "updated_at": time.time()}
+        with self.lock:
+            self.sources.setdefault(source_name, {})[field] = state
+        if self.on_change is not None:
+            self.on_change(source_name, field, dict(state))
+
+    def snapshot(self, source_names):
+        """
+        :return: {"source_name": {"field": {"value": ..., "updated_at": ...}, ...}, ...}
+        """
+        with self.lock:
+            return {
+                name: {field: dict(state) for field, state in self.sources.get(name, {}).items()}
+                for name in source_names
+            }
+
+    def invalidate(self, source_name=None):
+        with self.lock:
+            if source_name is None:
+                self.sources = {}
+            else:
+                self.sources.pop(source_name, None)
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+    def on_event(self, message):
+        """
+        Applies an obs event to the record
+        """
+        name = message.name
+        if name == "SourceVolumeChanged":
+            volume_db = message.datain.get("volumeDb")  # obs-websocket >= 4.9
+            if volume_db is None:
+                volume_db = mul_to_db(message.getVolume())
+            self.set(message.getSourceName(), "volume_db", volume_db)
+        elif name == "SourceAudioSyncOffsetChanged":
+            self.set(message.getSourceName(), "sync_offset", message.getSyncOffset() // 1_000_000)
+        elif name == "SourceMuteStateChanged":
+            self.set(message.getSourceName(), "muted", message.getMuted())
+        elif name == "SourceDestroyed":
+            self.invalidate(message.getSourceName())
+        elif name == "SourceRenamed":
+            with self.lock:
+                if message.getPreviousName() in self.sources:
+                    self.sources[message.getNewName()] = self.sources.pop(message.getPreviousName())
+        elif name == "SceneCollectionChanged":
+            self.invalidate()
+
+
+class MediaPool:
+    """
+    LRU pool of preloaded media sources, keyed by file path.
+    Preloaded sources are hidden and paused, so playing them only requires
+    flipping their visibility and seeking to 0.
+    """
+
+    def __init__(self, capacity=DEFAULT_MEDIA_POOL_SIZE):
+        self.lock = threading.Lock()
+        self.capacity = capacity
+        self.entries = OrderedDict()  # {"path": {"source_name": "...", "scene_name": "...", "in_use": False}, ...}
+        self.seq = itertools.count()
+
+    def new_source_name(self):
+        return f"{PRELOAD_INPUT_PREFIX}{next(self.seq)}"
+
+    def get(self, path):
+        """
+        :return: the entry of preloaded `path` (and marks it as the most recently used), or None
+        """
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None:
+                self.entries.move_to_end(path)
+            return entry
+
+    def add(self, path, source_name, scene_name):
+        """
+        Adds a preloaded source
+        :return: list of evicted entries, their sources should be removed
+        """
+        with self.lock:
+            self.entries[path] = {"source_name": source_name, "scene_name": scene_name, "in_use": False}
+            self.entries.move_to_end(path)
+            return self._evict()
+
+    def remove(self, path):
+        with self.lock:
+            return self.entries.pop(path, None)
+
+    def remove_source(self, source_name):
+        """
+        Forgets the entry of the source `source_name` (e.g. when the source has been removed from obs)
+        """
+        with self.lock:
+            for path, entry in list(self.entries.items()):
+                if entry["source_name"] == source_name:
+                    del self.entries[path]
+
+    def owns(self, source_name):
+        """
+        :return: True if `source_name` is a preloaded source of the pool
+        """
+        with self.lock:
+            return any(entry["source_name"] == source_name for entry in self.entries.values())
+
+    def clear(self):
+        """
+        Forgets all the entries (e.g. when obs has been restarted and the sources are gone)
+        """
+        with self.lock:
+            self.entries.clear()
+
+    def set_in_use(self, path, in_use):
+        """
+        Sources being played are never evicted
+        """
+        with self.lock:
+            if path in self.entries:
+                self.entries[path]["in_use"] = in_use
+
+    def resize(self, capacity):
+        """
+        :return: list of evicted entries
+        """
+        with self.lock:
+            self.capacity = capacity
+            return self._evict()
+
+    def _evict(self):
+        evicted = []
+        for path in list(self.entries):
+            if len(self.entries) <= self.capacity:
+                break
+            if not self.entries[path]["in_use"]:
+                evicted.append(self.entries.pop(path))
+        return evicted
 
 
 class OBS:
-    def __init__(self, lang, client):
+    """
+    Controls a single obs instance through `client` (an `obs_client.OBSClient`).
+    Methods which map to plain requests also have `*_async` coroutine versions,
+    they must be awaited on the client's event loop.
+    """
+
+    def __init__(self, lang, client, media_pool_size=DEFAULT_MEDIA_POOL_SIZE):
         self.lang = lang
-        self.client = client
+        self.latency_stats = LatencyStats()
+        self.client = InstrumentedClient(client, self.latency_stats)
         self.original_media_source = None
-        self.media_queue = []
-        self.callback_queue = []  # list of
+        self.sidechain_settings = None  # set by `setup_sidechain()`, kept by `setup_scenes()`
+        self.media_queue = []  # list of paths of the media to be played next (playlist)
+        # guards `media_queue`, `media_active`, `media_source_name`, `media_started` and `pending_media_start`
+        self.media_lock = threading.RLock()
+        self.media_active = False  # whether media (or a transition around it) is being played
+        self.media_source_name = None  # name of the source playing the current media
+        self.media_started = None  # Future resolved once the current media is shown (see `run_media_at()`)
+        self.pending_media_start = None  # (TimerHandle, Future) of the start scheduled by `run_media_at()`
+        self.media_state = {"playing": None, "updated_at": None}  # "playing" - path of the media being played
+        self.streaming_state = {"value": None, "updated_at": None}  # whether obs is streaming, None if unknown
 
         self.transition_name = "Cut"
         self.transition_path = ""
         self.transition_point = 0
 
-        self.media_cb_thread = CallbackThread(self)
-        self.media_cb_thread.start()
+        self.scene_cache = SceneCache()
+        self.media_pool = MediaPool(capacity=media_pool_size)
+        self.source_state = SourceState()
+        self.source_state.on_change = self._on_source_state_change
+        self.playing_media = {}  # {"media"/"transition": "path"}, preloaded media being played
+
+        self.scheduler = get_scheduler()
+        self.media_timers = set()  # handles of pending media callbacks of this instance
+        self.media_timers_lock = threading.Lock()
+
+        # on_state_change(path, value), called when a part of `get_state()` changes, e.g.
+        # (["sources", "ts_input", "volume_db"], {"value": -3.0, "updated_at": ...})
+        self.on_state_change = None
 
         self.client.register(create_event_handler(self))
 
@@ -115,6 +826,7 @@ class OBS:
                 f"E PYSERVER::OBS::add_original_media_source(): "
                 f"datain: {response.datain}, dataout: {response.dataout}"
             )
+        self.scene_cache.add_item(scene_name, response.datain.get("itemId"), ORIGINAL_STREAM_SOURCE_NAME)
 
         request = obs.requests.SetAudioMonitorType(sourceName=ORIGINAL_STREAM_SOURCE_NAME, monitorType="none")
         response = self.client.call(request)
@@ -125,17 +837,33 @@ class OBS:
                 f"datain: {response.datain}, dataout: {response.dataout}"
             )
 
+    def update_original_media_source(self, original_media_source):
+        """
+        Points the original media source at another url with a single SetSourceSettings request,
+        the source keeps its scene item and filters
+        :param original_media_source: url like 'protocol://address[:port][/path][...]', may be rtmp, srt
+        """
+        self.original_media_source = original_media_source
+        response = self.client.call(
+            obs.requests.SetSourceSettings(
+                sourceName=ORIGINAL_STREAM_SOURCE_NAME, sourceSettings={"input": original_media_source}
+            )
+        )
+        if not response.status:
+            raise Exception(
+                f"E PYSERVER::OBS::update_original_media_source(): "
+                f"datain: {response.datain}, dataout: {response.dataout}"
+            )
+
     def setup_scene(self, scene_name="main", switch_scene=True):
         """
         Creates (if not been created) a scene called `scene_name` and sets it as a current scene.
         If it has been created, removes all the sources inside the scene and sets it as a current one.
         """
-        scenes = self.client.call(
-            obs.requests.GetSceneList()
-        ).getScenes()  # [... {'name': '...', 'sources': [...]}, ...]
+        self._ensure_scene_cache()
 
         # if such scene has already been created
-        if any([x["name"] == scene_name for x in scenes]):
+        if self.scene_cache.has_scene(scene_name):
             self.clear_scene(scene_name)
         else:
             self.create_scene(scene_name)
@@ -147,74 +875,649 @@ class OBS:
         """
         Lists all the scenes and removes all the scene items.
         """
-        scenes = self.obsws_get_scene_list()
-        for scene_info in scenes:
-            scene_name = scene_info["name"]
-            self.clear_scene(scene_name)
+        self._ensure_scene_cache()
+        batch = self.batch("clear_all_scenes")
+        for scene_name in self.scene_cache.scene_names():
+            self._clear_scene(batch, scene_name)
+        batch.send()
 
     def clear_scene(self, scene_name):
         """
         Removes all the items from a specified scene
         """
-        items = self.obsws_get_scene_item_list(scene_name=scene_name)
-        for item in items:
-            self.delete_scene_item(item_id=item["itemId"], source_name=item["sourceName"], scene_name=scene_name)
+        batch = self.batch("clear_scene")
+        self._clear_scene(batch, scene_name)
+        batch.send()
+
+    def _clear_scene(self, batch, scene_name):
+        self._ensure_scene_cache()
+        for item in self.scene_cache.scene_items(scene_name):
+            self._delete_scene_item(
+                batch, item_id=item["itemId"], source_name=item["sourceName"], scene_name=scene_name
+            )
 
     def set_current_scene(self, scene_name):
         """
         Switches current scene to `scene_name`
         """
-        self.client.call(obs.requests.SetCurrentScene(scene_name=scene_name))
+        response = self.client.call(obs.requests.SetCurrentScene(scene_name=scene_name))
+        if response.status:
+            self.scene_cache.set_current_scene(scene_name)
 
     def create_scene(self, scene_name):
         """
         Creates a scene with name `scene_name`
         """
-        self.client.call(obs.requests.CreateScene(sceneName=scene_name))
+        response = self.client.call(obs.requests.CreateScene(sceneName=scene_name))
+        if response.status:
+            self.scene_cache.add_scene(scene_name)
+
+    def setup_scenes(self, original_media_source):
+        """
+        Brings the scenes to the default layout (see `build_scene_spec()`), touching only what differs from it
+        :param original_media_source: url like 'protocol://address[:port][/path][...]', may be rtmp, srt
+        :return: number of requests sent to fix the differences
+        """
+        self.original_media_source = original_media_source
+        return self.reconcile_scenes(build_scene_spec(original_media_source, self.sidechain_settings))
+
+    def reconcile_scenes(self, spec):
+        """
+        Brings obs scenes to the state described by `spec`, sending only the requests needed to fix the differences:
+        missing scenes and sources are created, differing settings, audio monitor types and filters are updated,
+        scene items not described by the spec are removed (scenes not described by the spec are left empty,
+        obs-websocket 4.x can't remove scenes), except the preloaded and playing media (see `_is_media_item()`).
+        Sources of a wrong kind are recreated.
+        The live state is taken from the scene cache and a single pipelined batch of
+        GetSourceSettings/GetSourceFilters/GetAudioMonitorType requests.
+        :param spec: dictionary,
+        e.g. {"current_scene": "main",
+              "scenes": {"main": {"source_name": {"kind": "ffmpeg_source",
+                                                  "settings": {...},
+                                                  "monitor_type": "none",  # optional
+                                                  "filters": {"filter_name": {"type": "...",
+                                                                              "settings": {...},
+                                                                              "enabled": True}}},
+                                  ...}}}
+        where "filters" is optional, the filters of a source are not managed if it's not specified
+        :return: number of requests sent to fix the differences
+        """
+        self._ensure_scene_cache()
+        scenes = spec["scenes"]
+
+        live = self._query_sources(scenes)
+        batch = self.batch("reconcile_scenes")
+        kept = self._remove_unexpected_items(batch, scenes, live)
+
+        for scene_name, sources in scenes.items():
+            if not self.scene_cache.has_scene(scene_name):
+                batch.add(
+                    obs.requests.CreateScene(sceneName=scene_name),
+                    "CreateScene",
+                    on_success=lambda r, scene_name=scene_name: self.scene_cache.add_scene(scene_name),
+                )
+            for source_name, source_spec in sources.items():
+                if (scene_name, source_name) in kept:
+                    self._update_source(batch, source_name, source_spec, live[source_name])
+                else:
+                    self._create_source(batch, scene_name, source_name, source_spec)
+
+        current_scene = spec.get("current_scene")
+        if current_scene is not None and self.get_current_scene_name() != current_scene:
+            batch.add(
+                obs.requests.SetCurrentScene(scene_name=current_scene),
+                "SetCurrentScene",
+                on_success=lambda r: self.scene_cache.set_current_scene(current_scene),
+            )
+
+        batch.send()
+        return len(batch)
+
+    def _query_sources(self, scenes):
+        """
+        Queries the live state of the sources of `scenes` (see `reconcile_scenes()`) which are already in place
+        :return: {"source_name": {"settings": request, "filters": request, "monitor_type": request}, ...},
+        sources which couldn't be queried or are of a wrong kind are left out (so they are recreated)
+        """
+        queries = self.batch("reconcile_scenes")
+        live = {}
+        for scene_name, sources in scenes.items():
+            for source_name, source_spec in sources.items():
+                if not self.scene_cache.find_source(source_name, scene_name):
+                    continue
+                live[source_name] = {
+                    "settings": queries.add(
+                        obs.requests.GetSourceSettings(sourceName=source_name), on_failure=lambda r: None
+                    )
+                }
+                if source_spec.get("filters") is not None:
+                    live[source_name]["filters"] = queries.add(
+                        obs.requests.GetSourceFilters(sourceName=source_name), on_failure=lambda r: None
+                    )
+                if "monitor_type" in source_spec:
+                    live[source_name]["monitor_type"] = queries.add(
+                        obs.requests.GetAudioMonitorType(sourceName=source_name), on_failure=lambda r: None
+                    )
+        queries.send()
+
+        kinds = {
+            source_name: source_spec["kind"]
+            for sources in scenes.values()
+            for source_name, source_spec in sources.items()
+        }
+        return {
+            source_name: requests_
+            for source_name, requests_ in live.items()
+            if all(request.status for request in requests_.values())
+            and requests_["settings"].getSourceType() == kinds[source_name]
+        }
+
+    def _remove_unexpected_items(self, batch, scenes, live):
+        """
+        Adds the requests removing the items which are not described by `scenes` (or duplicate the described ones,
+        or are not in the `live` state) to `batch`
+        :return: {(scene_name, source_name), ...} of the items which are kept
+        """
+        kept = set()
+        for scene_name in self.scene_cache.scene_names():
+            for item in self.scene_cache.scene_items(scene_name):
+                source_name = item["sourceName"]
+                if self._is_media_item(source_name):
+                    continue
+                if (
+                    source_name in scenes.get(scene_name, {})
+                    and source_name in live
+                    and (scene_name, source_name) not in kept
+                ):
+                    kept.add((scene_name, source_name))
+                    continue
+                self._delete_scene_item(batch, item_id=item["itemId"], source_name=source_name, scene_name=scene_name)
+                self.media_pool.remove_source(source_name)
+        return kept
+
+    def _is_media_item(self, source_name):
+        """
+        :return: True if `source_name` is managed by the media methods: a preloaded source of the media pool,
+        or the media (or transition) being played
+        """
+        if self.media_pool.owns(source_name):
+            return True
+        with self.media_lock:
+            return self.media_active and source_name in (MEDIA_INPUT_NAME, TRANSITION_INPUT_NAME)
+
+    def _create_source(self, batch, scene_name, source_name, source_spec):
+        """
+        Adds the requests creating the source `source_name` as described by `source_spec` to `batch`
+        """
+
+        def on_created(request):
+            self.scene_cache.add_item(scene_name, request.datain.get("itemId"), source_name)
+            self.source_state.invalidate(source_name)
+
+        batch.add(
+            obs.requests.CreateSource(
+                sourceName=source_name,
+                sourceKind=source_spec["kind"],
+                sceneName=scene_name,
+                sourceSettings=source_spec.get("settings") or None,
+            ),
+            "CreateSource",
+            on_success=on_created,
+        )
+        if "monitor_type" in source_spec:
+            batch.add(
+                obs.requests.SetAudioMonitorType(sourceName=source_name, monitorType=source_spec["monitor_type"]),
+                "SetAudioMonitorType",
+            )
+        for filter_name, filter_spec in (source_spec.get("filters") or {}).items():
+            self._add_filter(batch, source_name, filter_name, filter_spec)
+
+    def _update_source(self, batch, source_name, source_spec, live):
+        """
+        Adds the requests fixing the differences between `source_spec` and the `live` state of the source to `batch`
+        :param live: {"settings": GetSourceSettings, "filters": GetSourceFilters, "monitor_type": GetAudioMonitorType}
+        (populated requests, "filters" and "monitor_type" are present if they are managed by `source_spec`)
+        """
+        settings = live["settings"].getSourceSettings() or {}
+        changed = {
+            key: value for key, value in (source_spec.get("settings") or {}).items() if settings.get(key) != value
+        }
+        if changed:
+            batch.add(
+                obs.requests.SetSourceSettings(sourceName=source_name, sourceSettings=changed), "SetSourceSettings"
+            )
+
+        if "monitor_type" in source_spec and live["monitor_type"].getMonitorType() != source_spec["monitor_type"]:
+            batch.add(
+                obs.requests.SetAudioMonitorType(sourceName=source_name, monitorType=source_spec["monitor_type"]),
+                "SetAudioMonitorType",
+            )
+
+        filters_spec = source_spec.get("filters")
+        if filters_spec is None:
+            return
+        filters = {filter_["name"]: filter_ for filter_ in live["filters"].getFilters() or []}
+
+        for filter_name, filter_ in filters.items():
+            if filter_name not in filters_spec or filter_["type"] != filters_spec[filter_name]["type"]:
+                batch.add(
+                    obs.requests.RemoveFilterFromSource(sourceName=source_name, filterName=filter_name),
+                    "RemoveFilterFromSource",
+                )
+        for filter_name, filter_spec in filters_spec.items():
+            filter_ = filters.get(filter_name)
+            if filter_ is None or filter_["type"] != filter_spec["type"]:
+                self._add_filter(batch, source_name, filter_name, filter_spec)
+                continue
+            settings = filter_.get("settings") or {}
+            changed = {
+                key: value for key, value in (filter_spec.get("settings") or {}).items() if settings.get(key) != value
+            }
+            if changed:
+                batch.add(
+                    obs.requests.SetSourceFilterSettings(
+                        sourceName=source_name, filterName=filter_name, filterSettings=changed
+                    ),
+                    "SetSourceFilterSettings",
+                )
+            if filter_.get("enabled", True) != filter_spec.get("enabled", True):
+                batch.add(
+                    obs.requests.SetSourceFilterVisibility(
+                        sourceName=source_name, filterName=filter_name, filterEnabled=filter_spec.get("enabled", True)
+                    ),
+                    "SetSourceFilterVisibility",
+                )
+
+    def _add_filter(self, batch, source_name, filter_name, filter_spec):
+        batch.add(
+            obs.requests.AddFilterToSource(
+                sourceName=source_name,
+                filterName=filter_name,
+                filterType=filter_spec["type"],
+                filterSettings=filter_spec.get("settings") or {},
+            ),
+            "AddFilterToSource",
+        )
+        if not filter_spec.get("enabled", True):
+            batch.add(
+                obs.requests.SetSourceFilterVisibility(
+                    sourceName=source_name, filterName=filter_name, filterEnabled=False
+                ),
+                "SetSourceFilterVisibility",
+            )
 
     def run_media(self, path):
         """
         Mutes original media, adds and runs the media located at `path`, and appends a listener which removes
         the media when it has finished. Fires Exception when couldn't add or mute a source.
+        Every step is sent as a `RequestBatch`. Preloaded media (see `preload_media()`)
+        is started by showing its hidden source, otherwise the source is created.
+        Replaces the playlist, if any (see `enqueue_media()`).
         """
+        self._cancel_pending_media_start(RuntimeError("the media has been replaced"))
+        with self.media_lock:
+            self.media_queue = []
+        self._play_media(path)
 
-        def transition_end_foo():
-            self.delete_source(source_name=TRANSITION_INPUT_NAME)
-            self.set_source_mute(False)
-            self.set_ts_mute(False)
-            self.media_cb_thread.clean_callbacks()
+    def run_media_at(self, path, start_at):
+        """
+        The same as `run_media()`, but started exactly at `start_at` (unix timestamp, immediately if it has passed),
+        so several instances can start the media simultaneously. The media is preloaded, then the start is scheduled
+        :return: concurrent.futures.Future, resolved with the unix timestamp the media has been shown at
+        (after the stinger's transition point, if any), failed if the playback has been aborted, reset or replaced
+        (also before `start_at`)
+        """
+        self._cancel_pending_media_start(RuntimeError("the media has been replaced"))
+        self.preload_media([path])
+        started = Future()
+
+        def start():
+            with self.media_lock:
+                if self.pending_media_start is None or self.pending_media_start[1] is not started:
+                    return  # cancelled right when the deadline has come
+                self.pending_media_start = None
+                self.media_queue = []
+            self._play_media(path, started)
+
+        with self.media_lock:
+            # not a media callback, so the end of the media being played doesn't cancel it.
+            # The wall clock deadline is converted once, so the scheduler isn't affected by wall clock adjustments
+            handle = self.scheduler.call_at(
+                time.monotonic() + start_at - time.time(), lambda: self._run_media_step(start)
+            )
+            self.pending_media_start = (handle, started)
+        return started
 
-        def media_end_foo():
-            self.delete_source(source_name=MEDIA_INPUT_NAME)
-            if self.transition_name == "Stinger":
-                self._run_media(self.transition_path, TRANSITION_INPUT_NAME)
-            self.media_cb_thread.append_callback(transition_end_foo, self.transition_point / 1000)
+    def _cancel_pending_media_start(self, error):
+        """
+        Cancels the start scheduled by `run_media_at()`, if any, and fails its Future with `error`
+        """
+        with self.media_lock:
+            pending, self.pending_media_start = self.pending_media_start, None
+        if pending is None:
+            return
+        handle, started = pending
+        handle.cancel()
+        if not started.done():
+            started.set_exception(error)
 
-        def media_play_foo():
-            # delay at self.transition_point / 1000
-            try:
-                self._run_media(path, MEDIA_INPUT_NAME)
-                self.delete_source(source_name=TRANSITION_INPUT_NAME)
-                self.set_ts_mute(True)
-                duration = self.client.call(
-                    obs.requests.GetMediaDuration(sourceName=MEDIA_INPUT_NAME)
-                ).getMediaDuration()
-                self.media_cb_thread.append_callback(media_end_foo, duration / 1000)
-            except Exception as ex:
-                self.delete_source(MEDIA_INPUT_NAME)
-                self.set_source_mute(False)
-                self.set_ts_mute(False)
-                raise ex
+    def enqueue_media(self, paths):
+        """
+        Appends media to the playlist. Every item starts exactly when the previous one ends
+        (or after the stinger's transition point), the next item is preloaded while the current one plays.
+        Starts playing if nothing is being played.
+        """
+        with self.media_lock:
+            self.media_queue.extend(paths)
+            path = self.media_queue.pop(0) if not self.media_active and self.media_queue else None
+
+        if path is not None:
+            self._play_media(path)
+        else:
+            self._preload_next_media()
+
+    def get_media_queue(self):
+        with self.media_lock:
+            return list(self.media_queue)
 
-        self.media_cb_thread.clean_callbacks()
-        self.delete_source(MEDIA_INPUT_NAME)
+    def _play_media(self, path, started=None):
+        """
+        Starts the transition (if any) with original media and teamspeak muted,
+        and schedules the media start at the transition point
+        :param started: Future to resolve with the unix timestamp the media has been shown at (optional)
+        """
+        self.cancel_media_callbacks()
+        self._settle_media_started(error=RuntimeError("the media has been replaced"))
+        with self.media_lock:
+            self.media_active = True
+            self.media_started = started
+
+        batch = self.batch("run_media")
+        self._stop_media(batch, MEDIA_INPUT_NAME)
+        if self.transition_name == "Stinger":
+            self._start_media(batch, self.transition_path, TRANSITION_INPUT_NAME)
+        self._set_mute(batch, ORIGINAL_STREAM_SOURCE_NAME, True)  # mute main source
+        self._set_mute(batch, TS_INPUT_NAME, True)  # mute main source
+        batch.send()
+
+        self.schedule_media_callback(lambda: self._on_media_start(path), self.transition_point / 1000)
+
+    def _on_media_start(self, path):
+        # called at the transition point
+        batch = self.batch("run_media")
+        source_name = self._start_media(batch, path, MEDIA_INPUT_NAME)
+        self._stop_media(batch, TRANSITION_INPUT_NAME)
+        self._set_mute(batch, TS_INPUT_NAME, True)
+        duration = batch.add(obs.requests.GetMediaDuration(sourceName=source_name), on_failure=lambda r: None)
+        started_at, shown_at = time.monotonic(), time.time()
+        batch.send()
+        with self.media_lock:
+            self.media_source_name = source_name
+        self._set_media_state(path)
+        self._settle_media_started(result=shown_at)
+        if not self._schedule_media_end(started_at, duration):
+            self.schedule_media_callback(
+                lambda: self._poll_media_end(source_name, started_at), MEDIA_DURATION_POLL_INTERVAL
+            )
+
+        self._preload_next_media()
+
+    def _schedule_media_end(self, position_at, duration, position=None):
+        """
+        Schedules `_on_media_end()` at the end of the media
+        :param position_at: `time.monotonic()` the media was at `position` at
+        :param duration: populated GetMediaDuration request
+        :param position: populated GetMediaTime request, None - the media was at the beginning
+        :return: False if the duration is unknown (a just created source reports 0 until it has opened the file)
+        """
+        if not duration.status or not duration.getMediaDuration():
+            return False
+        position_ms = position.getTimestamp() if position is not None and position.status else 0
+        # the end is scheduled relative to the request time, not to the time the responses arrived
+        self.schedule_media_callback_at(
+            self._on_media_end, position_at + (duration.getMediaDuration() - position_ms) / 1000
+        )
+        return True
+
+    def _poll_media_end(self, source_name, started_at):
+        # polls the media until its duration is known, media which never reports it is polled until it has ended
+        batch = self.batch("run_media")
+        duration = batch.add(obs.requests.GetMediaDuration(sourceName=source_name), on_failure=lambda r: None)
+        position = batch.add(obs.requests.GetMediaTime(sourceName=source_name), on_failure=lambda r: None)
+        state = batch.add(obs.requests.GetMediaState(sourceName=source_name), on_failure=lambda r: None)
+        position_at = time.monotonic()
+        batch.send()
+
+        if state.status and state.getMediaState() in MEDIA_ENDED_STATES:
+            self._on_media_end()
+        elif not self._schedule_media_end(position_at, duration, position):
+            polling_duration = time.monotonic() - started_at < MEDIA_DURATION_POLL_TIMEOUT
+            self.schedule_media_callback(
+                lambda: self._poll_media_end(source_name, started_at),
+                MEDIA_DURATION_POLL_INTERVAL if polling_duration else MEDIA_STATE_POLL_INTERVAL,
+            )
+
+    def _on_media_end(self):
+        # called when the media has finished
+        with self.media_lock:
+            next_path = self.media_queue.pop(0) if self.media_queue else None
 
+        batch = self.batch("run_media")
+        self._stop_media(batch, MEDIA_INPUT_NAME)
         if self.transition_name == "Stinger":
-            self._run_media(self.transition_path, TRANSITION_INPUT_NAME)
-        self.set_source_mute(True)  # mute main source
-        self.set_ts_mute(True)  # mute main source
+            self._start_media(batch, self.transition_path, TRANSITION_INPUT_NAME)
+        batch.send()
+        self._set_media_state(None)
+
+        if next_path is not None:
+            # original media and teamspeak stay muted between the playlist items
+            self.schedule_media_callback(lambda: self._on_media_start(next_path), self.transition_point / 1000)
+        else:
+            self.schedule_media_callback(self._on_transition_end, self.transition_point / 1000)
+
+    def _on_transition_end(self):
+        # called when the transition after the last media has finished
+        with self.media_lock:
+            self.media_active = False
+            self.media_source_name = None
+        batch = self.batch("run_media")
+        self._stop_media(batch, TRANSITION_INPUT_NAME)
+        self._set_mute(batch, ORIGINAL_STREAM_SOURCE_NAME, False)
+        self._set_mute(batch, TS_INPUT_NAME, False)
+        batch.send()
+        self.cancel_media_callbacks()
+
+    def _settle_media_started(self, result=None, error=None):
+        """
+        Resolves (or fails, if `error` is set) the Future passed to `_play_media()`, if any
+        """
+        with self.media_lock:
+            started, self.media_started = self.media_started, None
+        if started is None or started.done():
+            return
+        if error is not None:
+            started.set_exception(error)
+        else:
+            started.set_result(result)
 
-        self.media_cb_thread.append_callback(media_play_foo, self.transition_point / 1000)
+    def _abort_media(self):
+        """
+        Stops the media and the transition and unmutes original media and teamspeak
+        (called when a step of the playback has failed, so the instance isn't left muted)
+        """
+        self.cancel_media_callbacks()
+        error = RuntimeError("the media playback has been aborted")
+        self._cancel_pending_media_start(error)
+        self._settle_media_started(error=error)
+        with self.media_lock:
+            self.media_active = False
+            self.media_source_name = None
+        self._set_media_state(None)
+        batch = self.batch("run_media")
+        self._stop_media(batch, MEDIA_INPUT_NAME)
+        self._stop_media(batch, TRANSITION_INPUT_NAME)
+        self._set_mute(batch, ORIGINAL_STREAM_SOURCE_NAME, False)
+        self._set_mute(batch, TS_INPUT_NAME, False)
+        batch.send()
+
+    def _preload_next_media(self):
+        with self.media_lock:
+            next_paths = self.media_queue[:1]
+        if next_paths:
+            self.preload_media(next_paths)
+
+    def preload_media(self, paths):
+        """
+        Creates hidden, paused media sources for `paths` in the current scene,
+        so `run_media()` can start them without opening and probing the files.
+        The least recently used preloaded sources are removed when the pool is full.
+        """
+        self._ensure_scene_cache()
+        scene_name = self.get_current_scene_name()
+        batch = self.batch("preload_media")
+        evicted = []
+
+        def on_created(request, path, source_name):
+            self.scene_cache.add_item(scene_name, request.datain.get("itemId"), source_name)
+            evicted.extend(self.media_pool.add(path, source_name, scene_name))
+
+        for path in paths:
+            if self._get_preloaded(path, scene_name) is not None:
+                continue
+            source_name = self.media_pool.new_source_name()
+            batch.add(
+                obs.requests.CreateSource(
+                    sourceName=source_name,
+                    sourceKind="ffmpeg_source",
+                    sceneName=scene_name,
+                    sourceSettings={"local_file": path, "restart_on_activate": False, "close_when_inactive": False},
+                    setVisible=False,
+                ),
+                "CreateSource",
+                on_success=lambda r, p=path, n=source_name: on_created(r, p, n),
+            )
+            batch.add(obs.requests.PlayPauseMedia(sourceName=source_name, playPause=True), "PlayPauseMedia")
+        batch.send()
+
+        if evicted:
+            batch = self.batch("preload_media")
+            for entry in evicted:
+                self._delete_source(batch, entry["source_name"], entry["scene_name"])
+            batch.send()
+
+    def _get_preloaded(self, path, scene_name):
+        """
+        :return: pool entry of `path` preloaded into `scene_name`, or None.
+        Entries whose sources are gone (e.g. the scene was cleared) are dropped.
+        """
+        entry = self.media_pool.get(path)
+        if entry is None:
+            return None
+        self._ensure_scene_cache()
+        if not self.scene_cache.find_source(entry["source_name"], entry["scene_name"]):
+            self.media_pool.remove(path)
+            return None
+        return entry if entry["scene_name"] == scene_name else None
+
+    def _start_media(self, batch, path, role, scene_name=None):
+        """
+        Adds the requests starting the media located at `path` to `batch`
+        :param role: MEDIA_INPUT_NAME or TRANSITION_INPUT_NAME
+        :return: name of the source which plays the media
+        """
+        if scene_name is None:
+            scene_name = self.get_current_scene_name()
+
+        entry = self._get_preloaded(path, scene_name)
+        if entry is None:
+            self._run_media(batch, path, role, scene_name)
+            return role
+
+        source_name = entry["source_name"]
+        self.media_pool.set_in_use(path, True)
+        self.playing_media[role] = path
+        batch.add(obs.requests.SetSceneItemRender(source=source_name, render=True, scene_name=scene_name))
+        batch.add(obs.requests.SetMediaTime(sourceName=source_name, timestamp=0), "SetMediaTime")
+        batch.add(obs.requests.PlayPauseMedia(sourceName=source_name, playPause=False), "PlayPauseMedia")
+        return source_name
+
+    def _stop_media(self, batch, role):
+        """
+        Adds the requests stopping the media played as `role` to `batch`:
+        preloaded sources are hidden and paused (and stay warm), other sources are removed
+        """
+        self._delete_source(batch, role)
+
+        path = self.playing_media.pop(role, None)
+        entry = self.media_pool.get(path) if path is not None else None
+        if entry is None:
+            return
+        self.media_pool.set_in_use(path, False)
+        source_name, scene_name = entry["source_name"], entry["scene_name"]
+        if not self.scene_cache.find_source(source_name, scene_name):
+            return
+        batch.add(obs.requests.SetSceneItemRender(source=source_name, render=False, scene_name=scene_name))
+        batch.add(obs.requests.PlayPauseMedia(sourceName=source_name, playPause=True), "PlayPauseMedia")
+
+    def schedule_media_callback(self, foo, delay):
+        """
+        Schedules `foo` to be called in `delay` seconds
+        :return: TimerHandle
+        """
+        return self.schedule_media_callback_at(foo, time.monotonic() + delay)
+
+    def schedule_media_callback_at(self, foo, deadline):
+        """
+        Schedules `foo` to be called at `deadline` (`time.monotonic()` based, in seconds).
+        If `foo` fails, the playback is aborted (see `_abort_media()`)
+        :return: TimerHandle
+        """
+
+        def wrapper():
+            with self.media_timers_lock:
+                self.media_timers.discard(handle)
+            self._run_media_step(foo)
+
+        with self.media_timers_lock:
+            handle = self.scheduler.call_at(deadline, wrapper)
+            self.media_timers.add(handle)
+        return handle
+
+    def _run_media_step(self, foo):
+        try:
+            foo()
+        except Exception as ex:
+            print(f"E PYSERVER::OBS::_run_media_step(): lang: {self.lang}, details: {ex}")
+            self._abort_media()
+
+    def cancel_media_callbacks(self):
+        """
+        Cancels all the pending media callbacks of this instance
+        """
+        with self.media_timers_lock:
+            handles, self.media_timers = self.media_timers, set()
+        for handle in handles:
+            handle.cancel()
+
+    def reset_media(self):
+        """
+        Forgets the playlist and the media being played, without sending any requests
+        (used when the media sources are removed anyway, e.g. on scenes reset)
+        """
+        self.cancel_media_callbacks()
+        error = RuntimeError("the media playback has been reset")
+        self._cancel_pending_media_start(error)
+        self._settle_media_started(error=error)
+        with self.media_lock:
+            self.media_queue = []
+            self.media_active = False
+            self.media_source_name = None
+        self.playing_media = {}
+        self._set_media_state(None)
+
+    def _set_media_state(self, path):
+        self.media_state = {"playing": path, "updated_at": time.time()}
+        self._publish_state(["media"], dict(self.media_state))
 
     def setup_ts_sound(self):
         """
@@ -222,7 +1525,7 @@ class OBS:
         """
 
         self.delete_source(TS_INPUT_NAME)
-        current_scene = self.obsws_get_current_scene_name()
+        current_scene = self.get_current_scene_name()
 
         response = self.client.call(
             obs.requests.CreateSource(
@@ -236,6 +1539,7 @@ class OBS:
             raise Exception(
                 f"E PYSERVER::OBS::setup_ts_sound(): " f"datain: {response.datain}, dataout: {response.dataout}"
             )
+        self.scene_cache.add_item(current_scene, response.datain.get("itemId"), TS_INPUT_NAME)
 
     def setup_transition(self, transition_name="Cut", transition_settings=None):
         """
@@ -255,31 +1559,41 @@ class OBS:
                 raise Exception(f"W PYSERVER::OBS::setup_transition(): " f"no such file: {transition_settings['path']}")
             self.transition_path = transition_settings["path"]
             self.transition_point = int(transition_settings["transition_point"])
+            self.preload_media([self.transition_path])
         else:
             self.transition_point = 0
 
         self.transition_name = transition_name
 
-    def get_ts_sync_offset(self):
+    async def get_ts_sync_offset_async(self):
         """
-        Retrieves teamspeak sound sync offset
+        Retrieves teamspeak sound sync offset (in milliseconds), answered from the local state if known
         :return:
         """
-        response = self.client.call(obs.requests.GetSyncOffset(source=TS_INPUT_NAME))
+        state = self.source_state.get(TS_INPUT_NAME, "sync_offset")
+        if state is not None:
+            return state["value"]
+
+        response = await self.client.call_async(obs.requests.GetSyncOffset(source=TS_INPUT_NAME))
 
         if not response.status:
             raise Exception(
                 f"E PYSERVER::OBS::get_ts_sync_offset(): " f"datain: {response.datain}, dataout: {response.dataout}"
             )
 
-        return response.getOffset() // 1_000_000
+        offset = response.getOffset() // 1_000_000
+        self.source_state.set(TS_INPUT_NAME, "sync_offset", offset)
+        return offset
 
-    def set_ts_sync_offset(self, offset):
+    def get_ts_sync_offset(self):
+        return self.client.run_sync(self.get_ts_sync_offset_async())
+
+    async def set_ts_sync_offset_async(self, offset):
         """
         Sets teamspeak sound ('ts_input' source) sync offset
         :return:
         """
-        response = self.client.call(
+        response = await self.client.call_async(
             obs.requests.SetSyncOffset(
                 source=TS_INPUT_NAME,
                 offset=offset * 1_000_000,  # convert to nanoseconds (refer to documentation)
@@ -290,62 +1604,134 @@ class OBS:
             raise Exception(
                 f"E PYSERVER::OBS::set_ts_sync_offset(): " f"datain: {response.datain}, dataout: {response.dataout}"
             )
+        self.source_state.set(TS_INPUT_NAME, "sync_offset", offset)
 
-    def get_ts_volume_db(self):
+    def set_ts_sync_offset(self, offset):
+        self.client.run_sync(self.set_ts_sync_offset_async(offset))
+
+    async def get_ts_volume_db_async(self):
         """
-        Retrieves teamspeak sound volume (in decibels)
+        Retrieves teamspeak sound volume (in decibels), answered from the local state if known
         :return:
         """
-        response = self.client.call(obs.requests.GetVolume(source=TS_INPUT_NAME, useDecibel=True))
+        return await self.get_volume_db_async(TS_INPUT_NAME)
 
-        if not response.status:
-            raise Exception(
-                f"E PYSERVER::OBS::get_ts_volume_db(): " f"datain: {response.datain}, dataout: {response.dataout}"
-            )
-
-        return response.getVolume()
+    def get_ts_volume_db(self):
+        return self.client.run_sync(self.get_ts_volume_db_async())
 
-    def set_ts_volume_db(self, volume_db):
+    async def set_ts_volume_db_async(self, volume_db):
         """
         Sets teamspeak sound volume (in decibels)
         :param volume_db:
         :return:
         """
-        response = self.client.call(obs.requests.SetVolume(source=TS_INPUT_NAME, volume=volume_db, useDecibel=True))
+        await self.set_volume_db_async(TS_INPUT_NAME, volume_db)
 
-        if not response.status:
-            raise RuntimeError(
-                f"E PYSERVER::OBS::set_ts_volume_db(): " f"datain: {response.datain}, dataout: {response.dataout}"
-            )
+    def set_ts_volume_db(self, volume_db):
+        self.client.run_sync(self.set_ts_volume_db_async(volume_db))
 
-    def get_source_volume_db(self):
+    async def get_source_volume_db_async(self):
         """
-        Retrieves original source sound volume (in decibels)
+        Retrieves original source sound volume (in decibels), answered from the local state if known
         :return:
         """
-        response = self.client.call(obs.requests.GetVolume(source=ORIGINAL_STREAM_SOURCE_NAME, useDecibel=True))
-
-        if not response.status:
-            raise Exception(
-                f"E PYSERVER::OBS::get_source_volume_db(): " f"datain: {response.datain}, dataout: {response.dataout}"
-            )
+        return await self.get_volume_db_async(ORIGINAL_STREAM_SOURCE_NAME)
 
-        return response.getVolume()
+    def get_source_volume_db(self):
+        return self.client.run_sync(self.get_source_volume_db_async())
 
-    def set_source_volume_db(self, volume_db):
+    async def set_source_volume_db_async(self, volume_db):
         """
         Sets original source sound volume (in decibels)
         :param volume_db:
         :return:
         """
-        response = self.client.call(
-            obs.requests.SetVolume(source=ORIGINAL_STREAM_SOURCE_NAME, volume=volume_db, useDecibel=True)
+        await self.set_volume_db_async(ORIGINAL_STREAM_SOURCE_NAME, volume_db)
+
+    def set_source_volume_db(self, volume_db):
+        self.client.run_sync(self.set_source_volume_db_async(volume_db))
+
+    async def get_volume_db_async(self, source_name):
+        state = self.source_state.get(source_name, "volume_db")
+        if state is not None:
+            return state["value"]
+
+        response = await self.client.call_async(obs.requests.GetVolume(source=source_name, useDecibel=True))
+
+        if not response.status:
+            raise Exception(
+                f"E PYSERVER::OBS::get_volume_db(): "
+                f"source: {source_name}, datain: {response.datain}, dataout: {response.dataout}"
+            )
+
+        volume_db = response.getVolume()
+        self.source_state.set(source_name, "volume_db", volume_db)
+        return volume_db
+
+    async def set_volume_db_async(self, source_name, volume_db):
+        response = await self.client.call_async(
+            obs.requests.SetVolume(source=source_name, volume=volume_db, useDecibel=True)
         )
 
         if not response.status:
             raise RuntimeError(
-                f"E PYSERVER::OBS::set_source_volume_db(): " f"datain: {response.datain}, dataout: {response.dataout}"
+                f"E PYSERVER::OBS::set_volume_db(): "
+                f"source: {source_name}, datain: {response.datain}, dataout: {response.dataout}"
             )
+        self.source_state.set(source_name, "volume_db", volume_db)
+
+    async def get_mute_async(self, source_name):
+        """
+        Retrieves mute state of a source, answered from the local state if known
+        """
+        state = self.source_state.get(source_name, "muted")
+        if state is not None:
+            return state["value"]
+
+        response = await self.client.call_async(obs.requests.GetMute(source=source_name))
+        if not response.status:
+            raise Exception(f"E PYSERVER::OBS::get_mute(): " f"datain: {response.datain}, dataout: {response.dataout}")
+
+        muted = response.getMuted()
+        self.source_state.set(source_name, "muted", muted)
+        return muted
+
+    def get_mute(self, source_name):
+        return self.client.run_sync(self.get_mute_async(source_name))
+
+    async def sync_source_state_async(self):
+        """
+        (Re)seeds the local volume/sync offset/mute state of the original stream and teamspeak sources
+        and the streaming status, all the requests are sent as one pipelined batch
+        """
+        requests = {
+            (ORIGINAL_STREAM_SOURCE_NAME, "volume_db"): obs.requests.GetVolume(
+                source=ORIGINAL_STREAM_SOURCE_NAME, useDecibel=True
+            ),
+            (ORIGINAL_STREAM_SOURCE_NAME, "muted"): obs.requests.GetMute(source=ORIGINAL_STREAM_SOURCE_NAME),
+            (TS_INPUT_NAME, "volume_db"): obs.requests.GetVolume(source=TS_INPUT_NAME, useDecibel=True),
+            (TS_INPUT_NAME, "muted"): obs.requests.GetMute(source=TS_INPUT_NAME),
+            (TS_INPUT_NAME, "sync_offset"): obs.requests.GetSyncOffset(source=TS_INPUT_NAME),
+        }
+        streaming = obs.requests.GetStreamingStatus()
+        await self.client.call_many_async(list(requests.values()) + [streaming])
+
+        if streaming.status:
+            self._set_streaming_state(streaming.getStreaming())
+
+        self.source_state.invalidate()
+        for (source_name, field), response in requests.items():
+            if not response.status:
+                continue  # e.g. the source doesn't exist yet, it will be fetched on demand
+            if field == "volume_db":
+                self.source_state.set(source_name, field, response.getVolume())
+            elif field == "muted":
+                self.source_state.set(source_name, field, response.getMuted())
+            elif field == "sync_offset":
+                self.source_state.set(source_name, field, response.getOffset() // 1_000_000)
+
+    def sync_source_state(self):
+        self.client.run_sync(self.sync_source_state_async())
 
     def setup_sidechain(self, ratio=None, release_time=None, threshold=None):
         """
@@ -405,84 +1791,122 @@ class OBS:
                     f"E PYSERVER::OBS::setup_sidechain(): " f"datain: {response.datain}, dataout: {response.dataout}"
                 )
 
-    def set_stream_settings(self, server, key, type="rtmp_custom"):
+        # kept by the scenes reconciliation (see `setup_scenes()`)
+        self.sidechain_settings = dict(self.sidechain_settings or {}, **filterSettings)
+
+    async def set_stream_settings_async(self, server, key, type="rtmp_custom"):
         """
         Sets the streaming settings of the server
         """
         # TODO: validate server and key
         settings_ = {"server": server, "key": key}
 
-        response = self.client.call(obs.requests.SetStreamSettings(type=type, settings=settings_, save=True))
+        response = await self.client.call_async(
+            obs.requests.SetStreamSettings(type=type, settings=settings_, save=True)
+        )
         if not response.status:
             raise Exception(
                 f"E PYSERVER::OBS::set_stream_settings(): "
                 f"lang: {self.lang}, datain: {response.datain}, dataout: {response.dataout}"
             )
 
-    def start_streaming(self):
+    def set_stream_settings(self, server, key, type="rtmp_custom"):
+        self.client.run_sync(self.set_stream_settings_async(server, key, type))
+
+    async def start_streaming_async(self):
         """
         Starts the streaming
         """
-        response = self.client.call(obs.requests.StartStreaming())
+        response = await self.client.call_async(obs.requests.StartStreaming())
         if not response.status:
             raise Exception(
                 f"E PYSERVER::OBS::start_streaming(): "
                 f"lang: {self.lang}, datain: {response.datain}, dataout: {response.dataout}"
             )
 
-    def stop_streaming(self):
+    def start_streaming(self):
+        self.client.run_sync(self.start_streaming_async())
+
+    async def stop_streaming_async(self):
         """
         Starts the streaming
         """
-        response = self.client.call(obs.requests.StopStreaming())
+        response = await self.client.call_async(obs.requests.StopStreaming())
         if not response.status:
             raise Exception(
                 f"E PYSERVER::OBS::stop_streaming(): "
                 f"lang: {self.lang}, datain: {response.datain}, dataout: {response.dataout}"
             )
 
+    def stop_streaming(self):
+        self.client.run_sync(self.stop_streaming_async())
+
     def set_source_mute(self, mute):
         self.set_mute(ORIGINAL_STREAM_SOURCE_NAME, mute)
 
     def set_ts_mute(self, mute):
         self.set_mute(TS_INPUT_NAME, mute)
 
-    def set_mute(self, source_name, mute):
-        response = self.client.call(obs.requests.SetMute(source=source_name, mute=mute))
+    async def set_mute_async(self, source_name, mute):
+        response = await self.client.call_async(obs.requests.SetMute(source=source_name, mute=mute))
         if not response.status:
             raise Exception(f"E PYSERVER::OBS::set_mute(): " f"datain: {response.datain}, dataout: {response.dataout}")
+        self.source_state.set(source_name, "muted", mute)
 
-    def _run_media(self, path, source_name):
-        scene_name = self.obsws_get_current_scene_name()
-        self.delete_source(source_name, scene_name)
+    def set_mute(self, source_name, mute):
+        self.client.run_sync(self.set_mute_async(source_name, mute))
 
-        response = self.client.call(
+    def batch(self, cls_foo):
+        """
+        Creates a `RequestBatch` bound to this instance's client
+        :param cls_foo: method name used in error messages
+        """
+        return RequestBatch(self.client, cls="OBS", cls_foo=cls_foo, lang=self.lang)
+
+    def _set_mute(self, batch, source_name, mute):
+        batch.add(
+            obs.requests.SetMute(source=source_name, mute=mute),
+            "SetMute",
+            on_success=lambda r: self.source_state.set(source_name, "muted", mute),
+        )
+
+    def _run_media(self, batch, path, source_name, scene_name=None):
+        """
+        Adds the requests (re)creating and starting the media source `source_name` to `batch`
+        """
+        if scene_name is None:
+            scene_name = self.get_current_scene_name()
+        self._delete_source(batch, source_name, scene_name)
+
+        batch.add(
             obs.requests.CreateSource(
                 sourceName=source_name,
                 sourceKind="ffmpeg_source",
                 sceneName=scene_name,
                 sourceSettings={"local_file": path},
-            )
+            ),
+            "CreateSource",
+            on_success=lambda r: self.scene_cache.add_item(scene_name, r.datain.get("itemId"), source_name),
         )
-        if not response.status:
-            obs_fire("E", "OBS", "_run_media", "CreateSource", response.datain, response.dataout)
-
-        response = self.client.call(obs.requests.SetMediaTime(sourceName=source_name, timestamp=0))
-        if not response.status:
-            obs_fire("E", "OBS", "_run_media", "SetMediaTime", response.datain, response.dataout)
+        batch.add(obs.requests.SetMediaTime(sourceName=source_name, timestamp=0), "SetMediaTime")
 
     def delete_source(self, source_name, scene_name=None):
         """
-        Removes all inputs with name `source_name`
+        Removes all inputs with name `source_name`.
+        Items are looked up in the scene cache, so only the delete requests go over the wire.
         """
-        scene_names = [scene_name] if scene_name is not None else self.obsws_get_scene_list()
+        batch = self.batch("delete_source")
+        self._delete_source(batch, source_name, scene_name)
+        batch.send()
 
-        for scene_name in scene_names:
-            items = self.obsws_get_scene_item_list(scene_name=scene_name)
-            for item in items:
-                item_id, source_name_ = item["itemId"], item["sourceName"]
-                if source_name_ == source_name:
-                    self.delete_scene_item(item_id=item_id, source_name=source_name, scene_name=scene_name)
+    def _delete_source(self, batch, source_name, scene_name=None):
+        """
+        Adds the requests removing all inputs with name `source_name` to `batch`
+        """
+        self._ensure_scene_cache()
+
+        for scene_name_, item_id in self.scene_cache.find_source(source_name, scene_name):
+            self._delete_scene_item(batch, item_id=item_id, source_name=source_name, scene_name=scene_name_)
 
     def delete_scene_item(self, item_id, source_name, scene_name):
         """
@@ -491,16 +1915,125 @@ class OBS:
         item = {"id": item_id, "name": source_name}
         response = self.client.call(obs.requests.DeleteSceneItem(scene=scene_name, item=item))
         if not response.status:
+            self._on_delete_scene_item_failed(response, scene_name, item_id)
+            return
+        self.scene_cache.remove_item(scene_name, item_id)
+
+    def _delete_scene_item(self, batch, item_id, source_name, scene_name):
+        batch.add(
+            obs.requests.DeleteSceneItem(scene=scene_name, item={"id": item_id, "name": source_name}),
+            "DeleteSceneItem",
+            on_success=lambda r: self.scene_cache.remove_item(scene_name, item_id),
+            on_failure=lambda r: self._on_delete_scene_item_failed(r, scene_name, item_id),
+        )
+
+    def _on_delete_scene_item_failed(self, response, scene_name, item_id):
+        # the cache might be stale (e.g. the item was removed by someone else), resync it
+        # and fail only if the item is still there
+        self.sync_scene_cache()
+        if self.scene_cache.has_item(scene_name, item_id):
             raise Exception(
                 f"E PYSERVER::OBS::delete_scene_item(): " f"datain: {response.datain}, dataout: {response.dataout}"
             )
 
+    def sync_scene_cache(self):
+        """
+        (Re)seeds the scene cache (including the current scene) with a single GetSceneList request
+        """
+        response = self.client.call(obs.requests.GetSceneList())
+        if not response.status:
+            obs_fire("E", "OBS", "sync_scene_cache", "GetSceneList", response.datain, response.dataout)
+        self.scene_cache.seed(response.getScenes(), current_scene=response.getCurrentScene())
+
+    def resync(self):
+        """
+        Re-syncs the cached state after the connection has been re-established.
+        If obs has been restarted meanwhile (the original stream source is gone), the scenes are set up again
+        and the playlist and the media pool are reset, as their sources are gone too.
+        """
+        self.scene_cache.invalidate()
+        self.source_state.invalidate()
+        self.sync_scene_cache()
+        if self.original_media_source is not None and not self.scene_cache.find_source(ORIGINAL_STREAM_SOURCE_NAME):
+            print(f"W PYSERVER::OBS::resync(): lang: {self.lang}, obs has been restarted, setting up the scenes")
+            self.reset_media()
+            self.media_pool.clear()
+            self.setup_scenes(self.original_media_source)
+        self.sync_source_state()
+
+    def get_current_scene_name(self):
+        """
+        Returns the current scene name, tracked from SwitchScenes events.
+        Falls back to a GetCurrentScene request if the cached name is unknown or not valid anymore.
+        """
+        scene_name = self.scene_cache.get_current_scene()
+        if scene_name is None:
+            scene_name = self.obsws_get_current_scene_name()
+            self.scene_cache.set_current_scene(scene_name)
+        return scene_name
+
+    async def get_current_scene_name_async(self):
+        scene_name = self.scene_cache.get_current_scene()
+        if scene_name is None:
+            scene_name = await self.obsws_get_current_scene_name_async()
+            self.scene_cache.set_current_scene(scene_name)
+        return scene_name
+
+    def get_state(self):
+        """
+        :return: the state which changes are reported with `on_state_change`, e.g.
+        {"sources": {"ts_input": {"volume_db": {"value": -3.0, "updated_at": ...}, "sync_offset": {...},
+                                  "muted": {...}}, "original_stream": {...}},
+         "media": {"playing": "path", "updated_at": ...},
+         "streaming": {"value": True, "updated_at": ...}}
+        """
+        return {
+            "sources": self.source_state.snapshot(STATE_SOURCES),
+            "media": dict(self.media_state),
+            "streaming": dict(self.streaming_state),
+        }
+
+    def _set_streaming_state(self, streaming):
+        self.streaming_state = {"value": streaming, "updated_at": time.time()}
+        self._publish_state(["streaming"], dict(self.streaming_state))
+
+    def _on_source_state_change(self, source_name, field, state):
+        if source_name in STATE_SOURCES:
+            self._publish_state(["sources", source_name, field], state)
+
+    def _publish_state(self, path, value):
+        if self.on_state_change is None:
+            return
+        try:
+            self.on_state_change(path, value)
+        except BaseException as ex:
+            print(f"E PYSERVER::OBS::_publish_state(): lang: {self.lang}, path: {path}, details: {ex}")
+
+    def get_stats(self):
+        """
+        :return: dictionary of the instance statistics, e.g.
+        {"scene_cache": {"seeded": True, "current_scene": "main", "current_scene_hits": 10, ...}}
+        """
+        return {
+            "scene_cache": self.scene_cache.stats(),
+            "source_state": self.source_state.stats(),
+            "latency": self.latency_stats.summary(),
+        }
+
+    def _ensure_scene_cache(self):
+        if not self.scene_cache.is_seeded():
+            self.sync_scene_cache()
+
     def on_event(self, message):
         # we handle the error here for the reason of this function is called from another thread
         # from obs-websocket-py library, and I am not sure of the exception will be handled properly there
         try:
+            self.scene_cache.on_event(message)
+            self.source_state.on_event(message)
             if message.name == "MediaEnded":
                 self.on_media_ended(message)
+            elif message.name in ("StreamStarted", "StreamStopped"):
+                self._set_streaming_state(message.name == "StreamStarted")
         except BaseException as ex:
             print(f"E PYSERVER::OBS::on_event(): {ex}")
 
@@ -510,7 +2043,7 @@ class OBS:
         """
         source_name = message.getSourceName()
 
-        if source_name in self.media_queue and self.obsws_get_current_scene_name() == MEDIA_SCENE_NAME:
+        if source_name == self.media_source_name and self.get_current_scene_name() == MEDIA_SCENE_NAME:
             response = self.client.call(obs.requests.SetCurrentScene(scene_name=MAIN_SCENE_NAME))
             if not response.status:
                 raise Exception(
@@ -520,6 +2053,9 @@ class OBS:
     def obsws_get_current_scene_name(self):
         return self.client.call(obs.requests.GetCurrentScene()).getName()
 
+    async def obsws_get_current_scene_name_async(self):
+        return (await self.client.call_async(obs.requests.GetCurrentScene())).getName()
+
     def obsws_get_sources_list(self):
         """
         :return: list of [... {'name': '...', 'type': '...', 'typeId': '...'}, ...]
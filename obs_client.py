@@ -0,0 +1,456 @@
+import asyncio
+import base64
+import hashlib
+import itertools
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+from obswebsocket import base_classes
+from obswebsocket import events
+from obswebsocket import exceptions
+
+import util
+
+DEFAULT_REQUEST_TIMEOUT = 60  # seconds
+DEFAULT_CONNECT_TIMEOUT = 10  # seconds
+DEFAULT_AUTH_TIMEOUT = 10  # seconds
+DEFAULT_PING_INTERVAL = 5  # seconds
+CLOSE_TIMEOUT = 1  # seconds
+DEFAULT_RECONNECT_MIN_DELAY = 0.5  # seconds
+DEFAULT_RECONNECT_MAX_DELAY = 30  # seconds
+
+
+def build_event(data):
+    """
+    Builds an obswebsocket event object out of a raw "update-type" message.
+    Events unknown to obswebsocket are passed as a bare `Baseevents` with `name` set.
+    """
+    name = data["update-type"]
+    cls = getattr(events, name, None)
+    if cls is not None:
+        obj = cls()
+    else:
+        obj = base_classes.Baseevents()
+        obj.name = name
+    obj.input(data)
+    return obj
+
+
+class AsyncOBSClient:
+    """
+    asyncio obs-websocket (4.x protocol) client.
+    Any number of requests may be in flight on one connection, responses are matched
+    to the requests by message id. Accepts obswebsocket request objects.
+    Must be used from a single event loop.
+    """
+
+    def __init__(
+        self,
+        host="localhost",
+        port=4444,
+        password="",
+        timeout=DEFAULT_REQUEST_TIMEOUT,
+        connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+        auth_timeout=DEFAULT_AUTH_TIMEOUT,
+    ):
+        self.host = host
+        self.port = port
+        self.password = password or ""
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.auth_timeout = auth_timeout
+
+        self.session = None
+        self.ws = None
+        self.recv_task = None
+        self.message_ids = itertools.count(1)
+        self.pending = {}  # {"message_id": asyncio.Future, ...}
+
+        self.handlers = []  # [... (foo, event_class), ...]
+        # event handlers are sync and may call obs themselves, so they run in a separate thread,
+        # one at a time to preserve the events order
+        self.event_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="AsyncOBSClient")
+
+    @property
+    def connected(self):
+        return self.ws is not None and not self.ws.closed and self.recv_task is not None and not self.recv_task.done()
+
+    async def connect(self):
+        """
+        Opens the websocket connection and authenticates (if the server requires it).
+        Each step is bounded by its own timeout (`connect_timeout`, `auth_timeout`).
+        """
+        await self.disconnect()
+        self.session = aiohttp.ClientSession()
+        step = "connect"
+        try:
+            self.ws = await asyncio.wait_for(
+                self.session.ws_connect(f"ws://{self.host}:{self.port}", max_msg_size=0), self.connect_timeout
+            )
+            self.recv_task = asyncio.ensure_future(self._recv_loop())
+            step = "authenticate"
+            await asyncio.wait_for(self._auth(), self.auth_timeout)
+        except BaseException as ex:
+            await self.disconnect()
+            if isinstance(ex, asyncio.TimeoutError):
+                timeout = self.connect_timeout if step == "connect" else self.auth_timeout
+                raise exceptions.ConnectionFailure(f"Couldn't {step} to {self.host}:{self.port} in {timeout} seconds")
+            if isinstance(ex, (aiohttp.ClientError, OSError)):
+                raise exceptions.ConnectionFailure(str(ex))
+            raise
+
+    async def disconnect(self):
+        if self.ws is not None:
+            try:
+                # a hung server may never answer the closing handshake
+                await asyncio.wait_for(self.ws.close(), CLOSE_TIMEOUT)
+            except asyncio.TimeoutError:
+                pass
+        if self.recv_task is not None:
+            await asyncio.gather(self.recv_task, return_exceptions=True)
+        if self.session is not None:
+            await self.session.close()
+        self.ws, self.recv_task, self.session = None, None, None
+
+    async def send(self, data):
+        """
+        Makes a raw json call.
+        :param data: request (python dict), without "message-id"
+        :return: response (python dict)
+        """
+        return await self._wait(await self._write(data))
+
+    async def call(self, request):
+        """
+        :param request: obswebsocket request object
+        :return: the request populated with response data
+        """
+        if not isinstance(request, base_classes.Baserequests):
+            raise exceptions.ObjectError("Call parameter is not a request object")
+        request.input(await self.send(request.data()))
+        return request
+
+    async def call_many(self, requests):
+        """
+        Writes all the requests to the websocket before waiting for any response,
+        so the whole sequence costs one round trip. obs-websocket 4.x handles every message on its thread pool,
+        so the requests may be processed in any order: they must not depend on each other (see `obs.RequestBatch`).
+        :return: list of requests populated with response data
+        """
+        for request in requests:
+            if not isinstance(request, base_classes.Baserequests):
+                raise exceptions.ObjectError("Call parameter is not a request object")
+        message_ids = [await self._write(request.data()) for request in requests]
+        responses = await asyncio.gather(*[self._wait(message_id) for message_id in message_ids])
+        for request, response in zip(requests, responses):
+            request.input(response)
+        return requests
+
+    async def ping(self):
+        """
+        Sends a keepalive request (GetVersion), fires ConnectionFailure if it failed
+        """
+        result = await self.send({"request-type": "GetVersion"})
+        if result.get("status") != "ok":
+            raise exceptions.ConnectionFailure(result.get("error"))
+
+    def register(self, foo, event=None):
+        """
+        :param foo: callback foo(message)
+        :param event: obswebsocket event class to trigger the callback on, None means all the events
+        """
+        self.handlers.append((foo, event))
+
+    def unregister(self, foo, event=None):
+        self.handlers = [(f, e) for f, e in self.handlers if not (f == foo and (event is None or e == event))]
+
+    async def _write(self, data):
+        if not self.connected:
+            raise exceptions.ConnectionFailure(f"Not connected to {self.host}:{self.port}")
+        message_id = str(next(self.message_ids))
+        data["message-id"] = message_id
+        self.pending[message_id] = asyncio.get_event_loop().create_future()
+        try:
+            await self.ws.send_str(json.dumps(data))
+        except BaseException:
+            self.pending.pop(message_id, None)
+            raise
+        return message_id
+
+    async def _wait(self, message_id):
+        try:
+            return await asyncio.wait_for(self.pending[message_id], self.timeout)
+        except asyncio.TimeoutError:
+            raise exceptions.MessageTimeout(f"No answer for message {message_id}")
+        finally:
+            self.pending.pop(message_id, None)
+
+    async def _auth(self):
+        result = await self.send({"request-type": "GetAuthRequired"})
+        if result["status"] != "ok":
+            raise exceptions.ConnectionFailure(result.get("error"))
+
+        if result.get("authRequired"):
+            secret = base64.b64encode(hashlib.sha256((self.password + result["salt"]).encode("utf-8")).digest())
+            auth = base64.b64encode(hashlib.sha256(secret + result["challenge"].encode("utf-8")).digest()).decode(
+                "utf-8"
+            )
+            result = await self.send({"request-type": "Authenticate", "auth": auth})
+            if result["status"] != "ok":
+                raise exceptions.ConnectionFailure(result.get("error"))
+
+    async def _recv_loop(self):
+        try:
+            async for message in self.ws:
+                if message.type != aiohttp.WSMsgType.TEXT:
+                    continue
+                try:
+                    data = json.loads(message.data)
+                except ValueError:
+                    print(f"W PYSERVER::AsyncOBSClient::_recv_loop(): invalid message: {message.data}")
+                    continue
+                if "update-type" in data:
+                    self._dispatch_event(data)
+                    if data["update-type"] == "Exiting":  # obs is shutting down, the connection is useless
+                        break
+                elif "message-id" in data:
+                    future = self.pending.get(data["message-id"])
+                    if future is not None and not future.done():
+                        future.set_result(data)
+        finally:
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(exceptions.ConnectionFailure("Connection closed"))
+
+    def _dispatch_event(self, data):
+        try:
+            message = build_event(data)
+        except BaseException as ex:
+            print(f"W PYSERVER::AsyncOBSClient::_dispatch_event(): invalid event: {data}. Details: {ex}")
+            return
+        for foo, event in list(self.handlers):
+            if event is None or isinstance(message, event):
+                self.event_executor.submit(self._invoke, foo, message)
+
+    def _invoke(self, foo, message):
+        try:
+            foo(message)
+        except BaseException as ex:
+            print(f"E PYSERVER::AsyncOBSClient::_invoke(): {ex}")
+
+
+class OBSClient:
+    """
+    Sync facade of `AsyncOBSClient`, compatible with `obswebsocket.obsws`.
+    The async client runs on the shared background event loop (see `util.get_event_loop_thread()`),
+    so calls made from different threads are pipelined on one connection.
+    Coroutines (e.g. `call_async()`) must be awaited on that loop.
+    """
+
+    def __init__(
+        self,
+        host="localhost",
+        port=4444,
+        password="",
+        timeout=DEFAULT_REQUEST_TIMEOUT,
+        connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+        auth_timeout=DEFAULT_AUTH_TIMEOUT,
+    ):
+        self.loop_thread = util.get_event_loop_thread()
+        self.aio = AsyncOBSClient(
+            host=host,
+            port=port,
+            password=password,
+            timeout=timeout,
+            connect_timeout=connect_timeout,
+            auth_timeout=auth_timeout,
+        )
+
+    @property
+    def host(self):
+        return self.aio.host
+
+    @property
+    def port(self):
+        return self.aio.port
+
+    @property
+    def connected(self):
+        return self.aio.connected
+
+    def run_sync(self, coro, timeout=None):
+        """
+        Runs a coroutine on the client's event loop and waits for the result
+        """
+        return self.loop_thread.run_sync(coro, timeout)
+
+    def connect(self):
+        self.run_sync(self.aio.connect())
+
+    def disconnect(self):
+        self.run_sync(self.aio.disconnect())
+
+    def reconnect(self):
+        self.connect()
+
+    def call(self, request):
+        return self.run_sync(self.aio.call(request))
+
+    def call_many(self, requests):
+        return self.run_sync(self.aio.call_many(requests))
+
+    def send(self, data):
+        return self.run_sync(self.aio.send(data))
+
+    def call_async(self, request):
+        return self.aio.call(request)
+
+    def call_many_async(self, requests):
+        return self.aio.call_many(requests)
+
+    def register(self, foo, event=None):
+        self.aio.register(foo, event)
+
+    def unregister(self, foo, event=None):
+        self.aio.unregister(foo, event)
+
+
+class ConnectionSupervisor:
+    """
+    Keeps the connection of an `OBSClient` alive. A disconnect is detected when the receive loop ends
+    (the socket was closed, or obs sent the Exiting event) or a keepalive GetVersion ping fails.
+    The client is then reconnected with jittered exponential backoff and `on_reconnect()` is called,
+    in a separate thread (it may call obs synchronously). Event handlers stay registered on the client,
+    so they are attached to the new connection automatically.
+    """
+
+    def __init__(
+        self,
+        client,
+        name="",
+        on_reconnect=None,
+        on_status_change=None,
+        ping_interval=DEFAULT_PING_INTERVAL,
+        min_delay=DEFAULT_RECONNECT_MIN_DELAY,
+        max_delay=DEFAULT_RECONNECT_MAX_DELAY,
+    ):
+        """
+        :param client: `OBSClient`
+        :param name: name used in the messages (e.g. lang)
+        :param on_reconnect: foo(), called after every reconnect
+        :param on_status_change: foo(stats), called on the event loop when the connection is lost
+        and when it's re-established (after `on_reconnect()`), see `stats()`
+        :param ping_interval: seconds between keepalive pings, a ping must be answered within the same time
+        :param min_delay: seconds to wait before the first reconnection attempt
+        :param max_delay: max seconds to wait between reconnection attempts
+        """
+        self.client = client
+        self.name = name
+        self.on_reconnect = on_reconnect
+        self.on_status_change = on_status_change
+        self.ping_interval = ping_interval
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+
+        self.future = None  # concurrent.futures.Future of the supervising task
+        self.reconnects = 0
+        self.disconnected_at = None  # time.time() of the current outage, None if connected
+        self.last_error = None
+
+    def start(self):
+        if self.future is None:
+            self.future = self.client.loop_thread.submit(self._run())
+
+    def stop(self):
+        if self.future is not None:
+            self.future.cancel()
+            self.future = None
+
+    def stats(self):
+        return {
+            "connected": self.client.connected,
+            "reconnects": self.reconnects,
+            "disconnected_at": self.disconnected_at,
+            "last_error": self.last_error,
+        }
+
+    async def _run(self):
+        aio = self.client.aio
+        while True:
+            if aio.connected:
+                done, _ = await asyncio.wait([aio.recv_task], timeout=self.ping_interval)
+                if not done and await self._ping():
+                    continue
+                await aio.disconnect()
+            self.disconnected_at = self.disconnected_at or time.time()
+            print(f"W PYSERVER::ConnectionSupervisor::_run(): {self.name}: connection lost, reconnecting")
+            self._notify_status_change()
+            await self._reconnect()
+            self._notify_status_change()
+
+    def _notify_status_change(self):
+        if self.on_status_change is None:
+            return
+        try:
+            self.on_status_change(self.stats())
+        except Exception as ex:
+            print(f"E PYSERVER::ConnectionSupervisor::_notify_status_change(): {self.name}: {ex}")
+
+    async def _ping(self):
+        try:
+            await asyncio.wait_for(self.client.aio.ping(), self.ping_interval)
+            return True
+        except BaseException as ex:
+            if isinstance(ex, asyncio.CancelledError):
+                raise
+            self.last_error = f"keepalive ping failed: {ex!r}"
+            return False
+
+    async def _reconnect(self):
+        attempt = 0
+        while True:
+            # exponential backoff with jitter, so the instances restarted together don't reconnect in lockstep
+            delay = min(self.max_delay, self.min_delay * 2**attempt)
+            await asyncio.sleep(random.uniform(delay / 2, delay))
+            attempt += 1
+            try:
+                await self.client.aio.connect()
+            except BaseException as ex:
+                if isinstance(ex, asyncio.CancelledError):
+                    raise
+                self.last_error = f"reconnection attempt {attempt} failed: {ex}"
+                continue
+            break
+
+        self.reconnects += 1
+        print(
+            f"W PYSERVER::ConnectionSupervisor::_reconnect(): {self.name}: reconnected "
+            f"after {time.time() - (self.disconnected_at or time.time()):.1f} seconds"
+        )
+        self.disconnected_at = None
+        if self.on_reconnect is not None:
+            try:
+                await asyncio.get_event_loop().run_in_executor(None, self.on_reconnect)
+            except BaseException as ex:
+                if isinstance(ex, asyncio.CancelledError):
+                    raise
+                self.last_error = f"resync after reconnect failed: {ex}"
+                print(f"E PYSERVER::ConnectionSupervisor::_reconnect(): {self.name}: {self.last_error}")
+
+
+def connect_many(clients):
+    """
+    Connects `OBSClient`s concurrently, so it takes as long as the slowest connection (not the sum)
+    :param clients: {"key": OBSClient, ...}
+    :return: {"key": None (connected) or exception, ...}
+    """
+
+    async def connect():
+        return await asyncio.gather(*[client.aio.connect() for client in clients.values()], return_exceptions=True)
+
+    if not clients:
+        return {}
+    return dict(zip(clients, util.get_event_loop_thread().run_sync(connect())))
@@ -0,0 +1,100 @@
+import threading
+import time
+
+from util import UPDATED_AT_KEY
+
+DEFAULT_TTL = 1.0  # seconds
+FAILED_VALUE = "#"  # value of the languages which instance services have failed, never cached
+
+
+class ResponseCache:
+    """
+    Short-lived cache of by-lang values returned by instance services, keyed by route and lang,
+    so frequent polling of the common service doesn't multiply requests to obs instances.
+    Concurrent reads of the same route are coalesced: only one of them fetches the missing languages,
+    the others wait for it and take the values from the cache.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL):
+        """
+        :param ttl: seconds a value is served from the cache, 0 - caching is disabled
+        """
+        self.ttl = ttl
+
+        self.lock = threading.Lock()
+        self.entries = {}  # {("route", "lang"): (value, updated_at, cached_at), ...}
+        self.fetch_locks = {}  # {"route": threading.Lock(), ...}, held while the route is fetched
+
+    def get(self, route, langs, fetch):
+        """
+        :param langs: list of langs to get the values of
+        :param fetch: fetch(langs), returns {"lang": value, ..., "__updated_at__": {"lang": timestamp, ...}},
+        called for the langs which are not cached (or expired)
+        :return: {"lang": value, ..., "__updated_at__": {"lang": timestamp, ...}}
+        """
+        if self.ttl <= 0:
+            return fetch(langs)
+
+        data, missing = self._lookup(route, langs)
+        if missing:
+            with self._get_fetch_lock(route):
+                # another request might have fetched the values while this one was waiting for the lock
+                data, missing = self._lookup(route, langs)
+                if missing:
+                    fetched = fetch(missing)
+                    self.put(route, fetched)
+                    self._merge(data, fetched)
+        return data
+
+    def put(self, route, data):
+        """
+        Caches the values, e.g. returned by an instance service or just set by a POST request (write-through)
+        :param data: {"lang": value, ..., "__updated_at__": {"lang": timestamp, ...}}
+        """
+        now = time.monotonic()
+        updated_at = data.get(UPDATED_AT_KEY, {})
+        with self.lock:
+            for lang, value in data.items():
+                if lang == UPDATED_AT_KEY:
+                    continue
+                if value == FAILED_VALUE:
+                    self.entries.pop((route, lang), None)
+                else:
+                    self.entries[(route, lang)] = (value, updated_at.get(lang), now)
+
+    def invalidate(self, route=None, langs=None):
+        """
+        Drops the cached values of the route (all routes if None) for the langs (all langs if None)
+        """
+        with self.lock:
+            for route_, lang in list(self.entries):
+                if (route is None or route_ == route) and (langs is None or lang in langs):
+                    del self.entries[(route_, lang)]
+
+    def _lookup(self, route, langs):
+        """
+        :return: (data of the cached langs, list of the langs which are not cached)
+        """
+        data, missing = {}, []
+        now = time.monotonic()
+        with self.lock:
+            for lang in langs:
+                entry = self.entries.get((route, lang))
+                if entry is None or now - entry[2] > self.ttl:
+                    missing.append(lang)
+                    continue
+                value, updated_at, _ = entry
+                self._merge(data, {lang: value, UPDATED_AT_KEY: {lang: updated_at}})
+        return data, missing
+
+    def _get_fetch_lock(self, route):
+        with self.lock:
+            return self.fetch_locks.setdefault(route, threading.Lock())
+
+    @staticmethod
+    def _merge(data, data_):
+        for lang, value in data_.items():
+            if lang == UPDATED_AT_KEY:
+                data.setdefault(UPDATED_AT_KEY, {}).update({k: v for k, v in value.items() if v is not None})
+            else:
+                data[lang] = value
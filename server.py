@@ -1,17 +1,54 @@
-import glob
+import concurrent.futures
+import functools
 import os
 import re
+import time
 
-import obswebsocket as obsws
 from dotenv import load_dotenv
 
+import media_index
 import obs
+import obs_client
+from util import UPDATED_AT_KEY
+from util import EventHub
 from util import ExecutionStatus
 
 load_dotenv()
 BASE_MEDIA_DIR = os.getenv("MEDIA_DIR")
 MEDIA_DIR = os.path.join(BASE_MEDIA_DIR, "media")
 TRANSITION_DIR = os.path.join(BASE_MEDIA_DIR, "media")
+MEDIA_POOL_SIZE = int(os.getenv("MEDIA_POOL_SIZE", obs.DEFAULT_MEDIA_POOL_SIZE))
+MEDIA_INDEX_POLL_SECONDS = float(os.getenv("MEDIA_INDEX_POLL_SECONDS", media_index.DEFAULT_POLL_INTERVAL))
+OBS_OPERATION_TIMEOUT = float(os.getenv("OBS_OPERATION_TIMEOUT", 10))  # seconds, per language
+OBS_CONNECT_TIMEOUT = float(os.getenv("OBS_CONNECT_TIMEOUT", obs_client.DEFAULT_CONNECT_TIMEOUT))  # seconds
+OBS_AUTH_TIMEOUT = float(os.getenv("OBS_AUTH_TIMEOUT", obs_client.DEFAULT_AUTH_TIMEOUT))  # seconds
+OBS_PING_INTERVAL = float(os.getenv("OBS_PING_INTERVAL", obs_client.DEFAULT_PING_INTERVAL))  # seconds
+OBS_RECONNECT_MAX_DELAY = float(os.getenv("OBS_RECONNECT_MAX_DELAY", obs_client.DEFAULT_RECONNECT_MAX_DELAY))
+
+# fields of `server_langs` entries, the connection has to be re-established if any of them changes
+CONNECTION_FIELDS = ("obs_host", "websocket_port", "password")
+
+# operations which are dispatched per language (see `Server._dispatch()`, `Server.run_batch()`),
+# {"operation": "description used in the error messages", ...}, every operation has a `Server._<operation>()` handler
+OPERATIONS = {
+    "run_media": "couldn't play media",
+    "preload_media": "couldn't preload media",
+    "enqueue_media": "couldn't enqueue media",
+    "set_stream_settings": "couldn't set stream settings",
+    "set_ts_sync_offset": "couldn't set sync offset",
+    "set_ts_volume_db": "couldn't set ts volume",
+    "set_source_volume_db": "couldn't set original source volume",
+    "setup_sidechain": "couldn't setup sidechain",
+    "setup_transition": "couldn't setup transition",
+    "start_streaming": "couldn't start streaming",
+    "stop_streaming": "couldn't stop streaming",
+}
+
+# shared by all the servers, kept current in the background (see `Server._find_media()`)
+_media_index = media_index.MediaIndex(MEDIA_DIR, poll_interval=MEDIA_INDEX_POLL_SECONDS)
+
+# shared by all the servers, per-language operations are run concurrently on it (see `Server._fan_out()`)
+_fan_out_executor = concurrent.futures.ThreadPoolExecutor(max_workers=32, thread_name_prefix="fan_out")
 
 
 class Server:
@@ -28,9 +65,14 @@ class Server:
         """
         self.server_langs = server_langs
 
-        self.obs_instances = None  # {..., "lang": obs.OBS(), ...}
-        self.obs_clients = None
+        self.obs_instances = {}  # {..., "lang": obs.OBS(), ...}
+        self.obs_clients = {}  # {..., "lang": obs_client.OBSClient(), ...}
+        self.supervisors = {}  # {..., "lang": obs_client.ConnectionSupervisor(), ...}
         self.is_initialized = False
+        # state changes, {"lang": "lang", "path": [...], "value": ...}, see `get_state()` and `util.apply_patch()`
+        self.events = EventHub()
+
+        _media_index.start()
 
     def initialize(self):
         """
@@ -49,132 +91,253 @@ class Server:
             self.drop_connections()
             return status
 
+        self._start_supervisors()
         self.is_initialized = True
         return status
 
+    def reinitialize(self, server_langs):
+        """
+        Applies new `server_langs` to the initialized server, touching only what has changed:
+        languages which were removed or moved to another obs (host, port or password changed) stop streaming
+        and are disconnected, new (and moved) languages are connected and initialized, languages with another
+        `original_media_url` get their original media source updated in place. Other languages keep streaming.
+        Languages which couldn't be initialized are left out (so the next call retries them).
+        :param server_langs: see `__init__()`
+        :return: ExecutionStatus
+        """
+        removed = [lang for lang in self.server_langs if lang not in server_langs]
+        added = [
+            lang
+            for lang, lang_info in server_langs.items()
+            if lang not in self.server_langs
+            or any(lang_info.get(field) != self.server_langs[lang].get(field) for field in CONNECTION_FIELDS)
+        ]
+        updated = [
+            lang
+            for lang, lang_info in server_langs.items()
+            if lang not in added and lang_info["original_media_url"] != self.server_langs[lang]["original_media_url"]
+        ]
+
+        self._drop_langs([lang for lang in removed + added if lang in self.obs_clients])
+        self.server_langs = server_langs
+
+        status = self._establish_connections(verbose=True, langs=added)
+        status_ = self._initialize_obs_controllers(
+            verbose=True, langs=[lang for lang in added if lang in self.obs_clients]
+        )
+        if not status_:
+            status.append_error(status_.message)
+        failed = [lang for lang in added if lang not in self.obs_instances]
+        self._drop_langs([lang for lang in failed if lang in self.obs_clients])
+        self.server_langs = {lang: lang_info for lang, lang_info in server_langs.items() if lang not in failed}
+        self._start_supervisors(langs=[lang for lang in added if lang not in failed])
+
+        tasks = {
+            lang: functools.partial(
+                self.obs_instances[lang].update_original_media_source, server_langs[lang]["original_media_url"]
+            )
+            for lang in updated
+        }
+        self._fan_out(tasks, status, method_name="reinitialize", action="couldn't update original media source")
+
+        return status
+
     def cleanup(self):
         self.stop_streaming()  # no need to check status
         self._reset_scenes()
-        # self.drop_connections()
+        self.events.close()
+        self.drop_connections()
 
     def drop_connections(self):
-        for lang, client in self.obs_clients.items():
-            try:
-                client.disconnect()
-            except Exception:  # FIXME
-                pass
+        self._stop_supervisors()
+        self._disconnect(list(self.obs_clients))
+
+    def _disconnect(self, langs):
+        """
+        Closes the connections of `langs` (concurrently) and forgets their clients.
+        The clients live on the shared event loop, so a client which is dropped without being disconnected
+        leaks its session and websocket
+        """
+        clients = {lang: self.obs_clients.pop(lang) for lang in langs if lang in self.obs_clients}
+        tasks = {lang: client.disconnect for lang, client in clients.items()}
+        self._fan_out(tasks, None, method_name="_disconnect", action="couldn't disconnect")
+
+    def _drop_langs(self, langs):
+        """
+        Stops streaming of `langs`, drops their connections and obs controllers
+        """
+        self._stop_supervisors(langs=langs)
+        tasks = {lang: self.obs_instances[lang].stop_streaming for lang in langs if lang in self.obs_instances}
+        self._fan_out(tasks, None, method_name="_drop_langs", action="couldn't stop streaming")
+
+        for lang in langs:
+            obs_ = self.obs_instances.pop(lang, None)
+            if obs_ is not None:
+                obs_.on_state_change = None
+                obs_.reset_media()
+                self.events.publish({"lang": lang, "path": [], "value": None})
+        self._disconnect(langs)
 
     def run_media(self, params):
+        """
+        :param params: dictionary,
+        e.g. {"lang": {"name": "...", "search_by_num": "0/1"}, ...}
+        :return:
+        """
         if not self.is_initialized:
             return ExecutionStatus(status=False, message="The server was not initialized yet")
 
-        status = ExecutionStatus(status=True)
+        return self._dispatch("run_media", params)
+
+    def run_media_at(self, params):
+        """
+        Plays media simultaneously in several languages: each language starts at its `start_at`
+        (unix timestamp of this host's clock), see `obs.OBS.run_media_at()`.
+        The media is preloaded and scheduled concurrently, then the starts are waited for
+        (every language for up to its operation timeout after its `start_at`)
+        :param params: dictionary,
+        e.g. {"lang": {"name": "...", "search_by_num": "0/1", "start_at": 1700000000.25}, ...}
+        :return: {"lang": {"started_at": timestamp}, ...}, where `started_at` is when the media has been shown,
+        error details for the failed languages
+        """
+        if not self.is_initialized:
+            return ExecutionStatus(status=False, message="The server was not initialized yet")
 
+        tasks = {}
+        start_at = {}
+        errors = {}  # {"lang": "message", ...}
         for lang, params_ in params.items():
-            if lang not in self.obs_instances:
-                msg_ = f"W PYSERVER::Server::run_media(): no obs instance found with lang {lang} specified"
-                print(msg_)
-                status.append_warning(msg_)
+            status = ExecutionStatus(status=True)
+            obs_ = self._get_obs_instance(lang, status, method_name="run_media")
+            path = None
+            if obs_ is not None:
+                path = self._find_media(lang, params_["name"], params_["search_by_num"], status, "run_media")
+            if path is None:
+                errors[lang] = status.message
                 continue
-            obs_: obs.OBS = self.obs_instances[lang]
-            use_file_num, name = params_["search_by_num"], params_["name"]
-
-            if use_file_num:
-                # extract file number
-                file_num = re.search(r"^\d+", name)
-                if not file_num:  # if the pattern is incorrect (name doesn't start with numbers)
-                    msg_ = (
-                        f"W PYSERVER::Server::run_media(): while `use_file_num` is set, "
-                        f"`name` doesn't start with a number. lang {lang}, name {name}"
-                    )
-                    print(msg_)
-                    status.append_warning(msg_)
-                    continue
-                file_num = file_num.group()
-
-                files = glob.glob(os.path.join(MEDIA_DIR, f"{file_num}*"))
-                if len(files) == 0:
-                    msg_ = f"W PYSERVER::Server::run_media(): no media found, " f"lang {lang}, name {name}"
-                    print(msg_)
-                    status.append_warning(msg_)
-                    continue
-                path = files[0]
-            else:
-                path = os.path.join(MEDIA_DIR, name)
-                if not os.path.isfile(path):
-                    msg_ = (
-                        f"W PYSERVER::Server::run_media(): no media found with name specified, "
-                        f"lang {lang}, name {name}"
-                    )
-                    print(msg_)
-                    status.append_warning(msg_)
-                    continue
+            start_at[lang] = float(params_["start_at"])
+            tasks[lang] = functools.partial(obs_.run_media_at, path, start_at[lang])
+
+        action = OPERATIONS["run_media"]
+        started = self._fan_out(tasks, status=None, method_name="run_media", action=action, errors=errors)
+        # waited for here, so no worker of the fan-out executor is held until the start
+        results = self._wait_all(
+            started,
+            time.monotonic(),
+            {lang: max(start_at[lang] - time.time(), 0) + self._get_operation_timeout(lang) for lang in started},
+            status=None,
+            method_name="run_media",
+            action=action,
+            errors=errors,
+        )
+        data = {lang: {"started_at": started_at} for lang, started_at in results.items()}
+        data.update(errors)
+        return data
 
-            try:
-                obs_.run_media(path)
-            except BaseException as ex:
-                msg_ = f"E PYSERVER::Server::run_media(): couldn't play media, lang {lang}. Details: {ex}"
-                print(msg_)
-                status.append_error(msg_)
+    def preload_media(self, params):
+        """
+        Preloads media into hidden, paused sources, so it starts without a delay when played
+        :param params: dictionary,
+        e.g. {"lang": [{"name": "...", "search_by_num": "0/1"}, ...], ...}
+        :return:
+        """
+        if not self.is_initialized:
+            return ExecutionStatus(status=False, message="The server was not initialized yet")
 
-        return status
+        return self._dispatch("preload_media", params)
 
-    def set_stream_settings(self, stream_settings):
+    def enqueue_media(self, params):
         """
-        :param stream_settings: dictionary,
-        e.g. {"lang": {"server": "rtmp://...", "key": "..."}, ...}
+        Appends media to the playlist, each media starts right after the previous one ends
+        :param params: dictionary,
+        e.g. {"lang": [{"name": "...", "search_by_num": "0/1"}, ...], ...}
         :return:
         """
         if not self.is_initialized:
             return ExecutionStatus(status=False, message="The server was not initialized yet")
 
-        status = ExecutionStatus(status=True)
+        return self._dispatch("enqueue_media", params)
 
-        for lang, settings_ in stream_settings.items():
-            if lang not in self.obs_instances:
-                msg_ = f"W PYSERVER::Server::set_stream_settings(): no obs instance found with lang {lang} specified"
-                print(msg_)
-                status.append_warning(msg_)
-                continue
-            obs_: obs.OBS = self.obs_instances[lang]
-            try:
-                obs_.set_stream_settings(server=settings_["server"], key=settings_["key"])
-            except BaseException as ex:
+    def _find_media(self, lang, name, use_file_num, status, method_name):
+        """
+        Looks for a media file in MEDIA_DIR (using the media index), appends a warning to `status` if not found
+        :return: path to the media file or None
+        """
+        if use_file_num:
+            # extract file number
+            file_num = re.search(r"^\d+", name)
+            if not file_num:  # if the pattern is incorrect (name doesn't start with numbers)
                 msg_ = (
-                    f"E PYSERVER::Server::set_stream_settings(): "
-                    f"couldn't set stream settings, lang {lang}. "
-                    f"Details: {ex}"
+                    f"W PYSERVER::Server::{method_name}(): while `use_file_num` is set, "
+                    f"`name` doesn't start with a number. lang {lang}, name {name}"
                 )
                 print(msg_)
-                status.append_error(msg_)
-                # return ExecutionStatus(status=False, message=msg_)
+                status.append_warning(msg_)
+                return None
+            file_num = file_num.group()
 
-        return status
+            path = _media_index.find_by_num(file_num)
+            if path is None:
+                msg_ = f"W PYSERVER::Server::{method_name}(): no media found, " f"lang {lang}, name {name}"
+                print(msg_)
+                status.append_warning(msg_)
+                return None
+            return path
+
+        path = _media_index.find(name)
+        if path is None:
+            msg_ = (
+                f"W PYSERVER::Server::{method_name}(): no media found with name specified, " f"lang {lang}, name {name}"
+            )
+            print(msg_)
+            status.append_warning(msg_)
+            return None
+        return path
+
+    def list_media(self, params=None):
+        """
+        Lists the media files (sorted by name), page by page
+        :param params: dictionary (optional),
+        e.g. {"lang": {"offset": 0, "limit": 100}, ...}
+        :return: {"lang": {"total": n, "offset": 0, "limit": 100, "items": [{"name": "...", "size": n}, ...]}, ...}
+        """
+        if not self.is_initialized:
+            return ExecutionStatus(status=False, message="The server was not initialized yet")
+
+        params = params if params is not None else {lang: {} for lang in self.obs_instances}
+        data = {}
+        for lang, params_ in params.items():
+            offset = max(int(params_.get("offset", 0)), 0)
+            limit = max(int(params_.get("limit", media_index.DEFAULT_PAGE_SIZE)), 0)
+            data[lang] = _media_index.list(offset=offset, limit=limit)
+        return data
+
+    def set_stream_settings(self, stream_settings):
+        """
+        :param stream_settings: dictionary,
+        e.g. {"lang": {"server": "rtmp://...", "key": "..."}, ...}
+        :return:
+        """
+        if not self.is_initialized:
+            return ExecutionStatus(status=False, message="The server was not initialized yet")
+
+        return self._dispatch("set_stream_settings", stream_settings)
 
     def get_ts_sync_offset(self):
         """
         Retrieves information about teamspeak audio sync offset
-        :return: {"lang": offset_int, ...} (note, offset in milliseconds)
+        :return: {"lang": offset_int, ..., "__updated_at__": {"lang": timestamp, ...}} (note, offset in milliseconds)
         """
         if not self.is_initialized:
             return ExecutionStatus(status=False, message="The server was not initialized yet")
 
-        data = {}
-
-        for lang, obs_ in self.obs_instances.items():
-            try:
-                offset = obs_.get_ts_sync_offset()
-                data[lang] = offset
-            except BaseException as ex:
-                msg_ = (
-                    f"E PYSERVER::Server::get_ts_sync_offset(): "
-                    f"couldn't retrieve sync offset, lang {lang}. "
-                    f"Details: {ex}"
-                )
-                print(msg_)  # TODO: logging methods
-                data[lang] = "#"  # TODO: handle errors
-                # return ExecutionStatus(status=False, message=msg_)
-        return data
+        return self._get_source_values(
+            lambda obs_: obs_.get_ts_sync_offset(),
+            source_name=obs.TS_INPUT_NAME,
+            field="sync_offset",
+            method_name="get_ts_sync_offset",
+            action="couldn't retrieve sync offset",
+        )
 
     def set_ts_sync_offset(self, offset_settings):
         """
@@ -185,47 +348,23 @@ class Server:
         if not self.is_initialized:
             return ExecutionStatus(status=False, message="The server was not initialized yet")
 
-        status = ExecutionStatus(status=True)
-
-        for lang, offset in offset_settings.items():
-            if lang not in self.obs_instances:
-                msg_ = f"W PYSERVER::Server::set_ts_sync_offset(): no obs instance found with lang {lang} specified"
-                print(msg_)
-                status.append_warning(msg_)
-                continue
-            obs_: obs.OBS = self.obs_instances[lang]
-            try:
-                obs_.set_ts_sync_offset(offset)
-            except BaseException as ex:
-                msg_ = f"E PYSERVER::Server::set_ts_sync_offset(): couldn't set sync offset, lang {lang}. Details: {ex}"
-                print(msg_)
-                status.append_error(msg_)
-                # return ExecutionStatus(status=False, message=msg_)
-
-        return status
+        return self._dispatch("set_ts_sync_offset", offset_settings)
 
     def get_ts_volume_db(self):
         """
         Retrieves teamspeak sound volume (in decibels)
-        :return: {"lang": volume_db, ...}
+        :return: {"lang": volume_db, ..., "__updated_at__": {"lang": timestamp, ...}}
         """
         if not self.is_initialized:
             return ExecutionStatus(status=False, message="The server was not initialized yet")
 
-        data = {}
-
-        for lang, obs_ in self.obs_instances.items():
-            try:
-                volume = obs_.get_ts_volume_db()
-                data[lang] = volume
-            except BaseException as ex:
-                msg_ = (
-                    f"E PYSERVER::Server::get_ts_volume_db(): couldn't retrieve ts volume, lang {lang}. Details: {ex}"
-                )
-                print(msg_)  # TODO: logging methods
-                data[lang] = "#"  # TODO: handle errors
-                # return ExecutionStatus(status=False, message=msg_)
-        return data
+        return self._get_source_values(
+            lambda obs_: obs_.get_ts_volume_db(),
+            source_name=obs.TS_INPUT_NAME,
+            field="volume_db",
+            method_name="get_ts_volume_db",
+            action="couldn't retrieve ts volume",
+        )
 
     def set_ts_volume_db(self, volume_settings):
         """
@@ -236,49 +375,23 @@ class Server:
         if not self.is_initialized:
             return ExecutionStatus(status=False, message="The server was not initialized yet")
 
-        status = ExecutionStatus(status=True)
-
-        for lang, volume in volume_settings.items():
-            if lang not in self.obs_instances:
-                msg_ = f"W PYSERVER::Server::set_ts_volume_db(): no obs instance found with lang {lang} specified"
-                print(msg_)
-                status.append_warning(msg_)
-                continue
-            obs_: obs.OBS = self.obs_instances[lang]
-            try:
-                obs_.set_ts_volume_db(volume)
-            except BaseException as ex:
-                msg_ = f"E PYSERVER::Server::set_ts_volume_db(): couldn't set ts volume, lang {lang}. Details: {ex}"
-                print(msg_)
-                status.append_error(msg_)
-                # return ExecutionStatus(status=False, message=msg_)
-
-        return status
+        return self._dispatch("set_ts_volume_db", volume_settings)
 
     def get_source_volume_db(self):
         """
         Retrieves original source sound volume (in decibels)
-        :return: {"lang": volume_db, ...}
+        :return: {"lang": volume_db, ..., "__updated_at__": {"lang": timestamp, ...}}
         """
         if not self.is_initialized:
             return ExecutionStatus(status=False, message="The server was not initialized yet")
 
-        data = {}
-
-        for lang, obs_ in self.obs_instances.items():
-            try:
-                volume = obs_.get_source_volume_db()
-                data[lang] = volume
-            except BaseException as ex:
-                msg_ = (
-                    f"E PYSERVER::Server::get_source_volume_db(): "
-                    f"couldn't retrieve original source volume, lang {lang}. "
-                    f"Details: {ex}"
-                )
-                print(msg_)  # TODO: logging methods
-                data[lang] = "#"  # TODO: handle errors
-                # return ExecutionStatus(status=False, message=msg_)
-        return data
+        return self._get_source_values(
+            lambda obs_: obs_.get_source_volume_db(),
+            source_name=obs.ORIGINAL_STREAM_SOURCE_NAME,
+            field="volume_db",
+            method_name="get_source_volume_db",
+            action="couldn't retrieve original source volume",
+        )
 
     def set_source_volume_db(self, volume_settings):
         """
@@ -289,28 +402,7 @@ class Server:
         if not self.is_initialized:
             return ExecutionStatus(status=False, message="The server was not initialized yet")
 
-        status = ExecutionStatus(status=True)
-
-        for lang, volume in volume_settings.items():
-            if lang not in self.obs_instances:
-                msg_ = f"W PYSERVER::Server::set_source_volume_db(): no obs instance found with lang {lang} specified"
-                print(msg_)
-                status.append_warning(msg_)
-                continue
-            obs_: obs.OBS = self.obs_instances[lang]
-            try:
-                obs_.set_source_volume_db(volume)
-            except BaseException as ex:
-                msg_ = (
-                    f"E PYSERVER::Server::set_source_volume_db(): "
-                    f"couldn't set original source volume, lang {lang}. "
-                    f"Details: {ex}"
-                )
-                print(msg_)
-                status.append_error(msg_)
-                # return ExecutionStatus(status=False, message=msg_)
-
-        return status
+        return self._dispatch("set_source_volume_db", volume_settings)
 
     def setup_sidechain(self, sidechain_settings):
         """
@@ -321,27 +413,7 @@ class Server:
         if not self.is_initialized:
             return ExecutionStatus(status=False, message="The server was not initialized yet")
 
-        status = ExecutionStatus(status=True)
-
-        for lang, settings in sidechain_settings.items():
-            if lang not in self.obs_instances:
-                msg_ = f"W PYSERVER::Server::setup_sidechain(): no obs instance found with lang {lang} specified"
-                print(msg_)
-                status.append_warning(msg_)
-                continue
-            obs_: obs.OBS = self.obs_instances[lang]
-            try:
-                ratio = settings["ratio"] if "ratio" in settings else None
-                release_time = settings["release_time"] if "release_time" in settings else None
-                threshold = settings["threshold"] if "threshold" in settings else None
-
-                obs_.setup_sidechain(ratio=ratio, release_time=release_time, threshold=threshold)
-            except BaseException as ex:
-                msg_ = f"E PYSERVER::Server::setup_sidechain(): couldn't setup sidechain, lang {lang}. Details: {ex}"
-                print(msg_)
-                status.append_error(msg_)
-                # return ExecutionStatus(status=False, message=msg_)
-        return status
+        return self._dispatch("setup_sidechain", sidechain_settings)
 
     def setup_transition(self, transition_settings):
         """
@@ -352,27 +424,37 @@ class Server:
         if not self.is_initialized:
             return ExecutionStatus(status=False, message="The server was not initialized yet")
 
-        status = ExecutionStatus(status=True)
+        return self._dispatch("setup_transition", transition_settings)
 
-        for lang, settings in transition_settings.items():
-            if lang not in self.obs_instances:
-                msg_ = f"W PYSERVER::Server::setup_transition(): no obs instance found with lang {lang} specified"
-                print(msg_)
-                status.append_warning(msg_)
-                continue
-            obs_: obs.OBS = self.obs_instances[lang]
-            try:
-                transition_name = settings.pop("transition_name")
-                if "path" in settings:
-                    settings["path"] = os.path.join(TRANSITION_DIR, settings["path"])
+    def get_stats(self):
+        """
+        Retrieves obs controller statistics (cache counters, etc.)
+        :return: {"lang": {"scene_cache": {...}, ...}, ...}
+        """
+        if not self.is_initialized:
+            return ExecutionStatus(status=False, message="The server was not initialized yet")
 
-                obs_.setup_transition(transition_name=transition_name, transition_settings=settings)
-            except BaseException as ex:
-                msg_ = f"E PYSERVER::Server::setup_transition(): couldn't setup transition, lang {lang}. Details: {ex}"
-                print(msg_)
-                status.append_error(msg_)
-                # return ExecutionStatus(status=False, message=msg_)
-        return status
+        data = {lang: obs_.get_stats() for lang, obs_ in self.obs_instances.items()}
+        for lang, supervisor in self.supervisors.items():
+            data[lang]["connection"] = supervisor.stats()
+        return data
+
+    def get_state(self):
+        """
+        Retrieves the live state of the obs instances, its changes are published to `events`
+        :return: {"lang": {"sources": {...}, "media": {...}, "streaming": {...}, "connection": {...}}, ...},
+        see `obs.OBS.get_state()` and `obs_client.ConnectionSupervisor.stats()`
+        """
+        return {lang: self._get_lang_state(lang) for lang in list(self.obs_instances)}
+
+    def _get_lang_state(self, lang):
+        state = self.obs_instances[lang].get_state()
+        supervisor = self.supervisors.get(lang)
+        state["connection"] = supervisor.stats() if supervisor is not None else None
+        return state
+
+    def _publish_state(self, lang, path, value):
+        self.events.publish({"lang": lang, "path": path, "value": value})
 
     def start_streaming(self):
         """
@@ -381,18 +463,7 @@ class Server:
         if not self.is_initialized:
             return ExecutionStatus(status=False, message="The server was not initialized yet")
 
-        status = ExecutionStatus(status=True)
-
-        for lang, obs_ in self.obs_instances.items():
-            try:
-                obs_.start_streaming()
-            except BaseException as ex:
-                msg_ = f"E PYSERVER::Server::start_streaming(): couldn't play media, lang {lang}. Details: {ex}"
-                print(msg_)
-                status.append_error(msg_)
-                # return ExecutionStatus(status=False, message=msg_
-
-        return status
+        return self._dispatch("start_streaming", {lang: None for lang in self.obs_instances})
 
     def stop_streaming(self):
         """
@@ -401,38 +472,257 @@ class Server:
         if not self.is_initialized:
             return ExecutionStatus(status=False, message="The server was not initialized yet")
 
+        return self._dispatch("stop_streaming", {lang: None for lang in self.obs_instances})
+
+    def run_batch(self, operations):
+        """
+        Applies a sequence of operations (see `OPERATIONS`) in one go. Operations of a language are applied
+        in order, one after another, languages are handled concurrently. A failed operation doesn't stop the others.
+        The timeout of a language (see `_fan_out()`) is multiplied by the number of its operations.
+        :param operations: dictionary,
+        e.g. {"lang": [{"op": "set_ts_volume_db", "params": 0.0}, {"op": "setup_sidechain", "params": {...}}, ...], ...}
+        where "params" are by-lang parameters of the operation (as for the corresponding method)
+        :return: {"lang": [{"op": "...", "status": True/False, "message": "..."}, ...], ...}
+        """
+        if not self.is_initialized:
+            return ExecutionStatus(status=False, message="The server was not initialized yet")
+
+        data = {}
+        tasks = {}
+        timeouts = {}
+        for lang, operations_ in operations.items():
+            status_ = ExecutionStatus(status=True)
+            obs_ = self._get_obs_instance(lang, status_, method_name="run_batch")
+            if obs_ is None:
+                data[lang] = [
+                    {"op": operation.get("op"), "status": False, "message": status_.message}
+                    for operation in operations_
+                ]
+                continue
+            tasks[lang] = functools.partial(self._run_operations, obs_, lang, operations_)
+            timeouts[lang] = self._get_operation_timeout(lang) * max(len(operations_), 1)
+
+        errors = {}
+        data.update(
+            self._fan_out(
+                tasks, None, method_name="run_batch", action="couldn't run operations", timeouts=timeouts, errors=errors
+            )
+        )
+        for lang, msg_ in errors.items():
+            data[lang] = [
+                {"op": operation.get("op"), "status": False, "message": msg_} for operation in operations[lang]
+            ]
+
+        return data
+
+    def _run_operations(self, obs_, lang, operations_):
+        """
+        Applies the operations of a language in order (see `run_batch()`)
+        :return: [{"op": "...", "status": True/False, "message": "..."}, ...]
+        """
+        results = []
+        for operation in operations_:
+            status_ = ExecutionStatus(status=True)
+            op = operation.get("op")
+            if op not in OPERATIONS:
+                status_.append_error(f"E PYSERVER::Server::run_batch(): unknown operation {op}, lang {lang}")
+            else:
+                try:
+                    getattr(self, f"_{op}")(obs_, lang, operation.get("params"), status_)
+                except BaseException as ex:
+                    status_.append_error(f"E PYSERVER::Server::{op}(): {OPERATIONS[op]}, lang {lang}. Details: {ex}")
+            if not status_:
+                print(status_.message)
+            results.append({"op": op, "status": bool(status_), "message": status_.message})
+        return results
+
+    def _dispatch(self, operation, params):
+        """
+        Generic per-language dispatcher: applies `operation` (see `OPERATIONS`) to every language of `params`
+        concurrently (see `_fan_out()`), using the operation's per-language handler `_<operation>()`
+        :param params: by-lang parameters, e.g. {"lang": ..., ...}
+        :return: ExecutionStatus
+        """
         status = ExecutionStatus(status=True)
+        foo = getattr(self, f"_{operation}")
+
+        tasks = {}
+        statuses = {}  # {"lang": ExecutionStatus, ...}, warnings of the handlers (which run in other threads)
+        for lang, params_ in params.items():
+            obs_ = self._get_obs_instance(lang, status, method_name=operation)
+            if obs_ is None:
+                continue
+            statuses[lang] = ExecutionStatus(status=True)
+            tasks[lang] = functools.partial(foo, obs_, lang, params_, statuses[lang])
 
-        for lang, obs_ in self.obs_instances.items():
+        self._fan_out(tasks, status, method_name=operation, action=OPERATIONS[operation])
+        for status_ in statuses.values():
+            if status_.message:
+                status.append_warning(status_.message)
+
+        return status
+
+    def _run_media(self, obs_, lang, params_, status):
+        path = self._find_media(lang, params_["name"], params_["search_by_num"], status, method_name="run_media")
+        if path is not None:
+            obs_.run_media(path)
+
+    def _preload_media(self, obs_, lang, params_, status):
+        obs_.preload_media(self._find_media_list(lang, params_, status, method_name="preload_media"))
+
+    def _enqueue_media(self, obs_, lang, params_, status):
+        obs_.enqueue_media(self._find_media_list(lang, params_, status, method_name="enqueue_media"))
+
+    def _find_media_list(self, lang, params_, status, method_name):
+        paths = []
+        for media_ in params_:
+            path = self._find_media(lang, media_["name"], media_["search_by_num"], status, method_name=method_name)
+            if path is not None:
+                paths.append(path)
+        return paths
+
+    def _set_stream_settings(self, obs_, lang, settings, status):
+        obs_.set_stream_settings(server=settings["server"], key=settings["key"])
+
+    def _set_ts_sync_offset(self, obs_, lang, offset, status):
+        obs_.set_ts_sync_offset(offset)
+
+    def _set_ts_volume_db(self, obs_, lang, volume, status):
+        obs_.set_ts_volume_db(volume)
+
+    def _set_source_volume_db(self, obs_, lang, volume, status):
+        obs_.set_source_volume_db(volume)
+
+    def _setup_sidechain(self, obs_, lang, settings, status):
+        obs_.setup_sidechain(
+            ratio=settings.get("ratio"), release_time=settings.get("release_time"), threshold=settings.get("threshold")
+        )
+
+    def _setup_transition(self, obs_, lang, settings, status):
+        settings = dict(settings)
+        transition_name = settings.pop("transition_name")
+        if "path" in settings:
+            settings["path"] = os.path.join(TRANSITION_DIR, settings["path"])
+
+        obs_.setup_transition(transition_name=transition_name, transition_settings=settings)
+
+    def _start_streaming(self, obs_, lang, params_, status):
+        obs_.start_streaming()
+
+    def _stop_streaming(self, obs_, lang, params_, status):
+        obs_.stop_streaming()
+
+    def _get_obs_instance(self, lang, status, method_name):
+        """
+        Returns the obs controller of `lang`, appends a warning to `status` if there is no such
+        :return: obs.OBS or None
+        """
+        if lang not in self.obs_instances:
+            msg_ = f"W PYSERVER::Server::{method_name}(): no obs instance found with lang {lang} specified"
+            print(msg_)
+            status.append_warning(msg_)
+            return None
+        return self.obs_instances[lang]
+
+    def _get_source_values(self, foo, source_name, field, method_name, action):
+        """
+        Retrieves a source value from every obs instance concurrently
+        :param foo: foo(obs_), returns the value
+        :return: {"lang": value, ..., "__updated_at__": {"lang": timestamp, ...}}, "#" for the failed languages
+        """
+        tasks = {
+            lang: functools.partial(lambda obs_: (foo(obs_), obs_.source_state.updated_at(source_name, field)), obs_)
+            for lang, obs_ in self.obs_instances.items()
+        }
+        results = self._fan_out(tasks, status=None, method_name=method_name, action=action)
+
+        data = {}
+        updated_at = {}  # {"lang": timestamp, ...}, when the value was last confirmed by obs
+        for lang in self.obs_instances:
+            if lang in results:
+                data[lang], updated_at[lang] = results[lang]
+            else:
+                data[lang] = "#"  # TODO: handle errors
+        data[UPDATED_AT_KEY] = updated_at
+        return data
+
+    def _fan_out(self, tasks, status, method_name, action, timeouts=None, errors=None):
+        """
+        Runs per-language operations concurrently, so a slow (or hung) obs instance doesn't delay the others.
+        Every language has its own timeout: `timeout` (seconds) in its `server_langs` entry,
+        OBS_OPERATION_TIMEOUT by default. An operation which timed out keeps running in the background.
+        :param tasks: {"lang": foo, ...}, where foo() performs the operation for the language
+        :param status: ExecutionStatus to append the errors to, may be None
+        :param method_name: method name used in the error messages
+        :param action: description used in the error messages, e.g. "couldn't play media"
+        :param timeouts: {"lang": seconds, ...}, overrides the default timeouts (optional)
+        :param errors: dictionary to put the error messages to, {"lang": "message", ...} (optional)
+        :return: {"lang": result, ...} for the operations which succeeded in time
+        """
+        started_at = time.monotonic()
+        futures = {lang: _fan_out_executor.submit(foo) for lang, foo in tasks.items()}
+        timeouts = {lang: (timeouts or {}).get(lang) or self._get_operation_timeout(lang) for lang in futures}
+        return self._wait_all(futures, started_at, timeouts, status, method_name, action, errors)
+
+    def _wait_all(self, futures, started_at, timeouts, status, method_name, action, errors=None):
+        """
+        Waits for per-language futures, see `_fan_out()`
+        :param futures: {"lang": concurrent.futures.Future, ...}
+        :param started_at: `time.monotonic()` the timeouts run from
+        :param timeouts: {"lang": seconds, ...}
+        :return: {"lang": result, ...} for the futures which succeeded in time
+        """
+        results = {}
+        for lang, future in futures.items():
+            timeout = timeouts[lang]
             try:
-                obs_.stop_streaming()
+                results[lang] = future.result(timeout=max(started_at + timeout - time.monotonic(), 0))
+                continue
+            except concurrent.futures.TimeoutError:
+                details = f"no response in {timeout} seconds"
             except BaseException as ex:
-                msg_ = f"E PYSERVER::Server::stop_streaming(): couldn't play media, lang {lang}. Details: {ex}"
-                print(msg_)
+                details = ex
+            msg_ = f"E PYSERVER::Server::{method_name}(): {action}, lang {lang}. Details: {details}"
+            print(msg_)
+            if status is not None:
                 status.append_error(msg_)
-                # return ExecutionStatus(status=False, message=msg_)
+            if errors is not None:
+                errors[lang] = msg_
 
-        return status
+        return results
+
+    def _get_operation_timeout(self, lang):
+        return float(self.server_langs.get(lang, {}).get("timeout", OBS_OPERATION_TIMEOUT))
 
-    def _establish_connections(self, verbose=True):
+    def _establish_connections(self, verbose=True, langs=None):
         """
-        establish connections
+        establish connections (concurrently, every connection is bounded by OBS_CONNECT_TIMEOUT/OBS_AUTH_TIMEOUT)
+        :param langs: languages to connect, all by default
         :return: True/False
         """
+        langs = langs if langs is not None else list(self.server_langs)
+
         # create obs ws clients
-        self.obs_clients = {
-            lang: obsws.obsws(host=lang_info["obs_host"], port=int(lang_info["websocket_port"]))
+        clients = {
+            lang: obs_client.OBSClient(
+                host=lang_info["obs_host"],
+                port=int(lang_info["websocket_port"]),
+                password=lang_info.get("password", ""),
+                connect_timeout=OBS_CONNECT_TIMEOUT,
+                auth_timeout=OBS_AUTH_TIMEOUT,
+            )
             for lang, lang_info in self.server_langs.items()
+            if lang in langs
         }
 
         status = ExecutionStatus(status=True)
 
         # establish connections
-        for lang, client in self.obs_clients.items():
+        for lang, ex in obs_client.connect_many(clients).items():
             # if couldn't establish a connection
-            try:
-                client.connect()
-            except BaseException as ex:
+            if ex is None:
+                self.obs_clients[lang] = clients[lang]
+            else:
                 msg_ = (
                     "E PYSERVER::Server::_establish_connections(): Couldn't connect to obs server. "
                     f"Lang '{lang}', "
@@ -445,49 +735,72 @@ class Server:
 
         return status
 
-    def _initialize_obs_controllers(self, verbose=True):
+    def _start_supervisors(self, langs=None):
         """
-        Creates obs controller instances and set's up basic scenes
+        Starts a connection supervisor per language: a dropped connection is re-established
+        (with backoff) and the obs controller re-syncs its state, without touching the other languages
+        :param langs: languages to supervise, all by default
         """
+        langs = langs if langs is not None else list(self.obs_clients)
+        for lang in langs:
+            self.supervisors[lang] = obs_client.ConnectionSupervisor(
+                self.obs_clients[lang],
+                name=lang,
+                on_reconnect=self.obs_instances[lang].resync,
+                on_status_change=functools.partial(self._publish_state, lang, ["connection"]),
+                ping_interval=OBS_PING_INTERVAL,
+                max_delay=OBS_RECONNECT_MAX_DELAY,
+            )
+            self.supervisors[lang].start()
+            self._publish_state(lang, [], self._get_lang_state(lang))  # the lang is live now
+
+    def _stop_supervisors(self, langs=None):
+        """
+        :param langs: languages to stop supervising, all by default
+        """
+        langs = langs if langs is not None else list(self.supervisors)
+        for lang in langs:
+            supervisor = self.supervisors.pop(lang, None)
+            if supervisor is not None:
+                supervisor.stop()
+
+    def _initialize_obs_controllers(self, verbose=True, langs=None):
+        """
+        Creates obs controller instances and set's up basic scenes (concurrently)
+        :param langs: languages to initialize, all the connected ones by default.
+        Only the controllers which were initialized successfully are kept
+        """
+        langs = langs if langs is not None else list(self.obs_clients)
+
         # create obs controller instances
-        self.obs_instances = {lang: obs.OBS(lang, client) for lang, client in self.obs_clients.items()}
+        obs_instances = {lang: obs.OBS(lang, self.obs_clients[lang], media_pool_size=MEDIA_POOL_SIZE) for lang in langs}
+
+        def initialize_obs_controller(lang, obs_):
+            obs_.setup_scenes(original_media_source=self.server_langs[lang]["original_media_url"])
+            obs_.sync_source_state()
 
         status = ExecutionStatus(status=True)
 
         # reset scenes, create original media sources
-        for lang, obs_ in self.obs_instances.items():
-            try:
-                obs_.clear_all_scenes()
-                obs_.setup_scene(scene_name=obs.MAIN_SCENE_NAME)
-                obs_.set_original_media_source(
-                    scene_name=obs.MAIN_SCENE_NAME, original_media_source=self.server_langs[lang]["original_media_url"]
-                )
-                obs_.setup_ts_sound()
-            except BaseException as ex:
-                msg_ = (
-                    f"E PYSERVER::Server::_initialize_obs_controllers(): Couldn't initialize obs controller. "
-                    f"Lang: '{lang}', "
-                    f"host '{self.server_langs[lang]['obs_host']}', "
-                    f"port {self.server_langs[lang]['websocket_port']}. Details: {ex}"
-                )
-                if verbose:
-                    print(msg_)
-                status.append_error(msg_)
+        tasks = {lang: functools.partial(initialize_obs_controller, lang, obs_) for lang, obs_ in obs_instances.items()}
+        results = self._fan_out(
+            tasks, status, method_name="_initialize_obs_controllers", action="Couldn't initialize obs controller"
+        )
+        for lang in results:
+            obs_instances[lang].on_state_change = functools.partial(self._publish_state, lang)
+            self.obs_instances[lang] = obs_instances[lang]
 
         return status
 
     def _reset_scenes(self, verbose=True):
         status = ExecutionStatus(status=True)
 
-        # reset scenes, create original media sources
-        for lang, obs_ in self.obs_instances.items():
-            try:
-                obs_.clear_all_scenes()
-                obs_.setup_scene(scene_name=obs.MAIN_SCENE_NAME)
-            except BaseException as ex:
-                msg_ = f"E PYSERVER::Server::_reset_scenes(): Couldn't reset scenes. Details: {ex}"
-                if verbose:
-                    print(msg_)
-                status.append_error(msg_)
+        def reset_scenes(lang, obs_):
+            obs_.reset_media()
+            obs_.setup_scenes(original_media_source=self.server_langs[lang]["original_media_url"])
+
+        # bring scenes back to the default layout, keeping the original media sources running
+        tasks = {lang: functools.partial(reset_scenes, lang, obs_) for lang, obs_ in self.obs_instances.items()}
+        self._fan_out(tasks, status, method_name="_reset_scenes", action="couldn't reset scenes")
 
         return status
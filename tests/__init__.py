@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# the services read their settings from the environment when they are imported
+os.environ.setdefault("MEDIA_DIR", tempfile.gettempdir())
@@ -0,0 +1,217 @@
+import asyncio
+import threading
+
+from obs_client import build_event
+
+
+class FakeOBSClient:
+    """
+    In-process stand-in for `obs_client.OBSClient` talking to obs-websocket 4.x.
+    Keeps the scenes, the sources and their filters, answers the requests the way obs does
+    and records the names of the requests in `log`
+    """
+
+    def __init__(self, scene_name="Scene"):
+        self.lock = threading.RLock()
+        self.scenes = {scene_name: []}  # {"scene_name": [{"id": n, "name": "source_name", "render": True}, ...]}
+        self.current_scene = scene_name
+        # {"source_name": {"kind": ..., "settings": {...}, "filters": [...], "monitor_type": ..., "muted": ...}}
+        self.sources = {}
+        self.media_duration = 1000  # milliseconds, answered to GetMediaDuration
+        self.media_state = "playing"  # answered to GetMediaState
+        self.opening_polls = 0  # number of GetMediaDuration a new source answers 0 to (it's opening the file)
+        self.failing = set()  # names of the requests answered with an error
+        self.log = []  # names of the requests, in the order they have been received
+        self.handlers = []
+        self.next_item_id = 1
+        self.connected = True
+
+    def requests(self, *names):
+        """
+        :return: list of the logged request names which are in `names`
+        """
+        with self.lock:
+            return [name for name in self.log if name in names]
+
+    def items(self, scene_name):
+        with self.lock:
+            return [item["name"] for item in self.scenes.get(scene_name, [])]
+
+    def restart(self):
+        """
+        Simulates obs restarted with an empty scene collection
+        """
+        with self.lock:
+            self.scenes = {"Scene": []}
+            self.current_scene = "Scene"
+            self.sources = {}
+
+    def emit(self, update_type, **data):
+        event = build_event(dict(data, **{"update-type": update_type}))
+        for foo, event_cls in list(self.handlers):
+            if event_cls is None or isinstance(event, event_cls):
+                foo(event)
+
+    def run_sync(self, coro, timeout=None):
+        return asyncio.run(coro)
+
+    def connect(self):
+        self.connected = True
+
+    def disconnect(self):
+        self.connected = False
+
+    def call(self, request):
+        with self.lock:
+            self.log.append(request.name)
+            if request.name in self.failing:
+                data = {"status": "error", "error": "failing"}
+            else:
+                data = self._handle(request.name, request.dataout)
+            request.input(dict(data, **{"message-id": str(len(self.log))}))
+        return request
+
+    def call_many(self, requests):
+        # obs-websocket 4.x handles every message on its thread pool, so the requests of a batch may be
+        # processed in any order. They are processed backwards, so requests depending on each other break
+        for request in reversed(requests):
+            self.call(request)
+        return requests
+
+    async def call_async(self, request):
+        return self.call(request)
+
+    async def call_many_async(self, requests):
+        return self.call_many(requests)
+
+    def register(self, foo, event=None):
+        self.handlers.append((foo, event))
+
+    def unregister(self, foo, event=None):
+        self.handlers.remove((foo, event))
+
+    def _handle(self, name, data):
+        foo = getattr(self, f"_on_{name}", None)
+        if foo is None:
+            return {"status": "ok"}
+        try:
+            return dict(foo(data) or {}, status="ok")
+        except KeyError as ex:
+            return {"status": "error", "error": f"not found: {ex}"}
+
+    def _on_GetSceneList(self, data):
+        return {
+            "current-scene": self.current_scene,
+            "scenes": [
+                {"name": name, "sources": [{"id": item["id"], "name": item["name"]} for item in items]}
+                for name, items in self.scenes.items()
+            ],
+        }
+
+    def _on_GetCurrentScene(self, data):
+        return {"name": self.current_scene, "sources": []}
+
+    def _on_SetCurrentScene(self, data):
+        self.scenes[data["scene-name"]]
+        self.current_scene = data["scene-name"]
+
+    def _on_CreateScene(self, data):
+        if data["sceneName"] in self.scenes:
+            raise KeyError(data["sceneName"])
+        self.scenes[data["sceneName"]] = []
+
+    def _on_CreateSource(self, data):
+        if data["sourceName"] in self.sources:
+            raise KeyError(data["sourceName"])
+        items = self.scenes[data["sceneName"]]
+        self.sources[data["sourceName"]] = {
+            "kind": data["sourceKind"],
+            "settings": dict(data.get("sourceSettings") or {}),
+            "filters": [],
+            "monitor_type": "none",
+            "muted": False,
+            "opening_polls": self.opening_polls,
+        }
+        item_id, self.next_item_id = self.next_item_id, self.next_item_id + 1
+        render = data.get("setVisible")
+        items.append({"id": item_id, "name": data["sourceName"], "render": True if render is None else render})
+        return {"itemId": item_id}
+
+    def _on_DeleteSceneItem(self, data):
+        items = self.scenes[data["scene"]]
+        item = next(item for item in items if item["id"] == data["item"]["id"])
+        items.remove(item)
+        # obs destroys a source with its last scene item
+        if not any(item_["name"] == item["name"] for items_ in self.scenes.values() for item_ in items_):
+            self.sources.pop(item["name"], None)
+
+    def _on_SetSceneItemRender(self, data):
+        for item in self.scenes[data["scene-name"]]:
+            if item["name"] == data["source"]:
+                item["render"] = data["render"]
+
+    def _on_GetSourceSettings(self, data):
+        source = self.sources[data["sourceName"]]
+        return {"sourceName": data["sourceName"], "sourceType": source["kind"], "sourceSettings": source["settings"]}
+
+    def _on_SetSourceSettings(self, data):
+        self.sources[data["sourceName"]]["settings"].update(data["sourceSettings"])
+
+    def _on_GetSourceFilters(self, data):
+        return {"filters": self.sources[data["sourceName"]]["filters"]}
+
+    def _on_AddFilterToSource(self, data):
+        self.sources[data["sourceName"]]["filters"].append(
+            {
+                "enabled": True,
+                "name": data["filterName"],
+                "settings": data["filterSettings"],
+                "type": data["filterType"],
+            }
+        )
+
+    def _on_RemoveFilterFromSource(self, data):
+        source = self.sources[data["sourceName"]]
+        source["filters"] = [filter_ for filter_ in source["filters"] if filter_["name"] != data["filterName"]]
+
+    def _on_SetSourceFilterSettings(self, data):
+        for filter_ in self.sources[data["sourceName"]]["filters"]:
+            if filter_["name"] == data["filterName"]:
+                filter_["settings"] = dict(filter_["settings"], **data["filterSettings"])
+
+    def _on_GetAudioMonitorType(self, data):
+        return {"monitorType": self.sources[data["sourceName"]]["monitor_type"]}
+
+    def _on_SetAudioMonitorType(self, data):
+        self.sources[data["sourceName"]]["monitor_type"] = data["monitorType"]
+
+    def _on_SetMute(self, data):
+        self.sources[data["source"]]["muted"] = data["mute"]
+
+    def _on_GetMute(self, data):
+        return {"name": data["source"], "muted": self.sources[data["source"]]["muted"]}
+
+    def _on_GetVolume(self, data):
+        return {"name": data["source"], "volume": 0.0, "muted": self.sources[data["source"]]["muted"]}
+
+    def _on_GetSyncOffset(self, data):
+        self.sources[data["source"]]
+        return {"name": data["source"], "offset": 0}
+
+    def _on_GetMediaDuration(self, data):
+        source = self.sources[data["sourceName"]]
+        if source["opening_polls"]:
+            source["opening_polls"] -= 1
+            return {"mediaDuration": 0}
+        return {"mediaDuration": self.media_duration}
+
+    def _on_GetMediaTime(self, data):
+        self.sources[data["sourceName"]]
+        return {"timestamp": 0}
+
+    def _on_GetMediaState(self, data):
+        self.sources[data["sourceName"]]
+        return {"mediaState": self.media_state}
+
+    def _on_GetStreamingStatus(self, data):
+        return {"streaming": False, "recording": False}
@@ -0,0 +1,49 @@
+import json
+import unittest
+
+from werkzeug.exceptions import BadRequest
+
+import common_service
+import util
+
+
+class BatchRouteTest(unittest.TestCase):
+    def post(self, operations):
+        client = common_service.app.test_client()
+        body = json.dumps({"operations": operations})
+        return client.post("/batch", data=body, content_type=util.JSON_CONTENT_TYPE)
+
+    def test_malformed_operations_are_rejected(self):
+        for operations, message in (
+            (None, "`operations` must be a list"),
+            ({"op": "start_streaming"}, "`operations` must be a list"),
+            ([{"op": "start_streaming"}, "stop_streaming"], "operation 1 must be an object"),
+            ([{"params": {"eng": 1.0}}], "operation 0: unknown `op` None"),
+            ([{"op": "start_streaming"}, {"op": "reboot"}], "operation 1: unknown `op` 'reboot'"),
+            ([{"op": "set_ts_volume_db", "params": 1.0}], "operation 0: `params` must be an object"),
+        ):
+            with self.subTest(operations=operations):
+                response = self.post(operations)
+
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(message, response.get_data(as_text=True))
+
+
+class GetTimeoutTest(unittest.TestCase):
+    def get_timeout(self, query_string):
+        with common_service.app.test_request_context("/", query_string=query_string):
+            return common_service.get_timeout(15)
+
+    def test_timeout(self):
+        self.assertEqual(self.get_timeout({}), 15)
+        self.assertEqual(self.get_timeout({"timeout": "2.5"}), 2.5)
+
+    def test_bad_timeout_is_rejected(self):
+        for timeout in ("abc", "", "0", "-1", "nan", "inf"):
+            with self.subTest(timeout=timeout):
+                with self.assertRaises(BadRequest):
+                    self.get_timeout({"timeout": timeout})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import media_index
+
+
+class MediaIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.media_dir = self.tmp.name
+        for name in ("001_a.mp4", "0012.mp4", "b.mp4"):
+            self.touch(name)
+        self.index = media_index.MediaIndex(self.media_dir, poll_interval=60)
+        self.index.refresh()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def touch(self, name):
+        path = os.path.join(self.media_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"0" * 10)
+
+    def test_find(self):
+        self.assertEqual(self.index.find("b.mp4"), os.path.join(self.media_dir, "b.mp4"))
+        self.assertIsNone(self.index.find("missing.mp4"))
+
+    def test_find_by_num_prefers_exact_numbers(self):
+        self.assertEqual(self.index.find_by_num("001"), os.path.join(self.media_dir, "001_a.mp4"))
+        self.assertEqual(self.index.find_by_num("00"), os.path.join(self.media_dir, "0012.mp4"))
+        self.assertIsNone(self.index.find_by_num("2"))
+
+    def test_find_in_subdirectory(self):
+        self.touch(os.path.join("sub", "x.mp4"))
+
+        self.assertEqual(self.index.find("sub/x.mp4"), os.path.join(self.media_dir, "sub", "x.mp4"))
+        self.assertIsNone(self.index.find("sub/missing.mp4"))
+
+    def test_new_file_is_found_by_the_forced_rescan(self):
+        self.touch("c.mp4")
+
+        self.assertEqual(self.index.find("c.mp4"), os.path.join(self.media_dir, "c.mp4"))
+
+    def test_misses_force_a_rescan_once_per_poll_interval(self):
+        with mock.patch("os.scandir", wraps=os.scandir) as scandir:
+            for _ in range(5):
+                self.index.find("missing.mp4")
+                self.index.find_by_num("999")
+        self.assertEqual(scandir.call_count, 1)
+
+    def test_list(self):
+        data = self.index.list(offset=1, limit=1)
+
+        self.assertEqual(data["total"], 3)
+        self.assertEqual(data["items"], [{"name": "001_a.mp4", "size": 10}])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,313 @@
+import time
+import unittest
+
+import obswebsocket.requests
+
+import obs
+from tests.fake_obs import FakeOBSClient
+
+ORIGINAL_MEDIA_URL = "srt://origin:4000"
+MUTATING_REQUESTS = (
+    "CreateScene",
+    "CreateSource",
+    "DeleteSceneItem",
+    "SetSourceSettings",
+    "SetAudioMonitorType",
+    "AddFilterToSource",
+    "RemoveFilterFromSource",
+    "SetSourceFilterSettings",
+    "SetSourceFilterVisibility",
+    "SetCurrentScene",
+)
+
+
+def wait_for(predicate, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+
+
+class OBSTestCase(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeOBSClient()
+        self.client.media_duration = 60_000
+        self.obs = obs.OBS("en", self.client)
+
+    def tearDown(self):
+        self.obs.reset_media()
+
+    def mutations(self):
+        return self.client.requests(*MUTATING_REQUESTS)
+
+
+class RequestBatchTest(unittest.TestCase):
+    def test_dependent_requests_are_sent_in_separate_stages(self):
+        batch = obs.RequestBatch(FakeOBSClient())
+        batch.add(obswebsocket.requests.PlayPauseMedia(sourceName="media", playPause=False))
+        batch.add(obswebsocket.requests.SetMediaTime(sourceName="media", timestamp=0))
+        batch.add(obswebsocket.requests.GetMediaDuration(sourceName="media"))
+        batch.add(obswebsocket.requests.CreateSource(sourceName="media", sourceKind="ffmpeg_source", sceneName="main"))
+        batch.add(obswebsocket.requests.SetMute(source="ts_input", mute=True))
+        batch.add(obswebsocket.requests.DeleteSceneItem(scene="main", item={"name": "media", "id": 1}))
+
+        stages = [[request.name for request in stage] for stage in batch.stages()]
+
+        self.assertEqual(
+            stages,
+            [
+                ["DeleteSceneItem"],
+                ["CreateSource"],
+                ["SetMediaTime", "GetMediaDuration", "SetMute"],
+                ["PlayPauseMedia"],
+            ],
+        )
+
+
+class ReconcileScenesTest(OBSTestCase):
+    def setUp(self):
+        super().setUp()
+        self.obs.setup_scenes(ORIGINAL_MEDIA_URL)
+        self.client.log.clear()
+
+    def test_creates_the_default_layout(self):
+        self.assertEqual(self.client.current_scene, obs.MAIN_SCENE_NAME)
+        self.assertEqual(
+            sorted(self.client.items(obs.MAIN_SCENE_NAME)), [obs.ORIGINAL_STREAM_SOURCE_NAME, obs.TS_INPUT_NAME]
+        )
+        source = self.client.sources[obs.ORIGINAL_STREAM_SOURCE_NAME]
+        self.assertEqual(source["settings"]["input"], ORIGINAL_MEDIA_URL)
+
+    def test_intact_scenes_are_not_touched(self):
+        self.assertEqual(self.obs.setup_scenes(ORIGINAL_MEDIA_URL), 0)
+        self.assertEqual(self.mutations(), [])
+
+    def test_changed_url_is_updated_in_place(self):
+        self.obs.setup_scenes("rtmp://other/live")
+
+        self.assertEqual(self.mutations(), ["SetSourceSettings"])
+        source = self.client.sources[obs.ORIGINAL_STREAM_SOURCE_NAME]
+        self.assertEqual(source["settings"]["input"], "rtmp://other/live")
+
+    def test_original_media_source_is_updated_with_a_single_request(self):
+        self.obs.update_original_media_source("rtmp://other/live")
+
+        self.assertEqual(self.client.log, ["SetSourceSettings"])
+        source = self.client.sources[obs.ORIGINAL_STREAM_SOURCE_NAME]
+        self.assertEqual(source["settings"]["input"], "rtmp://other/live")
+        self.assertEqual(self.obs.original_media_source, "rtmp://other/live")
+
+    def test_unexpected_items_are_removed(self):
+        self.client.scenes[obs.MAIN_SCENE_NAME].append({"id": 100, "name": "stray", "render": True})
+        self.obs.sync_scene_cache()
+
+        self.obs.setup_scenes(ORIGINAL_MEDIA_URL)
+
+        self.assertEqual(self.mutations(), ["DeleteSceneItem"])
+        self.assertNotIn("stray", self.client.items(obs.MAIN_SCENE_NAME))
+
+    def test_sidechain_filter_is_kept(self):
+        self.obs.setup_sidechain(ratio=10.0)
+        self.client.log.clear()
+
+        self.obs.setup_scenes(ORIGINAL_MEDIA_URL)
+
+        self.assertEqual(self.mutations(), [])
+        filters = self.client.sources[obs.ORIGINAL_STREAM_SOURCE_NAME]["filters"]
+        self.assertEqual([filter_["name"] for filter_ in filters], [obs.COMPRESSOR_FILTER_NAME])
+
+    def test_sidechain_filter_is_restored_with_the_source(self):
+        self.obs.setup_sidechain(ratio=10.0)
+        item_id = self.obs.scene_cache.find_source(obs.ORIGINAL_STREAM_SOURCE_NAME)[0][1]
+        self.obs.delete_scene_item(item_id, obs.ORIGINAL_STREAM_SOURCE_NAME, obs.MAIN_SCENE_NAME)
+
+        self.obs.setup_scenes(ORIGINAL_MEDIA_URL)
+
+        filters = self.client.sources[obs.ORIGINAL_STREAM_SOURCE_NAME]["filters"]
+        self.assertEqual(filters[0]["name"], obs.COMPRESSOR_FILTER_NAME)
+        self.assertEqual(filters[0]["settings"]["ratio"], 10.0)
+
+    def test_preloaded_media_is_kept(self):
+        self.obs.preload_media(["/media/a.mp4", "/media/b.mp4"])
+        items = self.client.items(obs.MAIN_SCENE_NAME)
+        self.client.log.clear()
+
+        self.obs.setup_scenes(ORIGINAL_MEDIA_URL)
+
+        self.assertEqual(self.mutations(), [])
+        self.assertEqual(self.client.items(obs.MAIN_SCENE_NAME), items)
+
+    def test_playing_media_is_kept(self):
+        self.obs.run_media("/media/a.mp4")
+        wait_for(lambda: self.obs.media_source_name is not None)
+        self.client.log.clear()
+
+        self.obs.setup_scenes(ORIGINAL_MEDIA_URL)
+
+        self.assertEqual(self.mutations(), [])
+        self.assertIn(obs.MEDIA_INPUT_NAME, self.client.items(obs.MAIN_SCENE_NAME))
+
+
+class MediaPlaybackTest(OBSTestCase):
+    def setUp(self):
+        super().setUp()
+        self.obs.setup_scenes(ORIGINAL_MEDIA_URL)
+        self.obs.preload_media(["/media/a.mp4"])
+
+    def assert_unmuted(self):
+        wait_for(lambda: not self.obs.media_active)
+        # the sources are unmuted after the playback is marked inactive
+        for source_name in (obs.ORIGINAL_STREAM_SOURCE_NAME, obs.TS_INPUT_NAME):
+            wait_for(lambda: not self.client.sources[source_name]["muted"])
+        self.assertEqual(self.obs.playing_media, {})
+        self.assertIsNone(self.obs.media_state["playing"])
+
+    def test_preloaded_source_stays_open_while_hidden(self):
+        source_name = self.obs.media_pool.get("/media/a.mp4")["source_name"]
+        settings = self.client.sources[source_name]["settings"]
+        self.assertFalse(settings["restart_on_activate"])
+        self.assertFalse(settings["close_when_inactive"])
+
+    def test_media_is_played_to_the_end(self):
+        self.client.media_duration = 50
+        self.obs.run_media("/media/a.mp4")
+        wait_for(lambda: self.obs.media_source_name is not None)
+        self.assertTrue(self.client.sources[obs.ORIGINAL_STREAM_SOURCE_NAME]["muted"])
+
+        self.assert_unmuted()
+
+    def test_unknown_duration_is_polled(self):
+        self.client.media_duration = 50
+        self.client.opening_polls = 3
+        self.obs.run_media("/media/b.mp4")
+        wait_for(lambda: self.obs.media_source_name is not None)
+        time.sleep(0.1)
+        self.assertTrue(self.obs.media_active)
+
+        self.assert_unmuted()
+        self.assertEqual(len(self.client.requests("GetMediaDuration")), 4)
+
+    def test_media_without_duration_is_ended_by_its_state(self):
+        self.client.media_duration = 0
+        self.obs.run_media("/media/b.mp4")
+        wait_for(lambda: len(self.client.requests("GetMediaState")) >= 2)
+        self.assertTrue(self.obs.media_active)
+        self.client.media_state = "ended"
+
+        self.assert_unmuted()
+
+    def test_scheduled_media_reports_when_it_is_shown(self):
+        self.obs.transition_name = "Stinger"
+        self.obs.transition_path = "/media/stinger.webm"
+        self.obs.transition_point = 200
+        start_at = time.time() + 0.1
+
+        started = self.obs.run_media_at("/media/a.mp4", start_at)
+
+        self.assertFalse(started.done())
+        shown_at = started.result(timeout=2)
+        self.assertGreaterEqual(shown_at, start_at + 0.2)
+        self.assertLess(shown_at, start_at + 0.3)
+
+    def test_scheduled_media_starts_after_the_current_one_has_ended(self):
+        self.client.media_duration = 50
+        self.obs.run_media("/media/a.mp4")
+
+        started = self.obs.run_media_at("/media/b.mp4", time.time() + 0.3)
+
+        started.result(timeout=2)
+        self.assertEqual(self.obs.media_state["playing"], "/media/b.mp4")
+
+    def test_scheduled_media_fails_when_aborted(self):
+        self.client.failing.add("SetMediaTime")
+
+        started = self.obs.run_media_at("/media/b.mp4", time.time())
+
+        with self.assertRaises(RuntimeError):
+            started.result(timeout=2)
+        self.assert_unmuted()
+
+    def test_scheduled_media_fails_when_reset_before_the_start(self):
+        started = self.obs.run_media_at("/media/a.mp4", time.time() + 0.2)
+
+        self.obs.reset_media()
+
+        with self.assertRaises(RuntimeError):
+            started.result(timeout=0)
+        time.sleep(0.3)
+        self.assertFalse(self.obs.media_active)
+        self.assertIsNone(self.obs.media_state["playing"])
+
+    def test_scheduled_media_fails_when_replaced_before_the_start(self):
+        started = self.obs.run_media_at("/media/a.mp4", time.time() + 0.2)
+
+        self.obs.run_media("/media/b.mp4")
+
+        with self.assertRaises(RuntimeError):
+            started.result(timeout=0)
+        wait_for(lambda: self.obs.media_state["playing"] == "/media/b.mp4")
+        time.sleep(0.3)
+        self.assertEqual(self.obs.media_state["playing"], "/media/b.mp4")
+
+    def test_scheduled_media_fails_when_rescheduled(self):
+        first = self.obs.run_media_at("/media/a.mp4", time.time() + 0.2)
+
+        second = self.obs.run_media_at("/media/b.mp4", time.time() + 0.3)
+
+        with self.assertRaises(RuntimeError):
+            first.result(timeout=0)
+        second.result(timeout=2)
+        self.assertEqual(self.obs.media_state["playing"], "/media/b.mp4")
+
+    def test_failed_start_unmutes(self):
+        self.client.failing.add("PlayPauseMedia")
+        self.obs.run_media("/media/a.mp4")
+
+        self.assert_unmuted()
+
+    def test_failed_end_unmutes(self):
+        self.client.media_duration = 50
+        self.obs.run_media("/media/a.mp4")
+        wait_for(lambda: self.obs.media_source_name is not None)
+        self.client.failing.add("PlayPauseMedia")
+
+        self.assert_unmuted()
+
+
+class ResyncTest(OBSTestCase):
+    def setUp(self):
+        super().setUp()
+        self.obs.setup_scenes(ORIGINAL_MEDIA_URL)
+        self.obs.setup_sidechain(ratio=10.0)
+        self.obs.preload_media(["/media/a.mp4"])
+        self.client.log.clear()
+
+    def test_reconnect_resyncs_the_caches_only(self):
+        self.obs.resync()
+
+        self.assertEqual(self.mutations(), [])
+        self.assertEqual(self.client.requests("GetSourceSettings", "GetSourceFilters"), [])
+        self.assertTrue(self.obs.scene_cache.find_source(obs.ORIGINAL_STREAM_SOURCE_NAME))
+        self.assertIsNotNone(self.obs.media_pool.get("/media/a.mp4"))
+
+    def test_restarted_obs_is_set_up_again(self):
+        self.obs.run_media("/media/a.mp4")
+        wait_for(lambda: self.obs.media_source_name is not None)
+        self.client.restart()
+
+        self.obs.resync()
+
+        self.assertEqual(self.client.current_scene, obs.MAIN_SCENE_NAME)
+        self.assertEqual(
+            sorted(self.client.items(obs.MAIN_SCENE_NAME)), [obs.ORIGINAL_STREAM_SOURCE_NAME, obs.TS_INPUT_NAME]
+        )
+        filters = self.client.sources[obs.ORIGINAL_STREAM_SOURCE_NAME]["filters"]
+        self.assertEqual([filter_["name"] for filter_ in filters], [obs.COMPRESSOR_FILTER_NAME])
+        self.assertIsNone(self.obs.media_pool.get("/media/a.mp4"))
+        self.assertFalse(self.obs.media_active)
+        self.assertEqual(self.obs.playing_media, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+
+import obs
+import server
+from tests.fake_obs import FakeOBSClient
+
+ORIGINAL_MEDIA_URL = "srt://origin:4000"
+
+
+class ServerConnectionsTest(unittest.TestCase):
+    def setUp(self):
+        self.server_langs = {
+            "eng": {
+                "obs_host": "localhost",
+                "websocket_port": 1,
+                "password": "",
+                "original_media_url": ORIGINAL_MEDIA_URL,
+            },
+        }
+        self.server = server.Server(server_langs=dict(self.server_langs))
+        self.client = FakeOBSClient()
+        obs_ = obs.OBS("eng", self.client)
+        obs_.setup_scenes(ORIGINAL_MEDIA_URL)
+        self.server.obs_clients = {"eng": self.client}
+        self.server.obs_instances = {"eng": obs_}
+        self.server.is_initialized = True
+
+    def test_cleanup_disconnects_the_clients(self):
+        self.server.cleanup()
+
+        self.assertFalse(self.client.connected)
+        self.assertEqual(self.server.obs_clients, {})
+
+    def test_reinitialize_disconnects_the_replaced_clients(self):
+        self.server.reinitialize({"eng": dict(self.server_langs["eng"], websocket_port=2)})
+
+        self.assertFalse(self.client.connected)
+        self.assertNotIn("eng", self.server.obs_instances)  # nothing listens on the new port
+        self.assertEqual(self.server.obs_clients, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import threading
+import time
+import unittest
+
+import obs
+
+
+class TimerSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = obs.TimerScheduler()
+        self.scheduler.start()
+        self.calls = []  # [... (name, time.monotonic()), ...]
+        self.called = threading.Event()
+
+    def tearDown(self):
+        self.scheduler.stop()
+        self.scheduler.join(timeout=1)
+        self.scheduler.executor.shutdown()
+
+    def record(self, name, last=False):
+        def foo():
+            self.calls.append((name, time.monotonic()))
+            if last:
+                self.called.set()
+
+        return foo
+
+    def wait_called(self):
+        self.assertTrue(self.called.wait(timeout=2))
+
+    def test_callbacks_are_invoked_in_deadline_order(self):
+        now = time.monotonic()
+        self.scheduler.call_at(now + 0.15, self.record("c", last=True))
+        self.scheduler.call_at(now + 0.05, self.record("a"))
+        self.scheduler.call_at(now + 0.1, self.record("b"))
+
+        self.wait_called()
+        self.assertEqual([name for name, _ in self.calls], ["a", "b", "c"])
+        for (_, called_at), delay in zip(self.calls, (0.05, 0.1, 0.15)):
+            self.assertGreaterEqual(called_at, now + delay)
+            self.assertLess(called_at, now + delay + 0.05)
+
+    def test_call_later(self):
+        now = time.monotonic()
+        self.scheduler.call_later(0.05, self.record("a", last=True))
+
+        self.wait_called()
+        self.assertGreaterEqual(self.calls[0][1], now + 0.05)
+
+    def test_past_deadline_is_invoked_immediately(self):
+        now = time.monotonic()
+        self.scheduler.call_later(-1, self.record("a", last=True))
+
+        self.wait_called()
+        self.assertLess(self.calls[0][1], now + 0.05)
+
+    def test_earlier_callback_wakes_the_thread_up(self):
+        now = time.monotonic()
+        self.scheduler.call_at(now + 10, self.record("late"))
+        time.sleep(0.02)  # let the thread fall asleep until the late deadline
+        self.scheduler.call_at(now + 0.05, self.record("early", last=True))
+
+        self.wait_called()
+        self.assertEqual([name for name, _ in self.calls], ["early"])
+        self.assertLess(self.calls[0][1], now + 0.1)
+
+    def test_cancelled_callback_is_not_invoked(self):
+        handle = self.scheduler.call_later(0.05, self.record("cancelled"))
+        self.scheduler.call_later(0.1, self.record("a", last=True))
+
+        self.assertTrue(self.scheduler.cancel(handle))
+
+        self.wait_called()
+        self.assertEqual([name for name, _ in self.calls], ["a"])
+
+    def test_invoked_callback_can_not_be_cancelled(self):
+        handle = self.scheduler.call_later(0, self.record("a", last=True))
+        self.wait_called()
+
+        self.assertFalse(self.scheduler.cancel(handle))
+        self.assertTrue(handle.done)
+        self.assertFalse(handle.cancelled)
+
+    def test_failing_callback_does_not_stop_the_others(self):
+        def fail():
+            raise RuntimeError("failing")
+
+        self.scheduler.call_later(0, fail)
+        self.scheduler.call_later(0.05, self.record("a", last=True))
+
+        self.wait_called()
+        self.assertEqual([name for name, _ in self.calls], ["a"])
+
+
+if __name__ == "__main__":
+    unittest.main()
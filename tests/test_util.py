@@ -0,0 +1,227 @@
+import asyncio
+import json
+import time
+import unittest
+from unittest import mock
+
+import flask
+import msgpack
+from werkzeug.exceptions import BadRequest
+
+import util
+from tests.test_obs import wait_for
+
+app = flask.Flask(__name__)
+
+
+class GetRequestParamTest(unittest.TestCase):
+    def get_param(self, name, query=None, body=None, content_type=util.JSON_CONTENT_TYPE, default=None):
+        query_string = {key: json.dumps(value) for key, value in (query or {}).items()}
+        with app.test_request_context(
+            "/", method="POST", query_string=query_string, data=body, content_type=content_type
+        ):
+            return util.get_request_param(flask.request, name, default)
+
+    def test_query_string(self):
+        self.assertEqual(self.get_param("params", query={"params": {"eng": 1}}), {"eng": 1})
+        self.assertEqual(self.get_param("params", default={}), {})
+
+    def test_json_body(self):
+        body = json.dumps({"params": {"eng": 1}})
+        self.assertEqual(self.get_param("params", body=body), {"eng": 1})
+
+    def test_msgpack_body(self):
+        body = msgpack.packb({"params": {"eng": 1}})
+        self.assertEqual(self.get_param("params", body=body, content_type=util.MSGPACK_CONTENT_TYPE), {"eng": 1})
+
+    def test_missing_body_keys_fall_back_to_the_query_string(self):
+        body = json.dumps({"params": {"eng": 1}})
+
+        self.assertEqual(self.get_param("timeout", query={"timeout": 5}, body=body), 5)
+        self.assertEqual(self.get_param("params", query={"params": {"eng": 2}}, body=body), {"eng": 1})
+        self.assertIsNone(self.get_param("stream", body=body))
+
+    def test_bad_body_is_rejected(self):
+        for body, content_type in (
+            ("{", util.JSON_CONTENT_TYPE),
+            (b"\xc1", util.MSGPACK_CONTENT_TYPE),
+            (json.dumps([1, 2]), util.JSON_CONTENT_TYPE),
+            (msgpack.packb("params"), util.MSGPACK_CONTENT_TYPE),
+        ):
+            with self.subTest(body=body):
+                with self.assertRaises(BadRequest):
+                    self.get_param("params", body=body, content_type=content_type)
+
+    def test_bad_query_value_is_rejected(self):
+        with app.test_request_context("/", query_string={"params": "{"}):
+            with self.assertRaises(BadRequest):
+                util.get_request_param(flask.request, "params")
+
+    def test_bad_body_is_answered_with_400(self):
+        @app.route("/param", methods=["POST"])
+        def param():
+            return str(util.get_request_param(flask.request, "params"))
+
+        response = app.test_client().post("/param", data="[]", content_type=util.JSON_CONTENT_TYPE)
+        self.assertEqual(response.status_code, 400)
+
+
+def transport_error():
+    return util.Response("request failed", 502, transport_error=True)
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def test_opens_after_the_threshold(self):
+        breaker = util.CircuitBreaker(failure_threshold=2)
+
+        self.assertFalse(breaker.record_failure("a"))
+        self.assertFalse(breaker.is_open)
+        self.assertTrue(breaker.record_failure("b"))
+        self.assertTrue(breaker.is_open)
+        self.assertFalse(breaker.record_failure("c"))  # opens once
+        self.assertEqual(breaker.stats()["state"], "open")
+        self.assertEqual(breaker.last_error, "c")
+
+    def test_success_closes_it(self):
+        breaker = util.CircuitBreaker(failure_threshold=2)
+        breaker.record_failure("a")
+        breaker.record_failure("b")
+
+        breaker.record_success()
+
+        self.assertFalse(breaker.is_open)
+        self.assertEqual(breaker.failures, 0)
+        self.assertFalse(breaker.record_failure("c"))
+
+
+class FakeProbeClient:
+    def __init__(self):
+        self.status_code = 503
+        self.urls = []
+
+    async def fetch(self, method, url, timeout=None, **kwargs):
+        self.urls.append(url)
+        return util.Response("", self.status_code)
+
+
+class ServiceAddrStorageTest(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeProbeClient()
+        patcher = mock.patch("util.get_http_client", return_value=self.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.storage = util.ServiceAddrStorage(failure_threshold=2, probe_interval=0.02)
+        self.storage["en"] = {"addr": "http://en:5000"}
+
+    def tearDown(self):
+        # let the probes close the circuits, so they don't outlive the patched client
+        self.client.status_code = 200
+        wait_for(lambda: self.storage.is_available("en"))
+
+    def test_transport_errors_open_the_circuit(self):
+        self.storage.record_response("en", transport_error())
+        self.assertTrue(self.storage.is_available("en"))
+
+        self.storage.record_response("en", transport_error())
+
+        self.assertFalse(self.storage.is_available("en"))
+        self.assertEqual(self.storage.unavailable_response("en").status_code, 503)
+        self.assertEqual(self.storage.stats()["en"]["state"], "open")
+
+    def test_replies_reset_the_failures(self):
+        self.storage.record_response("en", transport_error())
+        self.storage.record_response("en", util.Response("internal error", 500))
+        self.storage.record_response("en", transport_error())
+
+        self.assertTrue(self.storage.is_available("en"))
+
+    def test_zero_threshold_never_opens_the_circuit(self):
+        self.storage = util.ServiceAddrStorage(failure_threshold=0)
+        self.storage["en"] = {"addr": "http://en:5000"}
+
+        for _ in range(5):
+            self.storage.record_response("en", transport_error())
+
+        self.assertTrue(self.storage.is_available("en"))
+
+    def test_successful_probe_closes_the_circuit(self):
+        for _ in range(2):
+            self.storage.record_response("en", transport_error())
+        wait_for(lambda: len(self.client.urls) >= 2)
+        self.assertFalse(self.storage.is_available("en"))
+
+        self.client.status_code = 200
+
+        wait_for(lambda: self.storage.is_available("en"))
+        self.assertEqual(set(self.client.urls), {"http://en:5000/healthcheck"})
+
+
+class HedgedFetchTest(unittest.TestCase):
+    def setUp(self):
+        self.http_client = util.HTTPClient()
+        self.attempts = []  # [... time.monotonic() of the attempt, ...]
+        self.responses = []  # [... (delay, Response) returned by the attempts, in order, ...]
+        self.http_client._fetch = self.fake_fetch
+
+    async def fake_fetch(self, method, url, timeout, body, headers):
+        delay, response = self.responses[len(self.attempts)]
+        self.attempts.append(time.monotonic())
+        if timeout is not None and delay > timeout:
+            await asyncio.sleep(timeout)
+            return util.Response("timed out", 504, transport_error=True)
+        await asyncio.sleep(delay)
+        return response
+
+    def fetch(self, **kwargs):
+        self.started_at = time.monotonic()
+        coro = self.http_client.fetch("GET", "http://en:5000/info", **kwargs)
+        return util.get_event_loop_thread().run_sync(coro, timeout=5)
+
+    def test_single_attempt(self):
+        self.responses = [(0, transport_error())]
+
+        self.assertTrue(self.fetch(hedge_delay=0.01).transport_error)
+        self.assertEqual(len(self.attempts), 1)
+
+    def test_slow_request_is_hedged(self):
+        self.responses = [(1, util.Response("slow", 200)), (0, util.Response("fast", 200))]
+
+        response = self.fetch(attempts=2, hedge_delay=0.05)
+
+        self.assertEqual(response.text, "fast")
+        self.assertEqual(len(self.attempts), 2)
+        self.assertGreaterEqual(self.attempts[1] - self.started_at, 0.05)
+        self.assertLess(time.monotonic() - self.started_at, 0.5)
+
+    def test_transport_error_is_retried(self):
+        self.responses = [(0, transport_error()), (0, util.Response("ok", 200))]
+
+        response = self.fetch(attempts=3, hedge_delay=1, backoff=0.01)
+
+        self.assertEqual(response.text, "ok")
+        self.assertEqual(len(self.attempts), 2)
+
+    def test_error_reply_is_not_retried(self):
+        self.responses = [(0, util.Response("internal error", 500)), (0, util.Response("ok", 200))]
+
+        self.assertEqual(self.fetch(attempts=2, backoff=0.01).status_code, 500)
+        self.assertEqual(len(self.attempts), 1)
+
+    def test_last_failure_is_returned(self):
+        self.responses = [(0, transport_error())] * 3
+
+        self.assertTrue(self.fetch(attempts=3, backoff=0.01).transport_error)
+        self.assertEqual(len(self.attempts), 3)
+
+    def test_attempts_share_the_timeout(self):
+        self.responses = [(1, util.Response("slow", 200))] * 3
+
+        response = self.fetch(timeout=0.2, attempts=3, hedge_delay=0.05)
+
+        self.assertEqual(response.status_code, 504)
+        self.assertEqual(len(self.attempts), 3)
+        self.assertLess(time.monotonic() - self.started_at, 0.35)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,43 +1,477 @@
+import collections
+import concurrent.futures
+import json
+import random
 import re
+import threading
+import time
 
 import aiohttp
 import asyncio
-from asgiref import sync
+import msgpack
+from werkzeug.exceptions import BadRequest
+
+UPDATED_AT_KEY = "__updated_at__"  # key of by-lang timestamps of when the values were last confirmed by obs
+DEFAULT_HTTP_POOL_LIMIT = 100  # max number of simultaneous connections
+DEFAULT_HTTP_POOL_LIMIT_PER_HOST = 10  # max number of simultaneous connections to one host
+DEFAULT_EVENT_QUEUE_SIZE = 1000  # max number of events waiting for a subscriber
+DEFAULT_SSE_KEEPALIVE = 15  # seconds between keepalive comments of idle event streams
+DEFAULT_HEDGE_DELAY = 0.25  # seconds to wait for a response before a duplicate request is sent
+DEFAULT_RETRY_BACKOFF = 0.05  # seconds, base delay of the retries of failed requests
+DEFAULT_FAILURE_THRESHOLD = 3  # consecutive failed requests which open the circuit of a service
+DEFAULT_PROBE_INTERVAL = 2  # seconds between health probes of a service which circuit is open
+DEFAULT_PROBE_TIMEOUT = 1  # seconds
+JSON_CONTENT_TYPE = "application/json"
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+MSGPACK_CONTENT_TYPES = (MSGPACK_CONTENT_TYPE, "application/x-msgpack")
+
 
 class Response:
-    def __init__(self, text, status_code):
-        self.text = text
+    def __init__(self, body, status_code, content_type=None, transport_error=False):
+        """
+        :param body: bytes (or str)
+        :param transport_error: True if the service hasn't replied (couldn't be reached or timed out)
+        """
+        self.body = body.encode() if isinstance(body, str) else body
         self.status_code = status_code
+        self.content_type = content_type
+        self.transport_error = transport_error
+
+    @property
+    def text(self):
+        return self.body.decode(errors="replace")
+
+    def data(self):
+        """
+        :return: the decoded json (or msgpack) body, raises ValueError if it can't be decoded
+        """
+        return decode_body(self.body, self.content_type)
+
+
+def encode_body(data, content_type=JSON_CONTENT_TYPE):
+    """
+    :return: `data` encoded as json or msgpack (`content_type`), bytes
+    """
+    if content_type in MSGPACK_CONTENT_TYPES:
+        return msgpack.packb(data)
+    return json.dumps(data).encode()
+
+
+def decode_body(body, content_type=None):
+    """
+    Decodes a msgpack (`content_type`) or json (any other content type) body
+    """
+    if content_type in MSGPACK_CONTENT_TYPES:
+        return msgpack.unpackb(body)
+    return json.loads(body)
+
 
-def async_aiohttp_get_all(urls):
+def get_request_param(request, name, default=None):
     """
-    performs asynchronous get requests
+    Retrieves a parameter of a flask request: from the body (a json or msgpack object `{"name": value, ...}`)
+    if the request has one and the parameter is there, otherwise from the query string (json-encoded value).
+    Fires BadRequest (400) if the body isn't an object or the value can't be decoded
+    :return: the decoded value, `default` if there's no such parameter
     """
-    async def get_all(urls):
-        async with aiohttp.ClientSession() as session:
-            async def fetch(url):
-                async with session.get(url) as response:
-                    return Response(await response.text(), response.status)
-            return await asyncio.gather(*[
-                fetch(url) for url in urls
-            ])
-    # call get_all as a sync function to be used in a sync context
-    return sync.async_to_sync(get_all)(urls)
+    if request.content_length:
+        try:
+            body = decode_body(request.get_data(cache=True), request.mimetype)
+        except (ValueError, TypeError) as ex:
+            raise BadRequest(f"couldn't decode the request body. Details: {ex}")
+        if not isinstance(body, dict):
+            raise BadRequest("the request body must be an object of the parameters")
+        if name in body:
+            return body[name]
+    value = request.args.get(name, None)
+    if value is None:
+        return default
+    try:
+        return json.loads(value)
+    except ValueError as ex:
+        raise BadRequest(f"couldn't decode parameter {name}. Details: {ex}")
+
+
+def make_data_response(request, data, status_code=200):
+    """
+    :return: flask response of `data` encoded as msgpack if the client accepts it, as json otherwise
+    """
+    content_type = request.accept_mimetypes.best_match([JSON_CONTENT_TYPE, MSGPACK_CONTENT_TYPE], JSON_CONTENT_TYPE)
+    return encode_body(data, content_type), status_code, {"Content-Type": content_type}
+
+
+def async_aiohttp_get_all(urls, timeout=None, headers=None):
+    """
+    performs asynchronous get requests (over the shared keep-alive session, see `HTTPClient`)
+    :param timeout: seconds to wait for every request, None - wait forever
+    """
+    return get_http_client().request_all("GET", urls, timeout=timeout, headers=headers)
+
+
+def async_aiohttp_post_all(urls, timeout=None, bodies=None, headers=None):
+    """
+    performs asynchronous post requests (over the shared keep-alive session, see `HTTPClient`)
+    :param timeout: seconds to wait for every request, None - wait forever
+    :param bodies: list of bodies (bytes) of the requests, in the order of `urls`
+    """
+    return get_http_client().request_all("POST", urls, timeout=timeout, bodies=bodies, headers=headers)
 
-def async_aiohttp_post_all(urls):
+
+class EventLoopThread(threading.Thread):
     """
-    performs asynchronous get requests
+    Runs an asyncio event loop in a background thread.
+    Sync code submits coroutines to it with `submit()`/`run_sync()`.
     """
-    async def get_all(urls):
-        async with aiohttp.ClientSession() as session:
-            async def fetch(url):
-                async with session.post(url) as response:
-                    return Response(await response.text(), response.status)
-            return await asyncio.gather(*[
-                fetch(url) for url in urls
-            ])
-    # call get_all as a sync function to be used in a sync context
-    return sync.async_to_sync(get_all)(urls)
+
+    def __init__(self, name="EventLoopThread"):
+        self.loop = asyncio.new_event_loop()
+        threading.Thread.__init__(self, name=name, daemon=True)
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """
+        :return: concurrent.futures.Future of the coroutine result
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run_sync(self, coro, timeout=None):
+        """
+        Runs the coroutine on the loop and waits for its result.
+        Must not be called from the loop thread itself (it would block the loop forever).
+        """
+        if threading.current_thread() is self:
+            coro.close()
+            raise RuntimeError("run_sync() called from the event loop thread")
+        return self.submit(coro).result(timeout)
+
+
+_event_loop_thread = None
+_event_loop_thread_lock = threading.Lock()
+
+
+def get_event_loop_thread():
+    """
+    Returns the process-wide background event loop thread, starts it on the first call
+    """
+    global _event_loop_thread
+    with _event_loop_thread_lock:
+        if _event_loop_thread is None:
+            _event_loop_thread = EventLoopThread()
+            _event_loop_thread.start()
+        return _event_loop_thread
+
+
+class HTTPClient:
+    """
+    Long-lived aiohttp session living on the background event loop (see `get_event_loop_thread()`),
+    shared by all the threads. Connections are kept alive between requests,
+    so repeated requests to the same hosts don't pay for new TCP connections.
+    """
+
+    def __init__(self, limit=DEFAULT_HTTP_POOL_LIMIT, limit_per_host=DEFAULT_HTTP_POOL_LIMIT_PER_HOST):
+        """
+        :param limit: max number of simultaneous connections (0 - unlimited)
+        :param limit_per_host: max number of simultaneous connections to one host (0 - unlimited)
+        """
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.loop_thread = get_event_loop_thread()
+        self.session = None  # created on the loop when first needed
+
+    def request_all(self, method, urls, timeout=None, bodies=None, headers=None, **kwargs):
+        """
+        Performs the requests concurrently and waits for all of them
+        :param bodies: list of bodies of the requests, in the order of `urls`, None - no bodies
+        :param headers: headers of every request
+        :param kwargs: passed to `fetch()`
+        :return: list of `Response`, in the order of `urls`
+        """
+        return self.loop_thread.run_sync(self.request_all_async(method, urls, timeout, bodies, headers, **kwargs))
+
+    def iter_all(self, method, urls, timeout=None, bodies=None, headers=None, **kwargs):
+        """
+        Performs the requests concurrently
+        :return: generator of `(index_in_urls, Response)`, in the order the requests complete
+        """
+        bodies = bodies if bodies is not None else [None] * len(urls)
+        futures = {
+            self.loop_thread.submit(self.fetch(method, url, timeout=timeout, body=body, headers=headers, **kwargs)): i
+            for i, (url, body) in enumerate(zip(urls, bodies))
+        }
+        for future in concurrent.futures.as_completed(futures):
+            yield futures[future], future.result()
+
+    async def request_all_async(self, method, urls, timeout=None, bodies=None, headers=None, **kwargs):
+        bodies = bodies if bodies is not None else [None] * len(urls)
+        return await asyncio.gather(
+            *[
+                self.fetch(method, url, timeout=timeout, body=body, headers=headers, **kwargs)
+                for url, body in zip(urls, bodies)
+            ]
+        )
+
+    async def fetch(
+        self,
+        method,
+        url,
+        timeout=None,
+        body=None,
+        headers=None,
+        attempts=1,
+        hedge_delay=DEFAULT_HEDGE_DELAY,
+        backoff=DEFAULT_RETRY_BACKOFF,
+    ):
+        """
+        Failed requests are not raised, but returned as error responses:
+        504 if `timeout` (in seconds) has expired, 502 if the host couldn't be reached
+        :param attempts: max number of requests sent (only for idempotent requests!): if there is no response
+        in `hedge_delay` seconds, a duplicate request is sent, and failed requests are retried after a jittered
+        `backoff`. The first response wins, all of them share `timeout`
+        """
+        if attempts <= 1:
+            return await self._fetch(method, url, timeout, body, headers)
+
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout if timeout is not None else None
+
+        async def attempt(delay):
+            await asyncio.sleep(delay)
+            timeout_ = None if deadline is None else deadline - loop.time()
+            if timeout_ is not None and timeout_ <= 0:
+                return Response(f"no response in {timeout} seconds", 504, transport_error=True)
+            return await self._fetch(method, url, timeout_, body, headers)
+
+        pending = {asyncio.ensure_future(attempt(0))}
+        started = 1
+        response = None
+        try:
+            while pending:
+                wait_for = hedge_delay if started < attempts else None
+                done, pending = await asyncio.wait(pending, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    response = task.result()
+                    if not response.transport_error:
+                        return response
+                if started < attempts:
+                    # a failed request is retried after a jittered backoff, a slow one is hedged right away
+                    delay = random.uniform(0, backoff * 2 ** (started - 1)) if done else 0
+                    pending.add(asyncio.ensure_future(attempt(delay)))
+                    started += 1
+            return response
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _fetch(self, method, url, timeout, body, headers):
+        try:
+            timeout_ = aiohttp.ClientTimeout(total=timeout)
+            async with self._get_session().request(
+                method, url, data=body, headers=headers, timeout=timeout_
+            ) as response:
+                return Response(await response.read(), response.status, response.content_type)
+        except asyncio.TimeoutError:
+            return Response(f"no response in {timeout} seconds", 504, transport_error=True)
+        except aiohttp.ClientError as ex:
+            return Response(f"request failed: {ex!r}", 502, transport_error=True)
+
+    async def iter_lines(self, url, read_timeout=None):
+        """
+        Performs a long-lived GET request (e.g. of an event stream)
+        :param read_timeout: seconds to wait for the next chunk of data, None - wait forever
+        :return: async generator of the decoded response lines (without line breaks),
+        raises `aiohttp.ClientResponseError` if the response status is not 200
+        """
+        timeout_ = aiohttp.ClientTimeout(total=None, sock_read=read_timeout)
+        async with self._get_session().get(url, timeout=timeout_) as response:
+            response.raise_for_status()
+            async for line in response.content:
+                yield line.decode().rstrip("\r\n")
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def _get_session(self):
+        # only called on the loop, so no locking is needed
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host)
+            self.session = aiohttp.ClientSession(connector=connector)
+        return self.session
+
+
+_http_client = None
+_http_client_lock = threading.Lock()
+
+
+def init_http_client(limit=DEFAULT_HTTP_POOL_LIMIT, limit_per_host=DEFAULT_HTTP_POOL_LIMIT_PER_HOST):
+    """
+    (Re)creates the process-wide `HTTPClient` with the given connection pool limits
+    """
+    global _http_client
+    with _http_client_lock:
+        previous, _http_client = _http_client, HTTPClient(limit=limit, limit_per_host=limit_per_host)
+    if previous is not None:
+        previous.loop_thread.submit(previous.close())
+    return _http_client
+
+
+def get_http_client():
+    """
+    Returns the process-wide `HTTPClient`, creates it with the default limits on the first call
+    """
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = HTTPClient()
+        return _http_client
+
+
+async def sample_clock(url, timeout=None):
+    """
+    NTP-style exchange with a clock route, which returns {"received_at": unix_timestamp, "sent_at": unix_timestamp}
+    :return: (round-trip time, offset of the remote clock from the local one), in seconds,
+    or None if the request has failed
+    """
+    sent_at = time.time()
+    response = await get_http_client().fetch("GET", url, timeout=timeout)
+    received_at = time.time()
+    if response.status_code != 200:
+        return None
+    try:
+        data = response.data()
+        remote_received_at, remote_sent_at = float(data["received_at"]), float(data["sent_at"])
+    except (ValueError, KeyError, TypeError):
+        return None
+    rtt = (received_at - sent_at) - (remote_sent_at - remote_received_at)
+    offset = ((remote_received_at - sent_at) + (remote_sent_at - received_at)) / 2
+    return rtt, offset
+
+
+class Subscription:
+    """
+    Queue of the events published to a single subscriber of an `EventHub`
+    """
+
+    def __init__(self, max_size=DEFAULT_EVENT_QUEUE_SIZE):
+        self.max_size = max_size
+        self.events = collections.deque()
+        self.condition = threading.Condition()
+        self.dropped = False  # set if the subscriber hasn't kept up, its events are lost
+
+    def put(self, event):
+        with self.condition:
+            if self.dropped:
+                return
+            if len(self.events) >= self.max_size:
+                self.dropped = True
+                self.events.clear()
+            else:
+                self.events.append(event)
+            self.condition.notify()
+
+    def close(self):
+        with self.condition:
+            self.dropped = True
+            self.events.clear()
+            self.condition.notify()
+
+    def get(self, timeout=None):
+        """
+        Waits for events
+        :return: list of the pending events (empty if there were none in `timeout` seconds),
+        None if the subscription has been dropped
+        """
+        with self.condition:
+            if not self.events and not self.dropped:
+                self.condition.wait(timeout)
+            if self.dropped:
+                return None
+            events = list(self.events)
+            self.events.clear()
+            return events
+
+
+class EventHub:
+    """
+    Publishes events (json-serializable values) to all the current subscribers.
+    Every subscriber has a bounded queue, a subscriber which doesn't keep up is dropped
+    (it's expected to subscribe again and start over from a fresh snapshot of the state)
+    """
+
+    def __init__(self, queue_size=DEFAULT_EVENT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.lock = threading.Lock()
+        self.subscriptions = set()
+
+    def subscribe(self):
+        subscription = Subscription(max_size=self.queue_size)
+        with self.lock:
+            self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions.discard(subscription)
+
+    def publish(self, event):
+        with self.lock:
+            subscriptions = list(self.subscriptions)
+        for subscription in subscriptions:
+            subscription.put(event)
+
+    def close(self):
+        """
+        Drops all the subscriptions (e.g. their event streams end)
+        """
+        with self.lock:
+            subscriptions, self.subscriptions = self.subscriptions, set()
+        for subscription in subscriptions:
+            subscription.close()
+
+
+def sse_stream(hub, get_snapshot, keepalive=DEFAULT_SSE_KEEPALIVE):
+    """
+    Generator of a server-sent events stream: a `snapshot` event with the current state,
+    then a `patch` event per event published to `hub`. Ends if the subscriber has been dropped.
+    :param get_snapshot: get_snapshot(), returns the current state, called after subscribing,
+    so no change is lost between the snapshot and the patches
+    :param keepalive: seconds between keepalive comments of an idle stream
+    """
+    subscription = hub.subscribe()
+    try:
+        yield f"event: snapshot\ndata: {json.dumps(get_snapshot())}\n\n"
+        while True:
+            events = subscription.get(timeout=keepalive)
+            if events is None:
+                break
+            if not events:
+                yield ": keepalive\n\n"
+            for event in events:
+                yield f"event: patch\ndata: {json.dumps(event)}\n\n"
+    finally:
+        hub.unsubscribe(subscription)
+
+
+def apply_patch(state, patch):
+    """
+    Applies a state patch, e.g. `{"lang": "eng", "path": ["sources", "ts_input", "volume_db"], "value": ...}`
+    to by-lang `state` ({"lang": {...}, ...}). An empty `path` replaces the whole lang's state,
+    or removes the lang if `value` is None
+    """
+    lang, path, value = patch["lang"], patch["path"], patch["value"]
+    if not path:
+        if value is None:
+            state.pop(lang, None)
+        else:
+            state[lang] = value
+        return
+    node = state.setdefault(lang, {})
+    for key in path[:-1]:
+        node = node.setdefault(key, {})
+    node[path[-1]] = value
 
 
 def validate_init_params(server_langs):
@@ -63,19 +497,98 @@ def validate_media_play_params(name, use_file_num):
     return ExecutionStatus(status=True)
 
 
+def validate_batch_operations(operations, supported_ops):
+    """
+    :param operations: list of operations of the `/batch` route, e.g. [{"op": "start_streaming"}, ...]
+    :param supported_ops: names of the supported operations
+    """
+    if not isinstance(operations, list):
+        return ExecutionStatus(status=False, message="`operations` must be a list")
+    for i, operation in enumerate(operations):
+        if not isinstance(operation, dict):
+            return ExecutionStatus(status=False, message=f"operation {i} must be an object")
+        if operation.get("op") not in supported_ops:
+            return ExecutionStatus(status=False, message=f"operation {i}: unknown `op` {operation.get('op')!r}")
+        params = operation.get("params")
+        if params is not None and not isinstance(params, dict):
+            return ExecutionStatus(status=False, message=f"operation {i}: `params` must be an object of by-lang values")
+    return ExecutionStatus(status=True)
+
+
+class CircuitBreaker:
+    """
+    Health of a service: after `failure_threshold` consecutive failed requests the circuit opens,
+    and the requests to the service fail fast until it's closed by a successful health probe
+    """
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD):
+        self.failure_threshold = failure_threshold
+        self.failures = 0  # consecutive failed requests
+        self.opened_at = None  # time.time() when the circuit has opened, None if closed
+        self.last_error = None
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self, error):
+        """
+        :return: True if the circuit has just opened
+        """
+        self.failures += 1
+        self.last_error = error
+        if self.opened_at is None and self.failures >= self.failure_threshold:
+            self.opened_at = time.time()
+            return True
+        return False
+
+    def stats(self):
+        return {
+            "state": "open" if self.is_open else "closed",
+            "failures": self.failures,
+            "opened_at": self.opened_at,
+            "last_error": self.last_error,
+        }
+
+
 class ServiceAddrStorage:
     """
+    Addresses of the instance services and their health (see `CircuitBreaker`).
+    While the circuit of a service is open, it's probed in background (GET `probe_route`)
     TODO: save/load config to/from disk
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        probe_route="/healthcheck",
+        failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+        probe_interval=DEFAULT_PROBE_INTERVAL,
+        probe_timeout=DEFAULT_PROBE_TIMEOUT,
+    ):
+        """
+        :param failure_threshold: consecutive failed requests which open the circuit, 0 - never open it
+        :param probe_interval: seconds between health probes of a service which circuit is open
+        """
+        self.probe_route = probe_route
+        self.failure_threshold = failure_threshold
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+
+        self.lock = threading.Lock()
         self.dct = {}
+        self.breakers = {}  # {"lang": CircuitBreaker(), ...}, replaced when the lang's address is set
 
     def __getitem__(self, item):
         return self.dct[item]
 
     def __setitem__(self, key, value):
-        self.dct[key] = value
+        with self.lock:
+            self.dct[key] = value
+            self.breakers[key] = CircuitBreaker(self.failure_threshold)
 
     def __iter__(self):
         return self.dct.__iter__()
@@ -86,6 +599,58 @@ class ServiceAddrStorage:
     def addr(self, lang):
         return self.dct[lang]["addr"]
 
+    def is_available(self, lang):
+        """
+        :return: False if the circuit of the lang's service is open (the requests should fail fast)
+        """
+        breaker = self.breakers.get(lang)
+        return breaker is None or not breaker.is_open
+
+    def unavailable_response(self, lang):
+        """
+        :return: `Response` returned instead of a request to the lang's service while its circuit is open
+        """
+        breaker = self.breakers[lang]
+        return Response(
+            f"instance service is unavailable since {time.ctime(breaker.opened_at)} "
+            f"(waiting for a successful health probe), last error: {breaker.last_error}",
+            503,
+        )
+
+    def record_response(self, lang, response: Response):
+        """
+        Updates the health of the lang's service, the failures are the requests the service hasn't replied to
+        """
+        with self.lock:
+            breaker = self.breakers.get(lang)
+            if breaker is None or self.failure_threshold <= 0:
+                return
+            if not response.transport_error:
+                breaker.record_success()
+                return
+            if not breaker.record_failure(response.text):
+                return
+            addr = self.dct[lang]["addr"]
+        print(f"W PYSERVER::ServiceAddrStorage::record_response(): circuit of {lang} is open, details: {response.text}")
+        get_event_loop_thread().submit(self._probe(lang, addr, breaker))
+
+    def stats(self):
+        """
+        :return: {"lang": {"state": "open"/"closed", "failures": n, "opened_at": ..., "last_error": ...}, ...}
+        """
+        with self.lock:
+            return {lang: breaker.stats() for lang, breaker in self.breakers.items()}
+
+    async def _probe(self, lang, addr, breaker):
+        # closes the circuit once the service replies to a health probe, stops if the lang's address has been reset
+        while self.breakers.get(lang) is breaker and breaker.is_open:
+            await asyncio.sleep(random.uniform(self.probe_interval / 2, self.probe_interval))
+            response = await get_http_client().fetch("GET", f"{addr}{self.probe_route}", timeout=self.probe_timeout)
+            with self.lock:
+                if response.status_code == 200 and self.breakers.get(lang) is breaker:
+                    breaker.record_success()
+                    print(f"W PYSERVER::ServiceAddrStorage::_probe(): circuit of {lang} is closed")
+
 
 class MultilangParams:
     def __init__(self, params_dict, langs=None):